@@ -2,25 +2,53 @@ import ctypes
 import os
 import sys
 
-from PySide6.QtGui import QIcon
-from PySide6.QtWidgets import QApplication, QStyle
-
-from app.services.paths import resource_path
-from app.services.startup_service import apply_user_appdata_override, run_as_admin
-from app.ui.main_window import TextExpanderApp
+from app.services.startup_timing import finish_startup_report, import_timer, timeline
 
 
 def main():
+    # Замер импортов включается до загрузки остальных модулей приложения,
+    # поэтому они импортируются здесь, а не в начале файла.
+    import_timer.install()
+    from app.services.listener_process import LISTENER_ONLY_FLAG, run_listener_process
+    from app.services.paths import get_application_path
+    from app.services.profiler import PROFILE_DIRNAME, pop_profile_flag, start_profiling
+    from app.services.startup_service import apply_user_appdata_override, run_as_admin
+
     apply_user_appdata_override()
     is_admin = run_as_admin()
     if not is_admin:
         sys.exit(0)
 
+    # Процесс одного слушателя не загружает Qt и окно менеджера.
+    if LISTENER_ONLY_FLAG in sys.argv:
+        sys.exit(run_listener_process())
+
+    # Профилирование с запуска охватывает и загрузку сниппетов в окне.
+    profile_duration = pop_profile_flag(sys.argv)
+    if profile_duration:
+        start_profiling(
+            os.path.join(get_application_path(), PROFILE_DIRNAME), profile_duration
+        )
+
+    run_gui(is_admin)
+
+
+def run_gui(is_admin):
+    with timeline.phase("import Qt"):
+        from PySide6.QtCore import QTimer
+        from PySide6.QtGui import QIcon
+        from PySide6.QtWidgets import QApplication, QStyle
+
+    with timeline.phase("import main_window"):
+        from app.ui.main_window import TextExpanderApp
+    from app.services.paths import resource_path
+
     myappid = "mycompany.myproduct.textexpander.19"
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
-    app = QApplication(sys.argv)
-    app.setQuitOnLastWindowClosed(False)
+    with timeline.phase("QApplication"):
+        app = QApplication(sys.argv)
+        app.setQuitOnLastWindowClosed(False)
 
     icon_path = resource_path("logo.ico")
     window_icon = QIcon(icon_path) if os.path.exists(icon_path) else QIcon()
@@ -31,8 +59,14 @@ def main():
         window_icon = app.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon)
     app.setWindowIcon(window_icon)
 
-    window = TextExpanderApp(is_admin=is_admin)
-    window.show()
+    with timeline.phase("TextExpanderApp"):
+        window = TextExpanderApp(is_admin=is_admin)
+    if window.start_minimized:
+        window.hide_to_tray()
+    else:
+        window.show()
+    # Сводка пишется после первого прохода цикла событий (окно отрисовано).
+    QTimer.singleShot(0, lambda: finish_startup_report("Запуск менеджера"))
 
     sys.exit(app.exec())
 
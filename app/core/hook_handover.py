@@ -0,0 +1,39 @@
+import threading
+from collections import deque
+
+DEDUPE_WINDOW = 0.05
+
+
+class EventDeduplicator:
+    """
+    Склеивает события, которые во время передачи хука видят оба хука.
+
+    Пока старый и новый хуки работают одновременно, каждое нажатие приходит
+    дважды — по одному разу от каждого источника. Событие считается дублем,
+    если от другого источника уже пришла та же клавиша не раньше window
+    секунд назад и она ещё не была сопоставлена. Повторы одной клавиши
+    (автоповтор, двойные буквы) сопоставляются попарно и не теряются.
+    """
+
+    def __init__(self, window=DEDUPE_WINDOW):
+        self._window = window
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def is_duplicate(self, source, key, now):
+        with self._lock:
+            pending = self._pending
+            while pending and now - pending[0][0] > self._window:
+                pending.popleft()
+            for i, (_, seen_source, seen_key) in enumerate(pending):
+                if seen_source != source and seen_key == key:
+                    del pending[i]
+                    self.dropped += 1
+                    return True
+            pending.append((now, source, key))
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
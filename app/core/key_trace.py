@@ -0,0 +1,219 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+
+TRACE_MAGIC = b"TXKT"
+TRACE_VERSION = 1
+DEFAULT_CAPACITY = 4096
+
+# t_us, value, duration_us, scan_code, event, key_class, buffer_len, outcome
+RECORD = struct.Struct("<QIIHBBBB")
+# magic, version, record size, count, redacted, salt, started_at (epoch)
+HEADER = struct.Struct("<4sHHIB16sd")
+
+EVENT_KEY = 1
+EVENT_TRIGGER = 2
+EVENT_HOOK_START = 3
+EVENT_HOOK_RETIRE = 4
+EVENT_EXPANSION = 5
+EVENT_NAMES = {
+    EVENT_KEY: "key",
+    EVENT_TRIGGER: "trigger",
+    EVENT_HOOK_START: "hook_start",
+    EVENT_HOOK_RETIRE: "hook_retire",
+    EVENT_EXPANSION: "expansion",
+}
+
+CLASS_NONE = 0
+CLASS_CHAR = 1
+CLASS_SPACE = 2
+CLASS_BACKSPACE = 3
+CLASS_CONTROL = 4
+CLASS_SPECIAL = 5
+CLASS_NAMES = {
+    CLASS_NONE: "-",
+    CLASS_CHAR: "char",
+    CLASS_SPACE: "space",
+    CLASS_BACKSPACE: "backspace",
+    CLASS_CONTROL: "control",
+    CLASS_SPECIAL: "special",
+}
+
+OUTCOME_NONE = 0
+OUTCOME_MATCH = 1
+OUTCOME_MISS = 2
+OUTCOME_FILTERED = 3
+OUTCOME_NAMES = {
+    OUTCOME_NONE: "-",
+    OUTCOME_MATCH: "match",
+    OUTCOME_MISS: "miss",
+    OUTCOME_FILTERED: "filtered",
+}
+
+
+class KeyTraceError(ValueError):
+    pass
+
+
+def sequence_digest(scan_codes, salt):
+    """32-битный хэш последовательности скан-кодов с солью трассы."""
+    data = struct.pack(f"<{len(scan_codes)}H", *scan_codes)
+    return int.from_bytes(
+        hashlib.blake2b(data, key=salt, digest_size=4).digest(), "little"
+    )
+
+
+class KeyTraceRecorder:
+    """
+    Кольцевой буфер решений слушателя в заранее выделенном bytearray.
+
+    Каждая запись — структура RECORD фиксированного размера, которая пишется
+    через pack_into без выделения памяти. По умолчанию нажатия скрыты:
+    скан-коды клавиш не сохраняются вовсе, остаётся только класс клавиши.
+    Хэш последовательности с солью трассы пишется лишь для срабатываний,
+    совпавших с аббревиатурой индекса (match, filtered): по нему трасса
+    сверяется с файлом сниппетов. Для промахов хэш не пишется, иначе по соли
+    из файла короткие слова восстанавливались бы перебором.
+    Выключенный рекордер не пишет ничего; вызывающий код проверяет enabled.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, redact=True):
+        self.capacity = capacity
+        self.redact = redact
+        self.enabled = False
+        self.salt = os.urandom(16)
+        self._buffer = bytearray(RECORD.size * capacity)
+        self._next = 0
+        # Пишут хук, поток вставки и супервизор: ячейка занимается и
+        # заполняется под замком, иначе два потока могут получить одну.
+        self._lock = threading.Lock()
+        self._started_ns = time.perf_counter_ns()
+        self._started_at = time.time()
+
+    def record(
+        self,
+        event,
+        scan_code=0,
+        key_class=CLASS_NONE,
+        buffer_len=0,
+        outcome=OUTCOME_NONE,
+        value=0,
+        duration_ns=0,
+    ):
+        if self.redact:
+            scan_code = 0
+            if event == EVENT_TRIGGER and outcome == OUTCOME_MISS:
+                value = 0
+        with self._lock:
+            i = self._next
+            self._next = i + 1
+            RECORD.pack_into(
+                self._buffer,
+                (i % self.capacity) * RECORD.size,
+                (time.perf_counter_ns() - self._started_ns) // 1000,
+                value & 0xFFFFFFFF,
+                min(duration_ns // 1000, 0xFFFFFFFF),
+                scan_code & 0xFFFF,
+                event,
+                key_class,
+                min(buffer_len, 0xFF),
+                outcome,
+            )
+
+    def digest(self, scan_codes):
+        return sequence_digest(scan_codes, self.salt)
+
+    def __len__(self):
+        return min(self._next, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._next = 0
+
+    def snapshot(self):
+        """Возвращает записи в хронологическом порядке одной строкой байт."""
+        size = RECORD.size
+        with self._lock:
+            written = self._next
+            if written <= self.capacity:
+                return bytes(self._buffer[: written * size])
+            start = (written % self.capacity) * size
+            return bytes(self._buffer[start:] + self._buffer[:start])
+
+    def dump(self, path):
+        data = self.snapshot()
+        header = HEADER.pack(
+            TRACE_MAGIC,
+            TRACE_VERSION,
+            RECORD.size,
+            len(data) // RECORD.size,
+            1 if self.redact else 0,
+            self.salt,
+            self._started_at,
+        )
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(data)
+        return len(data) // RECORD.size
+
+
+class TraceRecord:
+    __slots__ = (
+        "t_us",
+        "value",
+        "duration_us",
+        "scan_code",
+        "event",
+        "key_class",
+        "buffer_len",
+        "outcome",
+    )
+
+    def __init__(self, fields):
+        (
+            self.t_us,
+            self.value,
+            self.duration_us,
+            self.scan_code,
+            self.event,
+            self.key_class,
+            self.buffer_len,
+            self.outcome,
+        ) = fields
+
+
+def load_trace(path):
+    """Читает файл трассы: возвращает (заголовок-словарь, список TraceRecord)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise KeyTraceError("Файл трассы слишком короткий")
+    (
+        magic,
+        version,
+        record_size,
+        count,
+        redacted,
+        salt,
+        started_at,
+    ) = HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC:
+        raise KeyTraceError("Это не файл трассы клавиш")
+    if version != TRACE_VERSION or record_size != RECORD.size:
+        raise KeyTraceError(f"Неподдерживаемая версия трассы: {version}")
+    body = memoryview(data)[HEADER.size :]
+    if len(body) < count * RECORD.size:
+        raise KeyTraceError("Файл трассы обрезан")
+    records = [
+        TraceRecord(fields)
+        for fields in RECORD.iter_unpack(body[: count * RECORD.size])
+    ]
+    header = {
+        "redacted": bool(redacted),
+        "salt": salt,
+        "started_at": started_at,
+        "count": count,
+    }
+    return header, records
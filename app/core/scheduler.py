@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+KIND_EVENT = "event"
+KIND_DEADLINE = "deadline"
+
+
+class DeadlineScheduler:
+    """
+    Очередь событий и куча дедлайнов с одним ожидающим потоком.
+
+    Поток-потребитель спит в wait_next(), пока не придёт событие (post),
+    не истечёт ближайший дедлайн (schedule) или не будет вызван stop().
+    Если ничего не запланировано, ожидание не ограничено по времени.
+    У каждого имени дедлайна не больше одной активной записи: повторный
+    schedule() переносит его, cancel() снимает.
+
+    Часы (clock) подменяются в проверках; poll() разбирает готовые
+    элементы без ожидания.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._events = deque()
+        self._heap = []
+        self._active = {}
+        self._counter = itertools.count()
+        self._stopped = False
+
+    def now(self):
+        return self._clock()
+
+    def post(self, name, payload=None):
+        with self._cond:
+            self._events.append((KIND_EVENT, name, payload))
+            self._cond.notify()
+
+    def schedule(self, name, delay, payload=None):
+        """Планирует дедлайн name через delay секунд (заменяя прежний)."""
+        with self._cond:
+            token = next(self._counter)
+            self._active[name] = token
+            heapq.heappush(self._heap, (self._clock() + delay, token, name, payload))
+            self._cond.notify()
+
+    def cancel(self, name):
+        with self._cond:
+            # Запись в куче удаляется лениво, при извлечении.
+            self._active.pop(name, None)
+
+    def is_scheduled(self, name):
+        with self._cond:
+            return name in self._active
+
+    def clear_deadlines(self):
+        with self._cond:
+            self._active.clear()
+            self._heap = []
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def _drop_cancelled(self):
+        heap = self._heap
+        while heap and self._active.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+
+    def _take_ready(self):
+        if self._events:
+            return self._events.popleft()
+        self._drop_cancelled()
+        if self._heap and self._heap[0][0] <= self._clock():
+            _, _, name, payload = heapq.heappop(self._heap)
+            del self._active[name]
+            return (KIND_DEADLINE, name, payload)
+        return None
+
+    def poll(self):
+        """Возвращает готовый элемент (вид, имя, данные) или None, не ожидая."""
+        with self._cond:
+            if self._stopped:
+                return None
+            return self._take_ready()
+
+    def next_deadline(self):
+        with self._cond:
+            self._drop_cancelled()
+            return self._heap[0][0] if self._heap else None
+
+    def wait_next(self):
+        """
+        Блокирует поток до следующего события или дедлайна.
+
+        Возвращает (вид, имя, данные) либо None после stop().
+        """
+        with self._cond:
+            while not self._stopped:
+                item = self._take_ready()
+                if item is not None:
+                    return item
+                timeout = None
+                if self._heap:
+                    timeout = max(0.0, self._heap[0][0] - self._clock())
+                self._cond.wait(timeout)
+            return None
@@ -0,0 +1,261 @@
+import gzip
+import json
+import struct
+import zlib
+
+from app.core.snippet_store import (
+    CATEGORIES_KEY,
+    SCHEMA_VERSION,
+    is_versioned_document,
+    wrap_snippet_store,
+)
+
+FORMAT_JSON = "json"
+FORMAT_JSON_GZIP = "json-gzip"
+FORMAT_BINARY = "binary"
+FORMAT_PRETTY = "pretty"
+
+DEFAULT_FORMAT = FORMAT_JSON
+
+# Порядок задаёт порядок пунктов в настройках.
+STORAGE_FORMAT_LABELS = {
+    FORMAT_JSON: "Компактный JSON",
+    FORMAT_JSON_GZIP: "Сжатый JSON (gzip)",
+    FORMAT_BINARY: "Бинарные записи",
+    FORMAT_PRETTY: "Читаемый JSON (с отступами)",
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+BINARY_MAGIC = b"TXSB"
+BINARY_FORMAT_VERSION = 1
+
+# Бинарный формат: заголовок MAGIC + версия формата (u8) + версия схемы (u16),
+# далее поток записей. Строки кодируются как u32 длины + UTF-8.
+#   C name enabled filter  — начало категории (вложенные категории внутри)
+#   S abbr text enabled filter — сниппет текущей категории
+#   E — конец категории, Z — конец документа
+# Фильтр окна хранится компактным JSON (пустая строка — фильтра нет).
+RECORD_CATEGORY = b"C"
+RECORD_SNIPPET = b"S"
+RECORD_END_CATEGORY = b"E"
+RECORD_END_DOCUMENT = b"Z"
+
+_HEADER = struct.Struct("<4sBH")
+_LENGTH = struct.Struct("<I")
+
+
+class SnippetCodecError(ValueError):
+    """Файл сниппетов повреждён или записан в неизвестном формате."""
+
+
+def detect_format(head):
+    """Определяет формат хранения по первым байтам файла."""
+    if head.startswith(GZIP_MAGIC):
+        return FORMAT_JSON_GZIP
+    if head.startswith(BINARY_MAGIC):
+        return FORMAT_BINARY
+    return FORMAT_JSON
+
+
+def encode_json(document, fmt=FORMAT_JSON):
+    if fmt == FORMAT_PRETTY:
+        return json.dumps(document, indent=4, ensure_ascii=False).encode("utf-8")
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def _pack_str(chunks, value):
+    data = value.encode("utf-8")
+    chunks.append(_LENGTH.pack(len(data)))
+    chunks.append(data)
+
+
+def _pack_filter(chunks, window_filter):
+    if window_filter:
+        _pack_str(
+            chunks,
+            json.dumps(window_filter, ensure_ascii=False, separators=(",", ":")),
+        )
+    else:
+        _pack_str(chunks, "")
+
+
+def _pack_category(chunks, name, payload):
+    chunks.append(RECORD_CATEGORY)
+    _pack_str(chunks, name)
+    chunks.append(b"\x01" if payload.get("enabled", True) else b"\x00")
+    _pack_filter(chunks, payload.get("window_filter"))
+    for abbr, snippet in payload.get("snippets", {}).items():
+        chunks.append(RECORD_SNIPPET)
+        _pack_str(chunks, abbr)
+        _pack_str(chunks, str(snippet.get("text", "")))
+        chunks.append(b"\x01" if snippet.get("enabled", True) else b"\x00")
+        _pack_filter(chunks, snippet.get("window_filter"))
+    for sub_name, sub_payload in payload.get("categories", {}).items():
+        _pack_category(chunks, sub_name, sub_payload)
+    chunks.append(RECORD_END_CATEGORY)
+
+
+def encode_binary(document):
+    if not is_versioned_document(document):
+        raise SnippetCodecError("Бинарный формат поддерживает только текущую схему")
+    chunks = [_HEADER.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION, SCHEMA_VERSION)]
+    for name, payload in document[CATEGORIES_KEY].items():
+        _pack_category(chunks, name, payload)
+    chunks.append(RECORD_END_DOCUMENT)
+    return b"".join(chunks)
+
+
+def encode_document(document, fmt=DEFAULT_FORMAT):
+    """Кодирует документ сниппетов в байты выбранного формата."""
+    if fmt == FORMAT_BINARY:
+        return encode_binary(document)
+    if fmt == FORMAT_JSON_GZIP:
+        # mtime=0 делает вывод детерминированным для одинакового содержимого.
+        return gzip.compress(encode_json(document), compresslevel=6, mtime=0)
+    if fmt in (FORMAT_JSON, FORMAT_PRETTY):
+        return encode_json(document, fmt)
+    raise SnippetCodecError(f"Неизвестный формат хранения: {fmt}")
+
+
+class _BinaryReader:
+    def __init__(self, data):
+        self._data = data
+        self._view = memoryview(data)
+        self.pos = 0
+
+    def read(self, size):
+        end = self.pos + size
+        if end > len(self._data):
+            raise SnippetCodecError("Неожиданный конец бинарного файла сниппетов")
+        chunk = self._view[self.pos : end]
+        self.pos = end
+        return chunk
+
+    def close(self):
+        self._view.release()
+
+    def read_tag(self):
+        return bytes(self.read(1))
+
+    def read_flag(self):
+        return self.read(1)[0] != 0
+
+    def read_str(self):
+        (length,) = _LENGTH.unpack(self.read(_LENGTH.size))
+        return str(self.read(length), "utf-8")
+
+    def read_filter(self):
+        raw = self.read_str()
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise SnippetCodecError(f"Некорректный фильтр окна: {e}") from e
+
+
+def iter_binary_records(data):
+    """
+    Последовательно разбирает записи бинарного формата.
+
+    Возвращает кортежи ("category", name, enabled, filter),
+    ("snippet", abbr, text, enabled, filter) и ("end",) для конца категории.
+    """
+    reader = _BinaryReader(data)
+    try:
+        yield from _iter_records(reader)
+    finally:
+        reader.close()
+
+
+def _iter_records(reader):
+    magic, format_version, schema_version = _HEADER.unpack(reader.read(_HEADER.size))
+    if magic != BINARY_MAGIC or format_version != BINARY_FORMAT_VERSION:
+        raise SnippetCodecError("Неподдерживаемая версия бинарного формата")
+    if schema_version != SCHEMA_VERSION:
+        raise SnippetCodecError(f"Неподдерживаемая версия схемы: {schema_version}")
+    depth = 0
+    while True:
+        tag = reader.read_tag()
+        if tag == RECORD_CATEGORY:
+            depth += 1
+            yield (
+                "category",
+                reader.read_str(),
+                reader.read_flag(),
+                reader.read_filter(),
+            )
+        elif tag == RECORD_SNIPPET:
+            if not depth:
+                raise SnippetCodecError("Сниппет вне категории")
+            yield (
+                "snippet",
+                reader.read_str(),
+                reader.read_str(),
+                reader.read_flag(),
+                reader.read_filter(),
+            )
+        elif tag == RECORD_END_CATEGORY:
+            if not depth:
+                raise SnippetCodecError("Лишний конец категории")
+            depth -= 1
+            yield ("end",)
+        elif tag == RECORD_END_DOCUMENT:
+            if depth:
+                raise SnippetCodecError("Незакрытая категория в конце файла")
+            return
+        else:
+            raise SnippetCodecError(f"Неизвестная запись: {tag!r}")
+
+
+def decode_binary(data):
+    root = {}
+    # Стек открытых категорий: (контейнер подкатегорий, payload категории).
+    stack = [(root, None)]
+    for record in iter_binary_records(data):
+        kind = record[0]
+        if kind == "category":
+            _, name, enabled, window_filter = record
+            payload = {"enabled": enabled, "snippets": {}, "categories": {}}
+            if window_filter:
+                payload["window_filter"] = window_filter
+            stack[-1][0][name] = payload
+            stack.append((payload["categories"], payload))
+        elif kind == "snippet":
+            _, abbr, text, enabled, window_filter = record
+            snippet = {"text": text, "enabled": enabled}
+            if window_filter:
+                snippet["window_filter"] = window_filter
+            stack[-1][1]["snippets"][abbr] = snippet
+        else:
+            stack.pop()
+    return wrap_snippet_store(root)
+
+
+def decode_document(data):
+    """Декодирует байты файла сниппетов, определяя формат автоматически."""
+    fmt = detect_format(data[: len(BINARY_MAGIC)])
+    try:
+        if fmt == FORMAT_BINARY:
+            return decode_binary(data)
+        if fmt == FORMAT_JSON_GZIP:
+            data = gzip.decompress(data)
+        return json.loads(data.decode("utf-8-sig"))
+    except (EOFError, OSError, zlib.error, struct.error, UnicodeDecodeError) as e:
+        raise SnippetCodecError(f"Не удалось декодировать файл сниппетов: {e}") from e
+
+
+def load_snippet_document(path):
+    """Читает файл сниппетов любого поддерживаемого формата."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return decode_document(data)
+
+
+def save_snippet_document(path, document, fmt=DEFAULT_FORMAT):
+    """Записывает документ сниппетов в выбранном формате."""
+    data = encode_document(document, fmt)
+    with open(path, "wb") as f:
+        f.write(data)
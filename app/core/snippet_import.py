@@ -0,0 +1,463 @@
+import csv
+import os
+import re
+from collections import namedtuple
+
+from app.core.snippet_codec import load_snippet_document
+from app.core.snippet_store import flatten_snippet_store, new_category_payload
+from app.core.snippet_stream import (
+    build_value,
+    JsonEventReader,
+    skip_value,
+    stream_flat_snippets,
+)
+
+IMPORT_CSV = "csv"
+IMPORT_JSON_MAP = "json-map"
+IMPORT_TEXT_EXPANDER = "text-expander"
+IMPORT_BEEFTEXT = "beeftext"
+IMPORT_ESPANSO = "espanso"
+IMPORT_AHK = "ahk"
+
+IMPORT_FORMAT_LABELS = {
+    IMPORT_CSV: "CSV/TSV (аббревиатура, текст)",
+    IMPORT_JSON_MAP: "JSON {аббревиатура: текст}",
+    IMPORT_TEXT_EXPANDER: "Библиотека Text Expander",
+    IMPORT_BEEFTEXT: "Beeftext (JSON)",
+    IMPORT_ESPANSO: "Espanso (YAML)",
+    IMPORT_AHK: "AutoHotkey (hotstrings)",
+}
+
+IMPORT_FILE_FILTER = (
+    "Библиотеки сниппетов (*.csv *.tsv *.txt *.json *.yml *.yaml *.ahk);;"
+    "Все файлы (*)"
+)
+
+# Заголовки первого столбца CSV, по которым строка заголовка пропускается.
+_CSV_HEADER_NAMES = {
+    "abbr", "abbreviation", "trigger", "keyword", "shortcut", "snippet",
+    "аббревиатура", "сокращение",
+}
+_CATEGORY_KEYS = ("enabled", "snippets", "categories", "window_filter")
+_SNIFF_SIZE = 16 * 1024
+_AHK_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+_AHK_ESCAPE_RE = re.compile(r"`(.)")
+_AHK_COMMENT_RE = re.compile(r"(?<!`)\s+;.*$")
+REPORT_LIMIT = 200
+IMPORT_REPORT_FILENAME = "import_report.txt"
+
+# Запись из внешнего файла; source — номер строки или записи для отчёта.
+ImportRecord = namedtuple("ImportRecord", ("abbr", "text", "window_filter", "source"))
+
+
+class SnippetImportError(ValueError):
+    """Файл импорта не удалось прочитать в выбранном формате."""
+
+
+def _next_event(events):
+    event = next(events, None)
+    if event is None:
+        raise SnippetImportError("Неожиданный конец JSON")
+    return event
+
+
+def _next_value(events):
+    """Событие значения после ключа; потоковый разбор сам его не проверяет."""
+    event = _next_event(events)
+    if event[0] in ("end_map", "end_array", "map_key"):
+        raise SnippetImportError("Ожидалось значение JSON")
+    return event
+
+
+def detect_import_format(path):
+    """Определяет формат по расширению, а для JSON — по первому ключу."""
+    try:
+        return _detect_import_format(path)
+    except SnippetImportError:
+        raise
+    except (ValueError, StopIteration) as e:
+        # JSONDecodeError и SnippetCodecError — тоже ValueError.
+        raise SnippetImportError(f"Не удалось разобрать JSON: {e}") from e
+
+
+def _detect_import_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".csv", ".tsv", ".txt"):
+        return IMPORT_CSV
+    if ext in (".yml", ".yaml"):
+        return IMPORT_ESPANSO
+    if ext == ".ahk":
+        return IMPORT_AHK
+    if ext != ".json":
+        raise SnippetImportError(f"Неизвестный формат файла: {ext or path}")
+    with open(path, "r", encoding="utf-8-sig") as stream:
+        events = JsonEventReader(stream).events()
+        if next(events, (None,))[0] != "start_map":
+            raise SnippetImportError("Ожидался JSON-объект")
+        key_event = next(events, (None, None))
+        if key_event[0] != "map_key":
+            return IMPORT_JSON_MAP
+        key = key_event[1]
+        if key in ("fileFormatVersion", "combos", "groups"):
+            return IMPORT_BEEFTEXT
+        if key in ("schema_version", "categories"):
+            return IMPORT_TEXT_EXPANDER
+        value_event = _next_event(events)
+        if (
+            value_event[0] == "start_map"
+            and _next_event(events)[1] in _CATEGORY_KEYS
+        ):
+            # {категория: {snippets, categories, ...}} — старая схема приложения.
+            return IMPORT_TEXT_EXPANDER
+    return IMPORT_JSON_MAP
+
+
+def _iter_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as stream:
+        head = stream.read(_SNIFF_SIZE)
+        stream.seek(0)
+        if path.lower().endswith(".tsv"):
+            dialect = csv.excel_tab
+        else:
+            try:
+                dialect = csv.Sniffer().sniff(head, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+        reader = csv.reader(stream, dialect)
+        for row in reader:
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if reader.line_num == 1 and row[0].strip().lower() in _CSV_HEADER_NAMES:
+                continue
+            text = row[1] if len(row) > 1 else ""
+            yield ImportRecord(row[0], text, None, reader.line_num)
+
+
+def _iter_json_map(path):
+    """{abbr: text} или {abbr: {"text": ...}}; файл разбирается потоково."""
+    with open(path, "r", encoding="utf-8-sig") as stream:
+        events = JsonEventReader(stream).events()
+        if next(events, (None,))[0] != "start_map":
+            raise SnippetImportError("Ожидался JSON-объект")
+        position = 0
+        for event in events:
+            if event[0] == "end_map":
+                return
+            position += 1
+            value = build_value(events, _next_value(events))
+            if isinstance(value, dict):
+                yield ImportRecord(
+                    event[1],
+                    str(value.get("text", "")),
+                    value.get("window_filter"),
+                    position,
+                )
+            elif isinstance(value, str):
+                yield ImportRecord(event[1], value, None, position)
+            else:
+                yield ImportRecord(event[1], "", None, position)
+
+
+def _iter_text_expander(path):
+    """Библиотека этого приложения: импортируются включённые сниппеты."""
+    flat = stream_flat_snippets(path)
+    if flat is None:
+        flat = flatten_snippet_store(load_snippet_document(path))
+    for position, (abbr, payload) in enumerate(flat.items(), 1):
+        yield ImportRecord(abbr, payload["text"], payload["filter"], position)
+
+
+def _iter_beeftext(path):
+    """Экспорт Beeftext: {"combos": [{"keyword", "snippet", "enabled"}, ...]}."""
+    with open(path, "r", encoding="utf-8-sig") as stream:
+        events = JsonEventReader(stream).events()
+        if next(events, (None,))[0] != "start_map":
+            raise SnippetImportError("Ожидался JSON-объект Beeftext")
+        for event in events:
+            if event[0] == "end_map":
+                return
+            value_event = _next_value(events)
+            if event[1] != "combos" or value_event[0] != "start_array":
+                skip_value(events, value_event)
+                continue
+            position = 0
+            for item_event in events:
+                if item_event[0] == "end_array":
+                    break
+                position += 1
+                combo = build_value(events, item_event)
+                if not isinstance(combo, dict) or not combo.get("enabled", True):
+                    continue
+                yield ImportRecord(
+                    str(combo.get("keyword", "")),
+                    str(combo.get("snippet", "")),
+                    None,
+                    position,
+                )
+
+
+def _iter_espanso(path):
+    """matches: [{trigger | triggers, replace}] из YAML-файла Espanso."""
+    try:
+        import yaml
+    except ImportError:
+        raise SnippetImportError(
+            "Для импорта YAML нужен пакет PyYAML (pip install pyyaml)"
+        )
+    with open(path, "r", encoding="utf-8-sig") as stream:
+        try:
+            document = yaml.safe_load(stream)
+        except yaml.YAMLError as e:
+            raise SnippetImportError(f"Ошибка разбора YAML: {e}")
+    matches = document.get("matches") if isinstance(document, dict) else None
+    for position, match in enumerate(matches or (), 1):
+        if not isinstance(match, dict) or "replace" not in match:
+            continue
+        triggers = match.get("triggers") or [match.get("trigger", "")]
+        for trigger in triggers:
+            yield ImportRecord(str(trigger), str(match["replace"]), None, position)
+
+
+def _unescape_ahk(text):
+    """Escape-последовательности AutoHotkey и комментарий в конце строки."""
+    comment = _AHK_COMMENT_RE.search(text)
+    if comment:
+        text = text[: comment.start()]
+    return _AHK_ESCAPE_RE.sub(
+        lambda match: _AHK_ESCAPES.get(match.group(1), match.group(1)), text
+    )
+
+
+def _iter_ahk(path):
+    """
+    Хотстроки AutoHotkey: ::abbr::text и :опции:abbr::text, а также текст
+    в блоке продолжения ( ... ) на следующих строках. Хотстроки-действия
+    без текста пропускаются.
+    """
+    with open(path, "r", encoding="utf-8-sig") as stream:
+        pending = None
+        block = None
+        for line_num, line in enumerate(stream, 1):
+            line = line.rstrip("\r\n")
+            if block is not None:
+                if line.lstrip().startswith(")"):
+                    yield pending._replace(text="\n".join(block))
+                    pending = block = None
+                else:
+                    block.append(line)
+                continue
+            stripped = line.lstrip()
+            if pending is not None:
+                if stripped.startswith("("):
+                    block = []
+                    continue
+                pending = None
+            if not stripped.startswith(":"):
+                continue
+            options_end = stripped.find(":", 1)
+            if options_end < 0:
+                continue
+            abbr, sep, text = stripped[options_end + 1 :].partition("::")
+            if not sep:
+                continue
+            record = ImportRecord(abbr, _unescape_ahk(text), None, line_num)
+            if record.text.strip():
+                yield record
+            else:
+                pending = record
+
+
+_READERS = {
+    IMPORT_CSV: _iter_csv,
+    IMPORT_JSON_MAP: _iter_json_map,
+    IMPORT_TEXT_EXPANDER: _iter_text_expander,
+    IMPORT_BEEFTEXT: _iter_beeftext,
+    IMPORT_ESPANSO: _iter_espanso,
+    IMPORT_AHK: _iter_ahk,
+}
+
+
+def read_import_file(path, fmt=None):
+    """Потоково читает записи ImportRecord из внешнего файла."""
+    fmt = fmt or detect_import_format(path)
+    reader = _READERS.get(fmt)
+    if reader is None:
+        raise SnippetImportError(f"Неизвестный формат импорта: {fmt}")
+    try:
+        yield from reader(path)
+    except SnippetImportError:
+        raise
+    except (csv.Error, ValueError) as e:
+        # ValueError покрывает JSONDecodeError, UnicodeDecodeError и
+        # SnippetCodecError.
+        raise SnippetImportError(f"Не удалось прочитать файл: {e}") from e
+    except RuntimeError as e:
+        # StopIteration внутри генератора превращается в RuntimeError.
+        if not isinstance(e.__cause__, StopIteration):
+            raise
+        raise SnippetImportError(f"Неожиданный конец файла: {e}") from e
+
+
+class ImportPlan:
+    """
+    Итог проверки импорта до изменения библиотеки.
+
+    added — новые аббревиатуры, existing — уже есть в библиотеке (заменяются
+    только по решению пользователя). Отклонённые записи собираются в
+    отчёт: пустые, с неподдерживаемыми символами и с коллизиями скан-кодов.
+    """
+
+    def __init__(self, fmt):
+        self.format = fmt
+        self.total = 0
+        self.added = {}
+        self.existing = {}
+        self.empty = []
+        self.unsupported = []
+        self.collisions = []
+        self.duplicates = 0
+
+    @property
+    def rejected(self):
+        return len(self.empty) + len(self.unsupported) + len(self.collisions)
+
+    def summary(self):
+        return (
+            f"Записей: {self.total}; новых: {len(self.added)}; "
+            f"уже в библиотеке: {len(self.existing)}; "
+            f"отклонено: {self.rejected} (пустых {len(self.empty)}, "
+            f"неподдерживаемые символы {len(self.unsupported)}, "
+            f"коллизии {len(self.collisions)}); повторов в файле: {self.duplicates}"
+        )
+
+    def report_lines(self, limit=REPORT_LIMIT):
+        lines = [self.summary()]
+        sections = (
+            ("Неподдерживаемые символы", self.unsupported),
+            ("Коллизии скан-кодов", self.collisions),
+            ("Пустые аббревиатура или текст", self.empty),
+        )
+        for title, items in sections:
+            if not items:
+                continue
+            lines.append("")
+            lines.append(f"{title} ({len(items)}):")
+            shown = items if limit is None else items[:limit]
+            for source, abbr, detail in shown:
+                suffix = f" — {detail}" if detail else ""
+                lines.append(f"  [{source}] {abbr!r}{suffix}")
+            if len(shown) < len(items):
+                lines.append(f"  ... и ещё {len(items) - limit}")
+        return lines
+
+
+def plan_import(records, existing_abbrs, build_sequences, fmt=None):
+    """
+    Проверяет записи импорта против библиотеки.
+
+    build_sequences(abbr) -> (последовательности, неподдерживаемые символы) —
+    build_scan_sequences слушателя. Коллизией считается аббревиатура, чьи
+    скан-коды совпадают с другой аббревиатурой библиотеки или импорта: её
+    нельзя было бы отличить при наборе. Повторы в файле — последняя запись
+    побеждает, как в словаре.
+    """
+    plan = ImportPlan(fmt)
+    unique = {}
+    for record in records:
+        plan.total += 1
+        abbr = record.abbr.strip()
+        if abbr in unique:
+            plan.duplicates += 1
+            del unique[abbr]
+        unique[abbr] = record._replace(abbr=abbr)
+
+    existing_abbrs = set(existing_abbrs)
+    owners = {}
+    for abbr in existing_abbrs:
+        for sequence in build_sequences(abbr)[0]:
+            owners.setdefault(tuple(sequence), abbr)
+
+    for abbr, record in unique.items():
+        if not abbr or not record.text.strip():
+            plan.empty.append((record.source, abbr, ""))
+            continue
+        sequences, missing = build_sequences(abbr)
+        if not sequences:
+            plan.unsupported.append(
+                (record.source, abbr, repr("".join(sorted(missing))))
+            )
+            continue
+        keys = [tuple(sequence) for sequence in sequences]
+        other = next(
+            (owners[key] for key in keys if owners.get(key, abbr) != abbr), None
+        )
+        if other is not None:
+            plan.collisions.append((record.source, abbr, f"совпадает с '{other}'"))
+            continue
+        for key in keys:
+            owners[key] = abbr
+        if abbr in existing_abbrs:
+            plan.existing[abbr] = record
+        else:
+            plan.added[abbr] = record
+    return plan
+
+
+def _snippet_payload(record, enabled=True):
+    payload = {"text": record.text, "enabled": enabled}
+    if record.window_filter:
+        payload["window_filter"] = record.window_filter
+    return payload
+
+
+def apply_import(categories, target_path, plan, replace_existing=False):
+    """
+    Применяет план к дереву категорий за один проход.
+
+    Новые сниппеты попадают в категорию target_path (создаётся при
+    необходимости), существующие при replace_existing меняют текст на
+    месте и сохраняют своё состояние включения. Возвращает (добавлено,
+    заменено).
+    """
+    replaced = 0
+    if replace_existing and plan.existing:
+        pending = dict(plan.existing)
+        stack = list(categories.values())
+        while stack and pending:
+            payload = stack.pop()
+            snippets = payload["snippets"]
+            for abbr in [abbr for abbr in pending if abbr in snippets]:
+                record = pending.pop(abbr)
+                snippets[abbr] = _snippet_payload(
+                    record, snippets[abbr].get("enabled", True)
+                )
+                replaced += 1
+            stack.extend(payload["categories"].values())
+
+    if plan.added:
+        container = categories
+        payload = None
+        for name in target_path:
+            payload = container.setdefault(name, new_category_payload())
+            container = payload["categories"]
+        snippets = payload["snippets"]
+        for abbr, record in plan.added.items():
+            snippets[abbr] = _snippet_payload(record)
+    return len(plan.added), replaced
+
+
+def iter_library_abbrs(categories):
+    """Все аббревиатуры дерева категорий, включая выключенные."""
+    stack = list(categories.values())
+    while stack:
+        payload = stack.pop()
+        yield from payload["snippets"]
+        stack.extend(payload["categories"].values())
+
+
+def write_import_report(path, plan, source_path):
+    """Полный отчёт импорта (без ограничения числа строк) в текстовый файл."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"Импорт: {source_path}\n")
+        f.write("\n".join(plan.report_lines(limit=None)))
+        f.write("\n")
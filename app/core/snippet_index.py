@@ -0,0 +1,388 @@
+import bisect
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+from app.core.snippet_template import (
+    OP_TEXT,
+    CompiledTemplate,
+    link_template,
+    parse_template,
+)
+from app.core.text_store import TextStore
+from app.core.window_filter import compile_window_filter, validate_window_filter
+
+
+class SnippetEntry:
+    """
+    Запись индекса сниппетов; __slots__ вместо словаря экономит память.
+
+    Сам текст не хранится: text_ref — ссылка (смещение, длина) в TextStore;
+    filter — скомпилированный WindowPredicate или None; template —
+    CompiledTemplate для текстов с плейсхолдерами, иначе None.
+    """
+
+    __slots__ = ("abbr", "text_ref", "filter", "scan_sequences", "template")
+
+    def __init__(self, abbr, text_ref, window_filter, scan_sequences):
+        self.abbr = abbr
+        self.text_ref = text_ref
+        self.filter = window_filter
+        self.scan_sequences = scan_sequences
+        self.template = None
+
+    def __repr__(self):
+        return f"SnippetEntry({self.abbr!r})"
+
+
+class InternTable:
+    """Таблица интернирования: каждое уникальное значение хранится один раз."""
+
+    __slots__ = ("_values", "requests")
+
+    def __init__(self):
+        self._values = {}
+        self.requests = 0
+
+    def intern(self, key, factory):
+        """Возвращает значение для key, создавая его через factory() один раз."""
+        self.requests += 1
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = factory()
+            return value
+
+    def values(self):
+        return self._values.values()
+
+    def __len__(self):
+        return len(self._values)
+
+
+def window_filter_key(window_filter):
+    """Канонический ключ фильтра окна для интернирования."""
+    return tuple(sorted((str(k), str(v)) for k, v in window_filter.items()))
+
+
+def _compile_filter(abbr, window_filter):
+    error = validate_window_filter(window_filter)
+    if error:
+        logging.warning("[SNIPPET] Фильтр окна у '%s': %s", abbr, error)
+    return compile_window_filter(window_filter)
+
+
+class SnippetBucket:
+    """
+    Скомпилированная корзина сниппетов с одинаковой последовательностью скан-кодов.
+
+    Записи с фильтрами упорядочены по убыванию специфичности фильтра (при
+    равенстве сохраняется порядок добавления). Первая запись без фильтра
+    становится запасным вариантом: всё, что идёт после неё, недостижимо,
+    а если фильтров до неё нет, корзина разрешается без обращения к WinAPI.
+    """
+
+    __slots__ = ("entries", "filtered", "fallback")
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        ranked = sorted(
+            enumerate(self.entries),
+            key=lambda pair: (
+                -(pair[1].filter.specificity if pair[1].filter else 0),
+                pair[0],
+            ),
+        )
+        filtered = []
+        fallback = None
+        for _, entry in ranked:
+            if entry.filter is not None:
+                filtered.append((entry.filter, entry))
+            else:
+                fallback = entry
+                break
+        self.filtered = tuple(filtered)
+        self.fallback = fallback
+
+    @property
+    def needs_window(self):
+        """True, если для разрешения корзины нужны сведения об активном окне."""
+        return bool(self.filtered)
+
+    def resolve(self, window_info):
+        """
+        Возвращает подходящую запись или None.
+
+        window_info — любой объект с атрибутами title/window_class/process_name,
+        обычно неизменяемый снимок WindowContext.
+        """
+        for predicate, entry in self.filtered:
+            if predicate.matches(window_info):
+                return entry
+        return self.fallback
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+WINDOW_VIEW_CACHE_SIZE = 16
+
+_STATIC = object()
+
+
+class WindowView:
+    """
+    Срез индекса для одного окна: корзины с фильтрами, уже разрешённые.
+
+    overrides содержит только корзины с фильтрами (запись или None, если ни
+    один фильтр не подошёл); остальные ключи берутся из общей таблицы
+    корзин без фильтров, поэтому срез не копирует весь индекс.
+    """
+
+    __slots__ = ("overrides", "_static")
+
+    def __init__(self, overrides, static):
+        self.overrides = overrides
+        self._static = static
+
+    def lookup(self, seq_key):
+        entry = self.overrides.get(seq_key, _STATIC)
+        if entry is _STATIC:
+            return self._static.get(seq_key)
+        return entry
+
+
+class WindowViewCache:
+    """
+    LRU-кэш срезов индекса по сведениям об окне.
+
+    Ключ — значения только тех атрибутов окна, которые нужны хотя бы одному
+    фильтру, поэтому окна, неразличимые для фильтров, делят один срез.
+    Кэш принадлежит индексу и сбрасывается вместе с ним при перезагрузке.
+    """
+
+    def __init__(self, static, filtered, maxsize=WINDOW_VIEW_CACHE_SIZE):
+        self._static = static
+        self._filtered = filtered
+        attributes = set()
+        for bucket in filtered.values():
+            for predicate, _ in bucket.filtered:
+                attributes.update(predicate.needs)
+        self.attributes = tuple(sorted(attributes))
+        self._maxsize = maxsize
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key_of(self, window_info):
+        return tuple(getattr(window_info, name) for name in self.attributes)
+
+    def view_for(self, window_info):
+        """Возвращает срез для окна, вычисляя его при первом обращении."""
+        key = self.key_of(window_info)
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                self.hits += 1
+                return view
+            self.misses += 1
+        overrides = {
+            seq_key: bucket.resolve(window_info)
+            for seq_key, bucket in self._filtered.items()
+        }
+        view = WindowView(overrides, self._static)
+        with self._lock:
+            self._views[key] = view
+            while len(self._views) > self._maxsize:
+                self._views.popitem(last=False)
+        return view
+
+    def footprint(self):
+        getsizeof = sys.getsizeof
+        with self._lock:
+            views = list(self._views.values())
+        return getsizeof(self._static) + getsizeof(self._filtered) + sum(
+            getsizeof(view) + getsizeof(view.overrides) for view in views
+        )
+
+    def __len__(self):
+        return len(self._views)
+
+
+# Больше любого скан-кода: prefix + (_PREFIX_END,) идёт после всех
+# последовательностей с этим префиксом.
+_PREFIX_END = float("inf")
+
+
+class SnippetIndex:
+    """
+    Индекс сниппетов слушателя: по аббревиатуре и по скан-кодам.
+
+    Фильтры окон компилируются в предикаты и интернируются при построении,
+    поэтому одинаковые фильтры категорий хранятся в одном экземпляре. Тексты вынесены в TextStore,
+    так что резидентная память растёт с числом аббревиатур, а не с объёмом
+    текстов.
+    """
+
+    def __init__(self, text_directory=None):
+        self.by_abbr = {}
+        self.by_scan = {}
+        # Отсортированные последовательности для поиска по префиксу.
+        self.sorted_scans = ()
+        self.filters = InternTable()
+        self.text_store = TextStore(text_directory)
+        self.views = WindowViewCache({}, {})
+        self.template_count = 0
+        # Тексты с фигурными скобками до компиляции шаблонов: после seal()
+        # хранилище читается только через mmap.
+        self._template_sources = {}
+
+    def store_text(self, text):
+        """Записывает текст в хранилище; годится для потоковой загрузки."""
+        ref = self.text_store.add(text)
+        if "{" in text:
+            self._template_sources[ref] = text
+        return ref
+
+    def add(self, abbr, text, window_filter, scan_sequences):
+        """text — строка или ссылка, уже полученная через store_text()."""
+        predicate = None
+        if window_filter:
+            predicate = self.filters.intern(
+                window_filter_key(window_filter),
+                lambda: _compile_filter(abbr, window_filter),
+            )
+        text_ref = self.store_text(text) if isinstance(text, str) else text
+        entry = SnippetEntry(abbr, text_ref, predicate, tuple(scan_sequences))
+        self.by_abbr[abbr] = entry
+        return entry
+
+    def compile_buckets(self, raw_buckets):
+        # Корзины компилируются один раз: порядок проверки фильтров и запасной
+        # вариант без фильтра вычисляются здесь, а не при каждом срабатывании.
+        self.by_scan = {
+            seq_key: SnippetBucket(bucket) for seq_key, bucket in raw_buckets.items()
+        }
+        # Корзины без фильтров разрешаются один раз для всех окон; корзины
+        # с фильтрами разрешаются в срезах WindowViewCache под каждое окно.
+        static = {}
+        filtered = {}
+        for seq_key, bucket in self.by_scan.items():
+            if bucket.needs_window:
+                filtered[seq_key] = bucket
+            elif bucket.fallback is not None:
+                static[seq_key] = bucket.fallback
+        self.views = WindowViewCache(static, filtered)
+        self.sorted_scans = tuple(sorted(self.by_scan))
+        self.text_store.seal()
+        self.compile_templates()
+
+    def compile_templates(self):
+        """
+        Разбирает плейсхолдеры один раз при построении индекса: при раскрытии
+        остаётся только CompiledTemplate.render(). Ссылки {snippet:...}
+        подставляются здесь же.
+        """
+        sources, self._template_sources = self._template_sources, {}
+        parsed = {}
+        for abbr, entry in self.by_abbr.items():
+            source = sources.get(entry.text_ref)
+            if source is None:
+                continue
+            ops = parse_template(source)
+            if ops is not None:
+                parsed[abbr] = ops
+
+        def resolve(abbr):
+            ops = parsed.get(abbr)
+            if ops is not None:
+                return ops
+            entry = self.by_abbr.get(abbr)
+            if entry is None:
+                return None
+            return [(OP_TEXT, self.text_of(entry))]
+
+        for abbr, ops in parsed.items():
+            self.by_abbr[abbr].template = CompiledTemplate(
+                link_template(ops, resolve, (abbr,))
+            )
+        self.template_count = len(parsed)
+
+    def lookup(self, seq_key, window_info):
+        """Находит запись для последовательности скан-кодов в данном окне."""
+        return self.views.view_for(window_info).lookup(seq_key)
+
+    def prefix_range(self, prefix, lo=0, hi=None):
+        """
+        Границы [lo, hi) последовательностей sorted_scans, начинающихся с prefix
+        (включая равную ему). Диапазон для более короткого префикса можно
+        передать в lo/hi: при наборе он только сужается.
+        """
+        scans = self.sorted_scans
+        if hi is None:
+            hi = len(scans)
+        start = bisect.bisect_left(scans, prefix, lo, hi)
+        end = bisect.bisect_left(scans, prefix + (_PREFIX_END,), start, hi)
+        return start, end
+
+    def text_of(self, entry):
+        return self.text_store.get(entry.text_ref)
+
+    def expansion_of(self, entry):
+        """Что вставлять: готовая строка или CompiledTemplate для рендера."""
+        if entry.template is not None:
+            return entry.template
+        return self.text_store.get(entry.text_ref)
+
+    def close(self):
+        """Закрывает хранилище текстов; после этого индекс не используется."""
+        self.text_store.close()
+
+    def memory_footprint(self):
+        """Оценка занимаемой индексом памяти в байтах (по sys.getsizeof)."""
+        getsizeof = sys.getsizeof
+        entries = getsizeof(self.by_abbr)
+        for entry in self.by_abbr.values():
+            entries += getsizeof(entry) + getsizeof(entry.scan_sequences)
+            entries += getsizeof(entry.text_ref)
+            entries += sum(getsizeof(seq) for seq in entry.scan_sequences)
+        buckets = getsizeof(self.by_scan) + getsizeof(self.sorted_scans)
+        for bucket in self.by_scan.values():
+            buckets += getsizeof(bucket) + getsizeof(bucket.entries)
+            buckets += getsizeof(bucket.filtered)
+        buckets += self.views.footprint()
+        filters = sum(
+            getsizeof(predicate) + getsizeof(predicate.needs)
+            for predicate in self.filters.values()
+            if predicate is not None
+        )
+        texts = self.text_store.resident_bytes()
+        return {
+            "entries": entries,
+            "buckets": buckets,
+            "texts": texts,
+            "filters": filters,
+            "total": entries + buckets + texts + filters,
+            "text_store": self.text_store.size,
+        }
+
+    def describe_memory(self):
+        footprint = self.memory_footprint()
+        return (
+            f"{footprint['total'] / 1024:.1f} КБ (записи {footprint['entries']}, "
+            f"корзины {footprint['buckets']}, кэш текстов {footprint['texts']}, "
+            f"фильтры {footprint['filters']} [{len(self.filters)} уник. из "
+            f"{self.filters.requests}]); файл текстов {footprint['text_store']} Б "
+            f"[{self.text_store.distinct_count} уник. из {self.text_store.requests}]; "
+            f"срезы окон: {len(self.views)}, попаданий {self.views.hits}, "
+            f"промахов {self.views.misses}; шаблонов: {self.template_count}"
+        )
+
+    def __len__(self):
+        return len(self.by_abbr)
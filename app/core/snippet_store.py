@@ -0,0 +1,260 @@
+SCHEMA_VERSION = 2
+SCHEMA_VERSION_KEY = "schema_version"
+CATEGORIES_KEY = "categories"
+DEFAULT_CATEGORY_NAME = "Без категории"
+
+_CATEGORY_SERVICE_KEYS = {"enabled", "categories", "window_filter"}
+
+
+def new_category_payload(enabled=True):
+    return {"enabled": bool(enabled), "snippets": {}, "categories": {}}
+
+
+def is_versioned_document(data):
+    """True, если документ обёрнут в номер текущей версии схемы."""
+    return (
+        isinstance(data, dict)
+        and data.get(SCHEMA_VERSION_KEY) == SCHEMA_VERSION
+        and isinstance(data.get(CATEGORIES_KEY), dict)
+    )
+
+
+def _is_current_category(payload):
+    if not isinstance(payload, dict):
+        return False
+    snippets = payload.get("snippets")
+    categories = payload.get("categories")
+    if not isinstance(snippets, dict) or not isinstance(categories, dict):
+        return False
+    for snippet in snippets.values():
+        if not (
+            isinstance(snippet, dict)
+            and isinstance(snippet.get("text"), str)
+            and isinstance(snippet.get("enabled"), bool)
+        ):
+            return False
+    return all(_is_current_category(sub) for sub in categories.values())
+
+
+def is_current_schema(data):
+    """
+    True, если файл записан текущей версией приложения и уже нормализован.
+
+    Кроме номера версии проверяется форма дерева (без копирования): файл,
+    испорченный вручную или другой программой, идёт через миграцию, а не
+    падает на быстром пути.
+    """
+    return is_versioned_document(data) and all(
+        _is_current_category(payload) for payload in data[CATEGORIES_KEY].values()
+    )
+
+
+def wrap_snippet_store(categories):
+    """Оборачивает дерево категорий в документ с номером версии схемы."""
+    return {SCHEMA_VERSION_KEY: SCHEMA_VERSION, CATEGORIES_KEY: categories}
+
+
+def normalize_category_payload(payload):
+    needs_resave = False
+    if not isinstance(payload, dict):
+        return new_category_payload(), True
+
+    normalized_payload = new_category_payload(enabled=payload.get("enabled", True))
+
+    # Сохраняем window_filter категории, если он есть
+    if "window_filter" in payload and payload.get("window_filter"):
+        normalized_payload["window_filter"] = payload["window_filter"]
+
+    snippets_block = {}
+    if "snippets" in payload and isinstance(payload.get("snippets"), dict):
+        snippets_block = payload.get("snippets") or {}
+    else:
+        snippets_block = {
+            key: value
+            for key, value in payload.items()
+            if key not in _CATEGORY_SERVICE_KEYS
+        }
+        if snippets_block:
+            needs_resave = True
+
+    normalized_snippets = {}
+    for abbr, snippet_payload in snippets_block.items():
+        snippet_window_filter = None
+        if isinstance(snippet_payload, dict):
+            snippet_text = str(snippet_payload.get("text", ""))
+            snippet_enabled = bool(snippet_payload.get("enabled", True))
+            # Сохраняем window_filter сниппета
+            snippet_window_filter = snippet_payload.get("window_filter")
+            if "text" not in snippet_payload or "enabled" not in snippet_payload:
+                needs_resave = True
+        else:
+            snippet_text = str(snippet_payload) if snippet_payload else ""
+            snippet_enabled = True
+            needs_resave = True
+
+        snippet_data = {
+            "text": snippet_text,
+            "enabled": snippet_enabled,
+        }
+        # Добавляем window_filter только если он есть
+        if snippet_window_filter:
+            snippet_data["window_filter"] = snippet_window_filter
+
+        normalized_snippets[abbr] = snippet_data
+
+    raw_subcategories = payload.get("categories", {})
+    normalized_subcategories = {}
+    if isinstance(raw_subcategories, dict):
+        for sub_name, sub_payload in raw_subcategories.items():
+            normalized_child, child_resave = normalize_category_payload(sub_payload)
+            normalized_subcategories[sub_name] = normalized_child
+            needs_resave = needs_resave or child_resave
+    elif raw_subcategories:
+        needs_resave = True
+
+    normalized_payload["snippets"] = normalized_snippets
+    normalized_payload["categories"] = normalized_subcategories
+    return normalized_payload, needs_resave
+
+
+def normalize_snippet_store(data):
+    """
+    Приводит документ сниппетов к дереву категорий текущей схемы.
+
+    Файлы текущей версии схемы уже нормализованы и возвращаются как есть;
+    полная рекурсивная миграция выполняется только для старых файлов,
+    и тогда needs_resave=True, чтобы файл был переписан один раз.
+    """
+    if is_current_schema(data):
+        return data[CATEGORIES_KEY], False
+
+    normalized = {}
+    if not isinstance(data, dict):
+        return normalized, True
+    if is_versioned_document(data):
+        # Номер версии есть, но дерево повреждено: мигрируем категории.
+        data = data[CATEGORIES_KEY]
+    elif data and all(isinstance(v, str) for v in data.values()):
+        normalized[DEFAULT_CATEGORY_NAME] = {
+            "enabled": True,
+            "snippets": {
+                abbr: {"text": str(text), "enabled": True}
+                for abbr, text in data.items()
+            },
+            "categories": {},
+        }
+        return normalized, True
+
+    for category_name, payload in data.items():
+        normalized_payload, _ = normalize_category_payload(payload)
+        normalized[category_name] = normalized_payload
+
+    # Файл без номера версии переписывается в любом случае, чтобы следующая
+    # загрузка пошла по быстрому пути.
+    return normalized, True
+
+
+def _flatten_current_categories(categories, flat_snippets, inherited_filter=None):
+    for payload in categories.values():
+        # Если у категории нет своего фильтра, наследуем от родителя
+        effective_filter = payload.get("window_filter") or inherited_filter
+        for abbr, snippet in payload["snippets"].items():
+            if not snippet["enabled"]:
+                continue
+            flat_snippets[abbr] = {
+                "text": snippet["text"],
+                "filter": snippet.get("window_filter") or effective_filter,
+            }
+        if payload["categories"]:
+            _flatten_current_categories(
+                payload["categories"], flat_snippets, effective_filter
+            )
+
+
+def _flatten_legacy_payload(
+    payload, flat_snippets, default_enabled=True, inherited_filter=None
+):
+    if not isinstance(payload, dict):
+        return
+    category_default_enabled = payload.get("enabled", default_enabled)
+    # Получаем window_filter категории (если есть)
+    category_filter = payload.get("window_filter")
+    # Если у категории нет своего фильтра, наследуем от родителя
+    effective_filter = category_filter if category_filter else inherited_filter
+
+    snippets_block = payload.get("snippets")
+    if not isinstance(snippets_block, dict):
+        snippets_block = {
+            key: value
+            for key, value in payload.items()
+            if key not in _CATEGORY_SERVICE_KEYS
+        }
+
+    for abbr, snippet_payload in snippets_block.items():
+        if isinstance(snippet_payload, dict):
+            snippet_text = snippet_payload.get("text", "")
+            snippet_enabled = snippet_payload.get("enabled")
+            # Сниппет может иметь свой фильтр или наследовать от категории
+            snippet_filter = snippet_payload.get("window_filter")
+            if not snippet_filter:
+                snippet_filter = effective_filter
+        else:
+            snippet_text = snippet_payload
+            snippet_enabled = None
+            snippet_filter = effective_filter
+        if snippet_enabled is None:
+            snippet_enabled = category_default_enabled
+        if not snippet_enabled:
+            continue
+        if not isinstance(snippet_text, str):
+            snippet_text = str(snippet_text)
+        flat_snippets[abbr] = {
+            "text": snippet_text,
+            "filter": snippet_filter,
+        }
+
+    subcategories = payload.get("categories", {})
+    if isinstance(subcategories, dict):
+        for sub_payload in subcategories.values():
+            _flatten_legacy_payload(
+                sub_payload,
+                flat_snippets,
+                category_default_enabled,
+                effective_filter,
+            )
+
+
+def flatten_snippet_store(data):
+    """
+    Разворачивает документ сниппетов в словарь abbr -> {text, filter}.
+
+    Для файлов текущей схемы структура доверенная и обходится напрямую;
+    разбор устаревших форматов выполняется только для старых файлов.
+    """
+    flat_snippets = {}
+    if is_current_schema(data):
+        _flatten_current_categories(data[CATEGORIES_KEY], flat_snippets)
+        return flat_snippets
+
+    if not isinstance(data, dict):
+        # Неподдерживаемый тип (для совместимости).
+        return flat_snippets
+
+    if is_versioned_document(data):
+        for payload in data[CATEGORIES_KEY].values():
+            _flatten_legacy_payload(payload, flat_snippets)
+        return flat_snippets
+
+    is_flat = bool(data) and all(isinstance(v, str) for v in data.values())
+    if is_flat:
+        # Плоский формат без фильтров (для обратной совместимости)
+        return {
+            abbr: {"text": text, "filter": None}
+            for abbr, text in data.items()
+            if isinstance(text, str)
+        }
+
+    # Иерархический формат: category -> {enabled, snippets, categories, window_filter}
+    for payload in data.values():
+        _flatten_legacy_payload(payload, flat_snippets)
+    return flat_snippets
@@ -0,0 +1,381 @@
+import gzip
+import json
+import mmap
+import re
+from json.decoder import scanstring
+
+from app.core.snippet_codec import (
+    BINARY_MAGIC,
+    FORMAT_BINARY,
+    FORMAT_JSON_GZIP,
+    SnippetCodecError,
+    detect_format,
+    iter_binary_records,
+)
+from app.core.snippet_store import CATEGORIES_KEY, SCHEMA_VERSION, SCHEMA_VERSION_KEY
+
+CHUNK_SIZE = 64 * 1024
+
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+# Символ, на котором заканчивается число.
+_SCALAR_END_RE = re.compile(r"[,\]}\s]")
+_WHITESPACE = " \t\n\r"
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+class JsonEventReader:
+    """
+    Потоковый разбор JSON в последовательность событий (как в ijson).
+
+    Документ читается порциями, в памяти держится только необработанный
+    хвост буфера и текущая строка, а не всё дерево целиком. events() выдаёт
+    пары (вид, значение): start_map, end_map, start_array, end_array,
+    map_key, string, number, boolean и null. Используется и при импорте.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_size=1):
+        """Дочитывает поток, пока в буфере нет min_size символов (или EOF)."""
+        if self._pos > self._chunk_size:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        read_size = self._chunk_size
+        while not self._eof and len(self._buf) - self._pos < min_size:
+            chunk = self._stream.read(read_size)
+            if not chunk:
+                self._eof = True
+                break
+            self._buf += chunk
+            # Длинные строки дочитываются удваивающимися порциями.
+            read_size *= 2
+        return len(self._buf) - self._pos >= min_size
+
+    def _next_char(self):
+        while True:
+            if not self._fill():
+                return ""
+            buf = self._buf
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+
+    def _read_string(self):
+        while True:
+            try:
+                value, end = scanstring(self._buf, self._pos + 1)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill(len(self._buf) - self._pos + self._chunk_size)
+                continue
+            self._pos = end
+            return value
+
+    def _read_scalar(self, ch):
+        if ch in "tfn":
+            for literal, value in _LITERALS.items():
+                if literal[0] == ch:
+                    self._fill(len(literal))
+                    if self._buf.startswith(literal, self._pos):
+                        self._pos += len(literal)
+                        return ("boolean" if value is not None else "null", value)
+            raise SnippetCodecError(f"Некорректный литерал в позиции {self._pos}")
+        # Число могло оборваться на границе порции ("-", "2." или "1e"):
+        # сначала дочитываем до разделителя после него.
+        while not self._eof and not _SCALAR_END_RE.search(self._buf, self._pos):
+            self._fill(len(self._buf) - self._pos + 64)
+        match = _NUMBER_RE.match(self._buf, self._pos)
+        if not match:
+            raise SnippetCodecError(f"Некорректное значение в позиции {self._pos}")
+        self._pos = match.end()
+        return ("number", json.loads(match.group()))
+
+    def events(self):
+        # Стек контейнеров: True — объект, False — массив.
+        stack = []
+        expect_key = False
+        while True:
+            ch = self._next_char()
+            if not ch:
+                if stack:
+                    raise SnippetCodecError("Неожиданный конец JSON")
+                return
+            if ch in ",:":
+                self._pos += 1
+                if ch == ",":
+                    expect_key = bool(stack and stack[-1])
+                continue
+            if ch == "{":
+                self._pos += 1
+                stack.append(True)
+                expect_key = True
+                yield ("start_map", None)
+            elif ch == "}":
+                self._pos += 1
+                stack.pop()
+                expect_key = False
+                yield ("end_map", None)
+            elif ch == "[":
+                self._pos += 1
+                stack.append(False)
+                expect_key = False
+                yield ("start_array", None)
+            elif ch == "]":
+                self._pos += 1
+                stack.pop()
+                yield ("end_array", None)
+            elif ch == '"':
+                value = self._read_string()
+                if expect_key:
+                    expect_key = False
+                    yield ("map_key", value)
+                else:
+                    yield ("string", value)
+            else:
+                yield self._read_scalar(ch)
+            if not stack:
+                return
+
+
+def build_value(events, event):
+    """Материализует небольшое поддерево (например, фильтр окна)."""
+    kind, value = event
+    if kind == "start_map":
+        result = {}
+        for key_event in events:
+            if key_event[0] == "end_map":
+                return result
+            result[key_event[1]] = build_value(events, next(events))
+        raise SnippetCodecError("Неожиданный конец JSON")
+    if kind == "start_array":
+        result = []
+        for item_event in events:
+            if item_event[0] == "end_array":
+                return result
+            result.append(build_value(events, item_event))
+        raise SnippetCodecError("Неожиданный конец JSON")
+    return value
+
+
+def skip_value(events, event):
+    """Пропускает значение, начатое событием event, вместе с поддеревом."""
+    depth = 1 if event[0] in ("start_map", "start_array") else 0
+    while depth:
+        kind = next(events)[0]
+        if kind in ("start_map", "start_array"):
+            depth += 1
+        elif kind in ("end_map", "end_array"):
+            depth -= 1
+
+
+class _CategoryContext:
+    """Категория при потоковом обходе; её фильтр может прийти после сниппетов."""
+
+    __slots__ = ("parent", "window_filter")
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.window_filter = None
+
+    def effective_filter(self):
+        context = self
+        while context is not None:
+            if context.window_filter:
+                return context.window_filter
+            context = context.parent
+        return None
+
+
+class _NotCurrentSchema(Exception):
+    """Форма дерева не совпадает с текущей схемой: нужен полный разбор."""
+
+
+def _expect_map(events):
+    kind, _ = next(events)
+    if kind != "start_map":
+        raise _NotCurrentSchema(kind)
+
+
+def _walk_snippets(events, context, collector):
+    for event in events:
+        if event[0] == "end_map":
+            return
+        abbr = event[1]
+        _expect_map(events)
+        text = ""
+        enabled = True
+        own_filter = None
+        for field_event in events:
+            if field_event[0] == "end_map":
+                break
+            field = field_event[1]
+            value_event = next(events)
+            if field == "text":
+                text = build_value(events, value_event)
+            elif field == "enabled":
+                enabled = build_value(events, value_event)
+            elif field == "window_filter":
+                own_filter = build_value(events, value_event)
+            else:
+                skip_value(events, value_event)
+        if not isinstance(text, str) or not isinstance(enabled, bool):
+            raise _NotCurrentSchema(abbr)
+        if enabled:
+            collector.add(abbr, text, own_filter, context)
+
+
+def _walk_categories(events, parent_context, collector):
+    for event in events:
+        if event[0] == "end_map":
+            return
+        context = _CategoryContext(parent_context)
+        _expect_map(events)
+        for field_event in events:
+            if field_event[0] == "end_map":
+                break
+            field = field_event[1]
+            value_event = next(events)
+            if field == "snippets" and value_event[0] == "start_map":
+                _walk_snippets(events, context, collector)
+            elif field == "categories" and value_event[0] == "start_map":
+                _walk_categories(events, context, collector)
+            elif field == "window_filter":
+                context.window_filter = build_value(events, value_event)
+            else:
+                skip_value(events, value_event)
+
+
+class _SnippetCollector:
+    """
+    Собирает развёрнутые сниппеты при потоковом обходе.
+
+    Текст отдаётся в store_text только для аббревиатур, которые принимает
+    accept_abbr, поэтому неподдерживаемые аббревиатуры не оставляют текстов
+    в хранилище. Повтор аббревиатуры в другой категории заменяет прежнюю
+    запись, как и при полном разборе; текст заменённой записи к этому
+    моменту уже записан и остаётся в хранилище до следующей перезагрузки
+    (одинаковые тексты TextStore записывает один раз).
+    """
+
+    __slots__ = ("pending", "_store_text", "_accept_abbr")
+
+    def __init__(self, store_text, accept_abbr):
+        self.pending = {}
+        self._store_text = store_text
+        self._accept_abbr = accept_abbr
+
+    def add(self, abbr, text, own_filter, context):
+        if self._accept_abbr is not None and not self._accept_abbr(abbr):
+            return
+        self.pending[abbr] = (self._store_text(text), own_filter, context)
+
+    def resolve(self):
+        return {
+            abbr: {"text": text, "filter": own_filter or context.effective_filter()}
+            for abbr, (text, own_filter, context) in self.pending.items()
+        }
+
+
+def _stream_json(stream, collector):
+    events = JsonEventReader(stream).events()
+    if next(events, (None,))[0] != "start_map":
+        return None
+    key_event = next(events, (None, None))
+    # Быстрый путь доступен только файлам текущей схемы, у которых номер
+    # версии записан первым ключом (так пишет _save_snippets_to_file).
+    if key_event != ("map_key", SCHEMA_VERSION_KEY):
+        return None
+    if next(events) != ("number", SCHEMA_VERSION):
+        return None
+    try:
+        for event in events:
+            if event[0] == "end_map":
+                break
+            value_event = next(events)
+            if event[1] == CATEGORIES_KEY and value_event[0] == "start_map":
+                _walk_categories(events, None, collector)
+            else:
+                skip_value(events, value_event)
+    except _NotCurrentSchema:
+        # Повреждённый файл текущей версии разбирается целиком с миграцией.
+        return None
+    return collector.resolve()
+
+
+def _stream_binary(data, collector):
+    context = None
+    records = iter_binary_records(data)
+    try:
+        for record in records:
+            kind = record[0]
+            if kind == "category":
+                context = _CategoryContext(context)
+                context.window_filter = record[3]
+            elif kind == "snippet":
+                _, abbr, text, enabled, own_filter = record
+                if enabled:
+                    collector.add(abbr, text, own_filter, context)
+            else:
+                if context is None:
+                    raise SnippetCodecError("Лишний конец категории")
+                context = context.parent
+    finally:
+        # Освобождаем ссылки на отображённый файл до его закрытия.
+        records.close()
+    return collector.resolve()
+
+
+def _keep_text(text):
+    return text
+
+
+def stream_flat_snippets(path, store_text=None, accept_abbr=None):
+    """
+    Потоково разворачивает файл сниппетов в словарь abbr -> {text, filter}.
+
+    Исходное дерево не материализуется: категории и сниппеты обходятся как
+    события, поэтому пиковая память ограничена размером результата, а не
+    документа. Возвращает None, если файл не в текущей схеме, — тогда нужен
+    полный разбор с миграцией устаревшего формата.
+
+    store_text, если задан, получает каждый текст сразу при разборе и
+    возвращает то, что попадёт в поле "text" (например, ссылку в TextStore).
+    accept_abbr, если задан, отсеивает аббревиатуры до записи их текстов:
+    отвергнутые в результат не попадают.
+    """
+    collector = _SnippetCollector(store_text or _keep_text, accept_abbr)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(BINARY_MAGIC))
+            fmt = detect_format(head)
+            if fmt == FORMAT_BINARY:
+                f.seek(0)
+                # Записи читаются прямо из отображённого в память файла.
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return _stream_binary(mapped, collector)
+        if fmt == FORMAT_JSON_GZIP:
+            with gzip.open(path, "rt", encoding="utf-8") as stream:
+                return _stream_json(stream, collector)
+        with open(path, "r", encoding="utf-8-sig") as stream:
+            return _stream_json(stream, collector)
+    except SnippetCodecError:
+        raise
+    except (
+        StopIteration,
+        EOFError,
+        UnicodeDecodeError,
+        ValueError,
+        AttributeError,
+    ) as e:
+        # JSONDecodeError и ошибки фильтров окна в бинарных записях —
+        # тоже ValueError.
+        raise SnippetCodecError(f"Не удалось разобрать файл сниппетов: {e}") from e
@@ -0,0 +1,165 @@
+import logging
+import time
+
+OP_TEXT = 0
+OP_DATE = 1
+OP_TIME = 2
+OP_CLIPBOARD = 3
+OP_CURSOR = 4
+OP_SNIPPET = 5
+
+DEFAULT_DATE_FORMAT = "%d.%m.%Y"
+DEFAULT_TIME_FORMAT = "%H:%M"
+
+
+def _parse_placeholder(body):
+    """Разбирает содержимое {...}; None — это не плейсхолдер, а обычный текст."""
+    name, sep, arg = body.partition(":")
+    name = name.strip()
+    if name == "date":
+        return (OP_DATE, arg if sep and arg else DEFAULT_DATE_FORMAT)
+    if name == "time":
+        return (OP_TIME, arg if sep and arg else DEFAULT_TIME_FORMAT)
+    if name == "clipboard" and not sep:
+        return (OP_CLIPBOARD, None)
+    if name == "cursor" and not sep:
+        return (OP_CURSOR, None)
+    if name == "snippet" and arg.strip():
+        return (OP_SNIPPET, arg.strip())
+    return None
+
+
+def _append_text(ops, text):
+    if not text:
+        return
+    if ops and ops[-1][0] == OP_TEXT:
+        ops[-1] = (OP_TEXT, ops[-1][1] + text)
+    else:
+        ops.append((OP_TEXT, text))
+
+
+def parse_template(text):
+    """
+    Разбирает текст сниппета в список операций.
+
+    Поддерживаются {date}, {date:формат}, {time}, {time:формат}, {clipboard},
+    {cursor} и {snippet:аббревиатура}. Прочие фигурные скобки остаются
+    текстом, а {{date}} даёт буквальное {date}. Возвращает None, если
+    текст не содержит ни плейсхолдеров, ни экранирования.
+    """
+    if "{" not in text:
+        return None
+    ops = []
+    changed = False
+    pos = 0
+    length = len(text)
+    while pos < length:
+        start = text.find("{", pos)
+        if start < 0:
+            _append_text(ops, text[pos:])
+            break
+        _append_text(ops, text[pos:start])
+        if text.startswith("{{", start):
+            end = text.find("}}", start + 2)
+            if end >= 0 and _parse_placeholder(text[start + 2 : end]) is not None:
+                _append_text(ops, text[start + 1 : end + 1])
+                changed = True
+                pos = end + 2
+                continue
+        end = text.find("}", start + 1)
+        if end < 0:
+            _append_text(ops, text[start:])
+            break
+        op = _parse_placeholder(text[start + 1 : end])
+        if op is None:
+            _append_text(ops, "{")
+            pos = start + 1
+            continue
+        ops.append(op)
+        changed = True
+        pos = end + 1
+    return ops if changed else None
+
+
+def link_template(ops, resolve, stack=()):
+    """
+    Подставляет {snippet:...}: resolve(abbr) возвращает список операций
+    вложенного сниппета или None, если такого нет. stack — цепочка
+    раскрываемых аббревиатур (начиная с самого сниппета). Циклы и ссылки на
+    несуществующие сниппеты остаются текстом с предупреждением в журнале.
+    """
+    linked = []
+    for op, arg in ops:
+        if op != OP_SNIPPET:
+            if op == OP_TEXT:
+                _append_text(linked, arg)
+            else:
+                linked.append((op, arg))
+            continue
+        literal = "{snippet:" + arg + "}"
+        if arg in stack:
+            logging.warning(
+                "[SNIPPET] Циклическая ссылка: %s", " -> ".join(stack + (arg,))
+            )
+            _append_text(linked, literal)
+            continue
+        nested = resolve(arg)
+        if nested is None:
+            logging.warning("[SNIPPET] Ссылка на неизвестный сниппет '%s'", arg)
+            _append_text(linked, literal)
+            continue
+        for nested_op, nested_arg in link_template(nested, resolve, stack + (arg,)):
+            if nested_op == OP_TEXT:
+                _append_text(linked, nested_arg)
+            elif nested_op == OP_CURSOR:
+                # Курсор ставит только внешний сниппет.
+                continue
+            else:
+                linked.append((nested_op, nested_arg))
+    return linked
+
+
+class CompiledTemplate:
+    """
+    Скомпилированный шаблон: кортеж операций без вложенных ссылок.
+
+    render() — линейный проход без разбора и регулярных выражений. Если в
+    шаблоне нет даты, времени и буфера обмена, результат вычисляется при
+    компиляции и render() возвращает его готовым. cursor_back — сколько
+    символов остаётся после {cursor}: на столько курсор сдвигается влево.
+    """
+
+    __slots__ = ("ops", "needs_clipboard", "rendered")
+
+    def __init__(self, ops):
+        self.ops = tuple(ops)
+        self.needs_clipboard = any(op == OP_CLIPBOARD for op, _ in self.ops)
+        dynamic = any(op in (OP_DATE, OP_TIME, OP_CLIPBOARD) for op, _ in self.ops)
+        self.rendered = None if dynamic else self._render(None, "")
+
+    def render(self, now=None, clipboard=""):
+        """Возвращает (текст, cursor_back)."""
+        if self.rendered is not None:
+            return self.rendered
+        return self._render(now if now is not None else time.localtime(), clipboard)
+
+    def _render(self, now, clipboard):
+        parts = []
+        cursor_at = None
+        for op, arg in self.ops:
+            if op == OP_TEXT:
+                parts.append(arg)
+            elif op == OP_DATE or op == OP_TIME:
+                parts.append(time.strftime(arg, now))
+            elif op == OP_CLIPBOARD:
+                parts.append(clipboard or "")
+            elif op == OP_CURSOR and cursor_at is None:
+                cursor_at = len(parts)
+        text = "".join(parts)
+        cursor_back = 0
+        if cursor_at is not None:
+            cursor_back = sum(len(part) for part in parts[cursor_at:])
+        return text, cursor_back
+
+    def __repr__(self):
+        return f"CompiledTemplate({len(self.ops)} оп.)"
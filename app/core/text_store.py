@@ -0,0 +1,125 @@
+import hashlib
+import io
+import logging
+import mmap
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 32
+
+
+class TextStore:
+    """
+    Хранилище текстов сниппетов вне кучи Python.
+
+    Тексты дописываются во временный файл рядом с библиотекой, после чего
+    файл отображается в память (mmap). Индекс хранит только смещение и длину,
+    а сам текст декодируется при раскрытии; недавно раскрытые тексты держатся
+    в небольшом LRU-кэше. Одинаковые тексты записываются один раз.
+    """
+
+    def __init__(self, directory=None, cache_size=DEFAULT_CACHE_SIZE):
+        self._directory = directory
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._size = 0
+        self.distinct_count = 0
+        self.requests = 0
+        self._data = b""
+        self._mapped = None
+        # Файл создаётся при первой записи: пустому индексу он не нужен.
+        self._file = None
+        self._closed = False
+
+    def _open_file(self):
+        try:
+            return tempfile.TemporaryFile(
+                prefix="snippets-", suffix=".textstore", dir=self._directory
+            )
+        except OSError:
+            logging.warning(
+                "[SNIPPET] Не удалось создать файл текстов в %s, тексты в памяти",
+                self._directory,
+            )
+            return io.BytesIO()
+
+    def add(self, text):
+        """Записывает текст и возвращает ссылку (смещение, длина в байтах)."""
+        data = text.encode("utf-8")
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        self.requests += 1
+        ref = self._digests.get(digest)
+        if ref is None:
+            if self._file is None:
+                self._file = self._open_file()
+            self.distinct_count += 1
+            ref = (self._size, len(data))
+            self._file.write(data)
+            self._size += len(data)
+            self._digests[digest] = ref
+        return ref
+
+    def seal(self):
+        """Завершает запись и отображает файл в память."""
+        self._digests = {}
+        if self._file is None:
+            return
+        if isinstance(self._file, io.BytesIO):
+            self._data = self._file.getvalue()
+            return
+        self._file.flush()
+        if self._size:
+            self._mapped = mmap.mmap(
+                self._file.fileno(), self._size, access=mmap.ACCESS_READ
+            )
+            self._data = self._mapped
+
+    def get(self, ref):
+        with self._lock:
+            text = self._cache.get(ref)
+            if text is not None:
+                self._cache.move_to_end(ref)
+                return text
+        # Данные берутся до проверки флага: close() сначала ставит флаг,
+        # а закрытое тем временем отображение само бросит ValueError.
+        data = self._data
+        if self._closed:
+            raise ValueError("TextStore закрыт")
+        offset, length = ref
+        text = data[offset : offset + length].decode("utf-8")
+        with self._lock:
+            self._cache[ref] = text
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    @property
+    def size(self):
+        return self._size
+
+    def resident_bytes(self):
+        """Объём текстов, реально находящихся в куче (LRU-кэш)."""
+        with self._lock:
+            return sum(len(text) for text in self._cache.values())
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """Освобождает отображение и удаляет файл; повторный вызов ничего не делает."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._cache.clear()
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+        self._data = b""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
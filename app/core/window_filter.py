@@ -0,0 +1,113 @@
+import re
+
+MATCH_CONTAINS = "contains"
+MATCH_EXACT = "exact"
+MATCH_REGEX = "regex"
+
+# Порядок совпадает с порядком пунктов в выпадающих списках интерфейса.
+MATCH_MODES = (MATCH_CONTAINS, MATCH_EXACT, MATCH_REGEX)
+MATCH_MODE_LABELS = {
+    MATCH_CONTAINS: "Содержит (contains)",
+    MATCH_EXACT: "Точное совпадение (exact)",
+    MATCH_REGEX: "Регулярное выражение (regex)",
+}
+
+# Поле фильтра -> атрибут сведений об окне.
+FILTER_CRITERIA = (
+    ("title", "title"),
+    ("class", "window_class"),
+    ("process", "process_name"),
+)
+
+_MODE_WEIGHT = {MATCH_EXACT: 3, MATCH_REGEX: 2, MATCH_CONTAINS: 1}
+
+
+def _filter_mode(window_filter):
+    mode = window_filter.get("match_mode", MATCH_CONTAINS)
+    return mode if mode in MATCH_MODES else MATCH_CONTAINS
+
+
+def _filter_criteria(window_filter):
+    """Возвращает непустые критерии фильтра: [(атрибут окна, шаблон)]."""
+    criteria = []
+    for key, attribute in FILTER_CRITERIA:
+        pattern = str(window_filter.get(key, "") or "").strip()
+        if pattern:
+            criteria.append((attribute, pattern))
+    return criteria
+
+
+def validate_window_filter(window_filter):
+    """Возвращает текст ошибки для некорректного фильтра или None."""
+    if not window_filter or _filter_mode(window_filter) != MATCH_REGEX:
+        return None
+    for key, _ in FILTER_CRITERIA:
+        pattern = str(window_filter.get(key, "") or "").strip()
+        if not pattern:
+            continue
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            return f"Некорректное регулярное выражение в поле '{key}': {e}"
+    return None
+
+
+class WindowPredicate:
+    """
+    Фильтр окна, скомпилированный один раз при построении индекса.
+
+    Шаблоны заранее приведены к нижнему регистру или скомпилированы в
+    регулярные выражения; needs перечисляет атрибуты окна, которые нужны
+    для проверки, чтобы запрашивать только их.
+    """
+
+    __slots__ = ("needs", "specificity", "_checks")
+
+    def __init__(self, checks, specificity):
+        self._checks = tuple(checks)
+        self.needs = frozenset(attribute for attribute, _ in self._checks)
+        self.specificity = specificity
+
+    def matches(self, window_info):
+        for attribute, test in self._checks:
+            if not test(getattr(window_info, attribute)):
+                return False
+        return True
+
+
+def _never(_value):
+    return False
+
+
+def _make_check(attribute, pattern, mode):
+    if mode == MATCH_REGEX:
+        return re.compile(pattern, re.IGNORECASE).search
+    # Имя процесса всегда сравнивается без учёта регистра.
+    if mode == MATCH_EXACT and attribute != "process_name":
+        return pattern.__eq__
+    needle = pattern.lower()
+    if mode == MATCH_EXACT:
+        return lambda value: value.lower() == needle
+    return lambda value: needle in value.lower()
+
+
+def compile_window_filter(window_filter):
+    """
+    Компилирует словарь window_filter в WindowPredicate.
+
+    Для пустого фильтра возвращает None. Некорректное регулярное выражение
+    (файл правили вручную) даёт предикат, который никогда не срабатывает.
+    """
+    if not window_filter:
+        return None
+    criteria = _filter_criteria(window_filter)
+    if not criteria:
+        return None
+    mode = _filter_mode(window_filter)
+    checks = []
+    for attribute, pattern in criteria:
+        try:
+            checks.append((attribute, _make_check(attribute, pattern, mode)))
+        except re.error:
+            checks.append((attribute, _never))
+    return WindowPredicate(checks, _MODE_WEIGHT[mode] * len(criteria))
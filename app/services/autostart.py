@@ -0,0 +1,293 @@
+import logging
+import os
+import subprocess
+import threading
+from collections import namedtuple
+
+LEGACY_TASK_NAME = "Text_expander"
+
+# Описание ярлыка автозапуска: что запускать и откуда.
+ShortcutSpec = namedtuple(
+    "ShortcutSpec", ("target", "arguments", "working_dir", "description")
+)
+
+# Итог сверки: changed — что-то создано/изменено/удалено, ok — состояние
+# совпадает с желаемым, legacy_checked — старая задача планировщика проверена.
+AutostartResult = namedtuple(
+    "AutostartResult", ("enabled", "ok", "changed", "message", "legacy_checked")
+)
+
+
+def _same_path(left, right):
+    if not left or not right:
+        return left == right
+    return os.path.normcase(os.path.normpath(left)) == os.path.normcase(
+        os.path.normpath(right)
+    )
+
+
+def shortcut_matches(current, wanted):
+    """Совпадают ли цель, аргументы и рабочая папка ярлыка."""
+    return (
+        current is not None
+        and _same_path(current.target, wanted.target)
+        and (current.arguments or "") == (wanted.arguments or "")
+        and _same_path(current.working_dir, wanted.working_dir)
+    )
+
+
+class Win32ShellBackend:
+    """Ярлыки через IShellLink (pywin32) без cscript и временных скриптов."""
+
+    def thread_init(self):
+        import pythoncom
+
+        pythoncom.CoInitialize()
+
+    def thread_done(self):
+        import pythoncom
+
+        pythoncom.CoUninitialize()
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def makedirs(self, folder):
+        os.makedirs(folder, exist_ok=True)
+
+    def _shell_link(self):
+        import pythoncom
+        from win32com.shell import shell
+
+        return pythoncom.CoCreateInstance(
+            shell.CLSID_ShellLink,
+            None,
+            pythoncom.CLSCTX_INPROC_SERVER,
+            shell.IID_IShellLink,
+        )
+
+    def read_shortcut(self, path):
+        if not os.path.exists(path):
+            return None
+        import pythoncom
+        from win32com.shell import shell
+
+        link = self._shell_link()
+        link.QueryInterface(pythoncom.IID_IPersistFile).Load(path)
+        target, _ = link.GetPath(shell.SLGP_RAWPATH)
+        return ShortcutSpec(
+            target,
+            link.GetArguments(),
+            link.GetWorkingDirectory(),
+            link.GetDescription(),
+        )
+
+    def write_shortcut(self, path, spec):
+        import pythoncom
+
+        link = self._shell_link()
+        link.SetPath(spec.target)
+        link.SetArguments(spec.arguments)
+        link.SetWorkingDirectory(spec.working_dir)
+        link.SetDescription(spec.description)
+        link.QueryInterface(pythoncom.IID_IPersistFile).Save(path, 0)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def delete_scheduled_task(self, name):
+        result = subprocess.run(
+            ["schtasks", "/Delete", "/TN", name, "/F"],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="ignore",
+            creationflags=subprocess.CREATE_NO_WINDOW,
+            check=False,
+        )
+        return result.returncode == 0
+
+
+class FakeShellBackend:
+    """Ярлыки в словаре — для проверки сверки без Windows."""
+
+    def __init__(self, shortcuts=None, folders=None, tasks=None):
+        self.shortcuts = dict(shortcuts or {})
+        self.folders = set(folders or ())
+        self.tasks = set(tasks or ())
+        self.unwritable = set()
+        self.operations = []
+
+    def thread_init(self):
+        pass
+
+    def thread_done(self):
+        pass
+
+    def exists(self, path):
+        return path in self.shortcuts
+
+    def makedirs(self, folder):
+        if folder in self.unwritable:
+            raise OSError(f"Нет доступа: {folder}")
+        self.folders.add(folder)
+
+    def read_shortcut(self, path):
+        return self.shortcuts.get(path)
+
+    def write_shortcut(self, path, spec):
+        if os.path.dirname(path) in self.unwritable:
+            raise OSError(f"Нет доступа: {path}")
+        self.operations.append(("write", path))
+        self.shortcuts[path] = spec
+
+    def remove(self, path):
+        self.operations.append(("remove", path))
+        del self.shortcuts[path]
+
+    def delete_scheduled_task(self, name):
+        self.operations.append(("schtasks", name))
+        if name in self.tasks:
+            self.tasks.discard(name)
+            return True
+        return False
+
+
+class AutostartReconciler:
+    """
+    Приводит ярлыки автозапуска к желаемому состоянию и ничего не делает,
+    если они уже совпадают.
+
+    request() можно вызывать из потока GUI сколько угодно раз: работа идёт
+    в одном фоновом потоке, который всегда применяет последнее запрошенное
+    состояние, а итог каждой сверки передаётся в callback (из фонового
+    потока).
+    """
+
+    def __init__(self, backend, locations, shortcut_name):
+        self.backend = backend
+        self.locations = [folder for folder in locations if folder]
+        self.shortcut_name = shortcut_name
+        self._lock = threading.Lock()
+        self._desired = None
+        self._thread = None
+
+    def shortcut_paths(self):
+        return [os.path.join(folder, self.shortcut_name) for folder in self.locations]
+
+    def reconcile(self, enabled, spec, cleanup_legacy=False):
+        backend = self.backend
+        legacy_checked = False
+        if cleanup_legacy:
+            # Старые версии создавали задачу планировщика; удаляется один раз.
+            try:
+                if backend.delete_scheduled_task(LEGACY_TASK_NAME):
+                    logging.info("[AUTOSTART] Удалена старая задача планировщика")
+                legacy_checked = True
+            except Exception as e:
+                logging.warning("[AUTOSTART] Не удалось проверить задачу: %s", e)
+
+        if enabled:
+            return self._ensure_shortcut(spec, legacy_checked)
+        return self._remove_shortcuts(legacy_checked)
+
+    def _ensure_shortcut(self, spec, legacy_checked):
+        backend = self.backend
+        existing = []
+        for path in self.shortcut_paths():
+            try:
+                current = backend.read_shortcut(path)
+            except Exception as e:
+                logging.warning("[AUTOSTART] Не удалось прочитать '%s': %s", path, e)
+                current = None
+                if backend.exists(path):
+                    existing.append(path)
+                continue
+            if shortcut_matches(current, spec):
+                return AutostartResult(
+                    True, True, False, "Автозапуск уже настроен", legacy_checked
+                )
+            if current is not None:
+                existing.append(path)
+
+        # Устаревший ярлык переписывается на месте, иначе создаётся новый
+        # в первой доступной папке автозагрузки.
+        candidates = existing + [
+            path for path in self.shortcut_paths() if path not in existing
+        ]
+        for path in candidates:
+            try:
+                backend.makedirs(os.path.dirname(path))
+                backend.write_shortcut(path, spec)
+            except Exception as e:
+                logging.warning("[AUTOSTART] Не удалось записать '%s': %s", path, e)
+                continue
+            logging.info("[AUTOSTART] Ярлык автозапуска записан: %s", path)
+            return AutostartResult(True, True, True, "Автозапуск включен", legacy_checked)
+        return AutostartResult(
+            True, False, False, "Не удалось создать ярлык", legacy_checked
+        )
+
+    def _remove_shortcuts(self, legacy_checked):
+        backend = self.backend
+        removed = False
+        failed = False
+        for path in self.shortcut_paths():
+            if not backend.exists(path):
+                continue
+            try:
+                backend.remove(path)
+                removed = True
+            except Exception as e:
+                failed = True
+                logging.warning("[AUTOSTART] Ошибка удаления ярлыка '%s': %s", path, e)
+        if failed:
+            message = "Не удалось удалить ярлык автозапуска"
+        elif removed:
+            message = "Автозапуск отключен"
+        else:
+            message = "Автозапуск уже отключен"
+        return AutostartResult(False, not failed, removed, message, legacy_checked)
+
+    def request(self, enabled, spec, callback, cleanup_legacy=False):
+        """Запрашивает состояние; сверка выполняется в фоновом потоке."""
+        with self._lock:
+            self._desired = (enabled, spec, callback, cleanup_legacy)
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="TextExpanderAutostart", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self.backend.thread_init()
+        except Exception:
+            logging.exception("[AUTOSTART] Ошибка инициализации COM")
+        try:
+            while True:
+                with self._lock:
+                    desired, self._desired = self._desired, None
+                    if desired is None:
+                        self._thread = None
+                        return
+                enabled, spec, callback, cleanup_legacy = desired
+                try:
+                    result = self.reconcile(enabled, spec, cleanup_legacy)
+                except Exception as e:
+                    logging.exception("[AUTOSTART] Ошибка сверки автозапуска")
+                    result = AutostartResult(
+                        enabled, False, False, f"Ошибка автозапуска: {e}", False
+                    )
+                callback(result)
+        finally:
+            try:
+                self.backend.thread_done()
+            except Exception:
+                pass
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
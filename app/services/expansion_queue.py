@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from collections import deque
+
+# Пауза между срабатыванием и вставкой: пробел-триггер должен дойти до окна.
+INJECTION_DELAY = 0.05
+
+
+class PendingExpansion:
+    """
+    Раскрытие в очереди.
+
+    caret_offset — сколько символов пользователь набрал после пробела-триггера
+    до начала вставки: настолько курсор нужно сдвинуть влево перед выделением
+    аббревиатуры и вернуть обратно после вставки. Пока идёт подготовка
+    вставки, смещение продолжает обновляться; committed — смещение уже
+    зафиксировано и курсор сдвинут.
+    """
+
+    __slots__ = (
+        "typed_length",
+        "text",
+        "abbr",
+        "queued_at",
+        "caret_offset",
+        "committed",
+        "select_inputs",
+    )
+
+    def __init__(self, typed_length, text, abbr, queued_at, select_inputs=None):
+        self.typed_length = typed_length
+        self.text = text
+        self.abbr = abbr
+        self.queued_at = queued_at
+        # Готовый массив SendInput для выделения аббревиатуры, если есть.
+        self.select_inputs = select_inputs
+        self.caret_offset = 0
+        self.committed = False
+
+
+class ExpansionQueue:
+    """
+    Упорядоченная очередь раскрытий с одним потоком вставки.
+
+    Срабатывания выполняются строго по порядку, ни одно не теряется, если
+    пользователь быстро набирает несколько аббревиатур подряд. Пока
+    раскрытие ждёт, хук сообщает о набранных символах (note_typed), а при
+    перемещении курсора (стрелки, Home и т.п.) ожидающие раскрытия
+    отменяются: их положение в тексте уже неизвестно.
+
+    Выполняемое раскрытие тоже получает note_typed, пока не вызван
+    commit_caret(): чтение и запись буфера обмена занимают десятки
+    миллисекунд, и набранное за это время учитывается. Нажатия после
+    commit_caret() (пока курсор сдвинут и идёт вставка) учесть уже нельзя:
+    они попадут в сдвинутую позицию курсора. Такие нажатия считаются в
+    interleaved и видны в describe().
+    """
+
+    def __init__(self, execute, delay=INJECTION_DELAY, clock=time.monotonic):
+        self._execute = execute
+        self._delay = delay
+        self._clock = clock
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._active = None
+        self.processed = 0
+        self.interleaved = 0
+        self.cancelled = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="TextExpanderInjector", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def submit(self, typed_length, text, abbr, select_inputs=None):
+        expansion = PendingExpansion(
+            typed_length, text, abbr, self._clock(), select_inputs
+        )
+        with self._cond:
+            self._pending.append(expansion)
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._cond.notify()
+        return expansion
+
+    def note_typed(self, delta):
+        """
+        Учитывает символы, набранные после срабатываний (delta < 0 — Backspace).
+
+        Если Backspace стирает больше, чем набрано после триггера, раскрытие
+        отменяется: пользователь правит саму аббревиатуру.
+        """
+        with self._cond:
+            active = self._active
+            if active is not None:
+                if active.committed:
+                    self.interleaved += 1
+                else:
+                    active.caret_offset += delta
+            if not self._pending:
+                return
+            kept = deque()
+            for expansion in self._pending:
+                expansion.caret_offset += delta
+                if expansion.caret_offset < 0:
+                    self.cancelled += 1
+                else:
+                    kept.append(expansion)
+            self._pending = kept
+
+    def cancel_pending(self, reason):
+        with self._cond:
+            count = len(self._pending)
+            self._pending.clear()
+            self.cancelled += count
+        if count:
+            logging.info("[EXPAND] Отменено раскрытий: %d (%s)", count, reason)
+
+    def commit_caret(self, expansion):
+        """
+        Фиксирует смещение курсора выполняемого раскрытия перед сдвигом
+        курсора. Возвращает None, если Backspace уже стёр символы самой
+        аббревиатуры: тогда раскрытие нужно пропустить.
+        """
+        with self._cond:
+            expansion.committed = True
+            if expansion.caret_offset < 0:
+                self.cancelled += 1
+                return None
+            return expansion.caret_offset
+
+    @property
+    def depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        with self._cond:
+            processed = self.processed
+            return {
+                "depth": len(self._pending),
+                "max_depth": self.max_depth,
+                "processed": processed,
+                "cancelled": self.cancelled,
+                "avg_wait_ms": (self.total_wait / processed * 1000) if processed else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+                "interleaved": self.interleaved,
+            }
+
+    def describe(self):
+        stats = self.stats()
+        return (
+            f"выполнено {stats['processed']}, отменено {stats['cancelled']}, "
+            f"макс. очередь {stats['max_depth']}, ожидание ср. "
+            f"{stats['avg_wait_ms']:.0f} мс / макс. {stats['max_wait_ms']:.0f} мс, "
+            f"нажатий во время вставки {stats['interleaved']}"
+        )
+
+    def _next(self):
+        with self._cond:
+            while not self._stopped:
+                if self._pending:
+                    wait = self._pending[0].queued_at + self._delay - self._clock()
+                    if wait <= 0:
+                        # Смещение курсора фиксирует commit_caret() перед
+                        # сдвигом курсора, а до этого оно ещё обновляется.
+                        self._active = self._pending.popleft()
+                        return self._active
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _run(self):
+        while True:
+            expansion = self._next()
+            if expansion is None:
+                return
+            waited = self._clock() - expansion.queued_at
+            try:
+                self._execute(expansion)
+            except Exception:
+                logging.exception("[EXPAND] Ошибка раскрытия '%s'", expansion.abbr)
+            with self._cond:
+                self._active = None
+                self.processed += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import threading
+import time
+
+HOOK_POLICY_FILENAME = "hook_policy.json"
+
+# Процесс считается «перехватчиком» хука, пока подтверждённых случаев
+# потери хука не меньше четверти от проверок, где хук работал.
+STEAL_RATIO = 4
+
+
+def _is_stealer(record):
+    return bool(record["steals"]) and record["steals"] * STEAL_RATIO >= record["healthy"]
+
+
+class HookRefreshPolicy:
+    """
+    Выученная таблица процессов, которые «отнимают» клавиатурный хук.
+
+    Для каждого процесса хранится число подтверждённых потерь хука (steals)
+    и число проверок, где хук продолжал получать события (healthy). Хук
+    обновляется по расписанию только для перехватчиков; остальные процессы
+    лишь проверяются на тишину. Таблица сохраняется между сеансами:
+    record_*() только помечают её изменённой, а на диск она пишется в
+    flush(), который вызывающий код откладывает и объединяет.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._table = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning("[HOOK] Не удалось прочитать %s: %s", self.path, e)
+            return
+        if not isinstance(data, dict):
+            return
+        for process_key, record in data.get("processes", {}).items():
+            if isinstance(record, dict):
+                self._table[process_key] = {
+                    "steals": int(record.get("steals", 0)),
+                    "healthy": int(record.get("healthy", 0)),
+                    "updated": float(record.get("updated", 0.0)),
+                }
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def flush(self):
+        """Записывает таблицу, если она менялась после прошлой записи."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            payload = {
+                "processes": {key: dict(record) for key, record in self._table.items()}
+            }
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning("[HOOK] Не удалось сохранить %s: %s", self.path, e)
+            with self._lock:
+                self._dirty = True
+
+    def _record(self, process_key, field):
+        with self._lock:
+            record = self._table.setdefault(
+                process_key, {"steals": 0, "healthy": 0, "updated": 0.0}
+            )
+            record[field] += 1
+            record["updated"] = time.time()
+            self._dirty = True
+
+    def needs_refresh(self, process_key):
+        """True, если для процесса нужно плановое обновление хука."""
+        with self._lock:
+            record = self._table.get(process_key)
+            return bool(record) and _is_stealer(record)
+
+    def record_steal(self, process_key):
+        self._record(process_key, "steals")
+        logging.info("[HOOK] Процесс %s перехватывает хук", process_key)
+
+    def record_healthy(self, process_key):
+        self._record(process_key, "healthy")
+
+    def describe(self):
+        with self._lock:
+            stealers = sorted(
+                key for key, record in self._table.items() if _is_stealer(record)
+            )
+            return f"{len(self._table)} процессов, перехватчики: {', '.join(stealers) or 'нет'}"
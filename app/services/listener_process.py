@@ -0,0 +1,320 @@
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from app.services.paths import get_application_path
+from app.services.startup_service import (
+    ORIGINAL_APPDATA,
+    USER_APPDATA_FLAG,
+    get_effective_appdata,
+)
+from app.services.startup_timing import finish_startup_report, timeline
+
+LISTENER_ONLY_FLAG = "--listener-only"
+LISTENER_MODE_THREAD = "thread"
+LISTENER_MODE_PROCESS = "process"
+LISTENER_MODE_LABELS = {
+    LISTENER_MODE_THREAD: "В процессе менеджера",
+    LISTENER_MODE_PROCESS: "Отдельный процесс",
+}
+LISTENER_LOG_FILENAME = "Text_expander_listener.log"
+PIPE_KEY_FILENAME = "listener_pipe.key"
+CONNECT_TIMEOUT = 8.0
+CONNECT_RETRY = 0.1
+
+
+class ListenerUnavailable(RuntimeError):
+    pass
+
+
+def pipe_address():
+    user = os.environ.get("USERNAME") or "user"
+    return rf"\\.\pipe\TextExpanderListener-{user}"
+
+
+def _pipe_client(address, authkey):
+    # multiprocessing.connection нужен только в режиме отдельного процесса.
+    from multiprocessing.connection import Client
+
+    return Client(address, family="AF_PIPE", authkey=authkey)
+
+
+def _pipe_listener(address, authkey):
+    from multiprocessing.connection import Listener
+
+    return Listener(address, family="AF_PIPE", authkey=authkey)
+
+
+def _key_path():
+    return os.path.join(get_application_path(), PIPE_KEY_FILENAME)
+
+
+def _read_authkey():
+    with open(_key_path(), "rb") as f:
+        return f.read()
+
+
+def _write_authkey():
+    authkey = os.urandom(32)
+    with open(_key_path(), "wb") as f:
+        f.write(authkey)
+    return authkey
+
+
+def listener_command():
+    """Командная строка процесса слушателя (исходники или собранный exe)."""
+    if getattr(sys, "frozen", False):
+        command = [sys.executable]
+    else:
+        command = [
+            sys.executable,
+            os.path.join(get_application_path(), "Text_expander.pyw"),
+        ]
+    command.append(LISTENER_ONLY_FLAG)
+    appdata = get_effective_appdata()
+    if appdata and appdata != ORIGINAL_APPDATA:
+        command.append(f"{USER_APPDATA_FLAG}={appdata}")
+    return command
+
+
+class ListenerServer:
+    """
+    Канал управления слушателем в отдельном процессе.
+
+    Принимает по именованному каналу Windows команды вида (имя, *аргументы)
+    и отвечает ("ok", значение) или ("error", текст). Каждое подключение
+    обслуживается своим потоком; shutdown останавливает слушатель и цикл.
+    """
+
+    def __init__(self, worker, address, authkey):
+        self.worker = worker
+        self.address = address
+        self.authkey = authkey
+        self._running = True
+        self._listener = _pipe_listener(address, authkey)
+
+    def serve_forever(self):
+        logging.info("[IPC] Канал слушателя открыт: %s", self.address)
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._running:
+                    logging.warning("[IPC] Отклонено подключение: %s", e)
+                    continue
+                break
+            if not self._running:
+                conn.close()
+                break
+            threading.Thread(
+                target=self._handle, args=(conn,), name="TextExpanderPipe", daemon=True
+            ).start()
+        self._listener.close()
+        logging.info("[IPC] Канал слушателя закрыт")
+
+    def shutdown(self):
+        if not self._running:
+            return
+        self._running = False
+        self.worker.stop()
+        # accept() на именованном канале не прерывается закрытием, поэтому
+        # цикл будится пустым подключением.
+        try:
+            _pipe_client(self.address, self.authkey).close()
+        except Exception:
+            pass
+
+    def _handle(self, conn):
+        with conn:
+            while self._running:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                command, args = message[0], message[1:]
+                try:
+                    reply = ("ok", self._dispatch(command, args))
+                except Exception as e:
+                    logging.exception("[IPC] Ошибка команды '%s'", command)
+                    reply = ("error", str(e))
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+                if command == "shutdown":
+                    self.shutdown()
+                    return
+
+    def _dispatch(self, command, args):
+        worker = self.worker
+        if command == "reload":
+            worker.reload_snippets()
+            return len(worker.snippet_index.by_abbr)
+        if command == "toggle_pause":
+            worker.toggle_pause()
+            return worker.is_paused
+        if command == "is_paused":
+            return worker.is_paused
+        if command == "stats":
+            return worker.stats()
+        if command == "set_trace":
+            worker.trace.enabled = bool(args[0])
+            return worker.trace.enabled
+        if command == "dump_trace":
+            return worker.trace.dump(args[0])
+        if command == "shutdown":
+            return True
+        raise ValueError(f"Неизвестная команда: {command}")
+
+
+def run_listener_process():
+    """Точка входа режима --listener-only: только хук и канал управления."""
+    with timeline.phase("import listener_worker"):
+        from app.services.listener_worker import ListenerWorker
+    from app.services.logging_service import configure_logging, shutdown_logging
+
+    application_path = get_application_path()
+    configure_logging(application_path, LISTENER_LOG_FILENAME)
+    address = pipe_address()
+    try:
+        _pipe_client(address, _read_authkey()).close()
+        logging.info("[IPC] Слушатель уже запущен, выходим")
+        return 0
+    except Exception:
+        pass
+
+    # Ключ пишется до открытия канала: существующий канал означает свежий ключ.
+    authkey = _write_authkey()
+    with timeline.phase("ListenerWorker"):
+        worker = ListenerWorker(os.path.join(application_path, "snippets.json"))
+    with timeline.phase("listener start"):
+        server = ListenerServer(worker, address, authkey)
+        thread = threading.Thread(
+            target=worker.run, name="TextExpanderListener", daemon=True
+        )
+        thread.start()
+    finish_startup_report("Запуск слушателя")
+    try:
+        server.serve_forever()
+    finally:
+        server.worker.stop()
+        thread.join(timeout=2.0)
+        shutdown_logging()
+    return 0
+
+
+class _RemoteTrace:
+    """Трассировка клавиш слушателя в другом процессе (как KeyTraceRecorder)."""
+
+    def __init__(self, client):
+        self._client = client
+        self._enabled = False
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = bool(value)
+        try:
+            self._client.call("set_trace", self._enabled)
+        except ListenerUnavailable as e:
+            logging.warning("[IPC] Трассировка не переключена: %s", e)
+
+    def dump(self, path):
+        try:
+            return self._client.call("dump_trace", path)
+        except ListenerUnavailable as e:
+            raise OSError(str(e)) from e
+
+
+class ListenerClient:
+    """
+    Заместитель ListenerWorker для менеджера: те же reload_snippets,
+    toggle_pause, is_paused, trace и stop, но через канал к процессу
+    слушателя. Процесс слушателя не зависит от менеджера: detach()
+    закрывает канал, оставляя слушатель работать.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+        self.trace = _RemoteTrace(self)
+        self.is_paused = bool(self.call("is_paused"))
+
+    @classmethod
+    def connect(cls, timeout=0.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                conn = _pipe_client(pipe_address(), _read_authkey())
+                return cls(conn)
+            except Exception as e:
+                if time.monotonic() >= deadline:
+                    raise ListenerUnavailable(
+                        f"Процесс слушателя недоступен: {e}"
+                    ) from e
+            time.sleep(CONNECT_RETRY)
+
+    @classmethod
+    def connect_or_spawn(cls, timeout=CONNECT_TIMEOUT):
+        """Подключается к работающему слушателю или запускает новый процесс."""
+        try:
+            return cls.connect()
+        except ListenerUnavailable:
+            pass
+        command = listener_command()
+        logging.info("[IPC] Запуск процесса слушателя: %s", command)
+        subprocess.Popen(
+            command,
+            close_fds=True,
+            creationflags=subprocess.CREATE_NO_WINDOW
+            | subprocess.CREATE_NEW_PROCESS_GROUP,
+        )
+        return cls.connect(timeout)
+
+    def call(self, command, *args):
+        with self._lock:
+            if self._conn is None:
+                raise ListenerUnavailable("Канал слушателя закрыт")
+            try:
+                self._conn.send((command, *args))
+                status, value = self._conn.recv()
+            except (EOFError, OSError) as e:
+                self._conn = None
+                raise ListenerUnavailable(f"Связь со слушателем потеряна: {e}") from e
+        if status != "ok":
+            raise RuntimeError(value)
+        return value
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    def reload_snippets(self):
+        return self.call("reload")
+
+    def toggle_pause(self):
+        self.is_paused = bool(self.call("toggle_pause"))
+
+    def stats(self):
+        return self.call("stats")
+
+    def stop(self):
+        """Останавливает процесс слушателя."""
+        try:
+            self.call("shutdown")
+        except ListenerUnavailable:
+            pass
+        self.detach()
+
+    def detach(self):
+        """Закрывает канал, не останавливая слушатель."""
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
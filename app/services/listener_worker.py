@@ -2,19 +2,107 @@ import ctypes
 import json
 import logging
 import os
+import threading
 import time
 from ctypes import wintypes
-from threading import Timer
 
 import pyperclip
 from pynput import keyboard
 
+from app.core import key_trace as kt
+from app.core.hook_handover import EventDeduplicator
+from app.core.scheduler import DeadlineScheduler
+from app.core.snippet_codec import SnippetCodecError, load_snippet_document
+from app.core.snippet_store import flatten_snippet_store
+from app.core.snippet_index import SnippetIndex
+from app.core.snippet_template import CompiledTemplate
+from app.core.snippet_stream import stream_flat_snippets
 from app.services import scan_code_keyboard as sc
-from app.services.windows_api import (
-    get_active_process_name,
-    get_active_window_class,
-    get_active_window_title,
+from app.services.expansion_queue import ExpansionQueue
+from app.services.logging_service import LazyFormat
+from app.services.profiler import span
+from app.services.startup_timing import timeline
+from app.services.hook_policy import HOOK_POLICY_FILENAME, HookRefreshPolicy
+from app.services.window_context import get_window_context
+from app.services.windows_api import process_names
+
+EVENT_FOREGROUND = "foreground"
+EVENT_LISTENER_STOPPED = "listener_stopped"
+EVENT_NO_KEYS = "no_keys"
+EVENT_HOOK_REFRESH = "hook_refresh"
+EVENT_HOOK_PROBE = "hook_probe"
+EVENT_RETIRE_HOOK = "retire_hook"
+EVENT_PRESTAGE = "prestage"
+EVENT_RETIRE_INDEX = "retire_index"
+EVENT_SAVE_HOOK_POLICY = "save_hook_policy"
+
+# Обновления хука после перехода в новый процесс, секунды.
+HOOK_REFRESH_DELAYS = (0.5, 3.0, 10.0, 20.0)
+# Сколько старый и новый хуки работают вместе при замене, секунды.
+HANDOVER_OVERLAP = 0.2
+NO_KEYS_TIMEOUT = 30.0
+NO_KEYS_RECHECK = 1.0
+# Проверка хука на тишину после перехода в процесс, секунды.
+HOOK_PROBE_INTERVAL = 2.0
+HOOK_PROBE_LIMIT = 20.0
+# Ввод моложе этого порога ещё может не дойти до хука, миллисекунды.
+HOOK_EVENT_GRACE_MS = 300
+# Раскрытия готовятся заранее, если буфер — префикс не более стольких
+# аббревиатур.
+PRESTAGE_LIMIT = 4
+# Задержка записи таблицы перехватчиков хука, секунды: проверки после
+# каждого переключения окна накапливаются и пишутся на диск одним разом.
+HOOK_POLICY_SAVE_DELAY = 30.0
+# Сколько прежний индекс живёт после перезагрузки, секунды: поток хука и
+# супервизор могут ещё дочитывать из него текст.
+INDEX_RETIRE_DELAY = 5.0
+# Виртуальные коды 0-9, A-Z и пробела для проверки нажатий через
+# GetAsyncKeyState: GetLastInputInfo учитывает и движения мыши.
+_PROBE_VKEYS = (0x20, *range(0x30, 0x3A), *range(0x41, 0x5B))
+
+# Клавиши, которые не сдвигают курсор, и клавиши, вводящие один символ.
+_CARET_NEUTRAL_KEYS = frozenset(
+    getattr(keyboard.Key, name)
+    for name in (
+        "shift", "shift_l", "shift_r", "ctrl", "ctrl_l", "ctrl_r",
+        "alt", "alt_l", "alt_r", "alt_gr", "cmd", "cmd_l", "cmd_r",
+        "caps_lock", "num_lock",
+    )
+    if hasattr(keyboard.Key, name)
 )
+_CARET_STEP_KEYS = frozenset((keyboard.Key.enter, keyboard.Key.tab))
+
+
+class _HookProbe:
+    """Проверка хука в процессе: доходят ли нажатия до on_press."""
+
+    __slots__ = ("pid", "process_key", "started", "since", "keys", "refreshed")
+
+    def __init__(self, pid, process_key, now, keys):
+        self.pid = pid
+        self.process_key = process_key
+        self.started = now
+        self.since = now
+        self.keys = keys
+        self.refreshed = False
+
+
+class _StagedExpansion:
+    """
+    Раскрытие, подготовленное до пробела-триггера.
+
+    Годится, только пока не сменились индекс и снимок окна, для которых
+    оно разрешено: оба неизменяемы и сравниваются по тождеству.
+    """
+
+    __slots__ = ("index", "window", "entry", "payload", "select_inputs")
+
+    def __init__(self, index, window, entry, payload, select_inputs):
+        self.index = index
+        self.window = window
+        self.entry = entry
+        self.payload = payload
+        self.select_inputs = select_inputs
 
 
 class _LASTINPUTINFO(ctypes.Structure):
@@ -31,13 +119,19 @@ class ListenerWorker:
 
     BUFFER_SIZE = 20
 
-    def __init__(self, snippets_file):
+    def __init__(
+        self, snippets_file, window_context=None, scheduler=None, hook_policy=None
+    ):
         self.snippets_file = snippets_file
+        # Сведения об активном окне берутся из снимка, который обновляется
+        # по уведомлениям Windows, а не запрашиваются при каждом нажатии.
+        self.window_context = window_context or get_window_context()
         self.scan_buffer = []
-        self.snippets_by_abbr = {}
-        self.snippets_by_scan = {}
+        self.snippet_index = SnippetIndex()
         self.is_paused = False
-        self.is_replacing = False
+        self.expansions = ExpansionQueue(self._execute_expansion)
+        # Трассировка решений включается из трея; выключенная ничего не пишет.
+        self.trace = kt.KeyTraceRecorder()
         self.listener = None
         self.last_active_pid = None
         self._last_hook_refresh_by_process = {}
@@ -49,7 +143,39 @@ class ListenerWorker:
         self._no_event_restart_attempts = 0
         self.should_run = True
         self._first_key_logged = False
+        self.scheduler = scheduler or DeadlineScheduler()
+        self.hook_policy = hook_policy or HookRefreshPolicy(
+            os.path.join(os.path.dirname(snippets_file), HOOK_POLICY_FILENAME)
+        )
+        self._key_event_count = 0
+        self._probe = None
+        self._hook_generation = 0
+        self._retiring_listener = None
+        self._handover_active = False
+        self._dedupe = EventDeduplicator()
+        # Подготовленные раскрытия по последовательности скан-кодов;
+        # словарь целиком подменяется потоком супервизора.
+        self._staged = {}
+        # Диапазон кандидатов в sorted_scans для текущего буфера (поток хука):
+        # (индекс, длина буфера, lo, hi).
+        self._prefix_state = None
+        self.prestage_hits = 0
+        self.prestage_misses = 0
+        # Индексы, подменённые перезагрузкой; их хранилища текстов
+        # закрываются по дедлайну EVENT_RETIRE_INDEX.
+        self._retired_indexes = []
+        self._retired_lock = threading.Lock()
         self.reload_snippets()
+        self.window_context.subscribe(self._on_window_changed)
+
+    def _on_window_changed(self, window, previous):
+        # Срез индекса под новое окно готовится при смене фокуса, чтобы
+        # срабатывание сводилось к одному поиску в словаре.
+        try:
+            self.snippet_index.views.view_for(window)
+        except Exception:
+            logging.exception("[SNIPPET] Ошибка подготовки среза индекса для окна")
+        self.scheduler.post(EVENT_FOREGROUND, window)
 
     def _get_system_idle_ms(self):
         try:
@@ -65,371 +191,623 @@ class ListenerWorker:
     def run(self):
         """Запускает цикл слушателя с автоматическим переподключением."""
         logging.info("[RUN] Слушатель запущен")
+        self.window_context.start()
+        self.expansions.start()
+        self.last_active_pid = self._get_active_process_id()
         while self.should_run:
             try:
-                self.listener = keyboard.Listener(on_press=self.on_press)
-                self.listener.start()
-                try:
-                    self.listener.wait()
-                except Exception:
-                    pass
-                self.last_active_pid = self._get_active_process_id()
-                self._hook_started_at = time.monotonic()
-                self._scheduled_hook_refresh_pid = None
-                self._scheduled_hook_refresh_process_key = None
-                self._scheduled_hook_refresh_deadlines = []
-                while self.should_run and self.listener.running:
-                    time.sleep(0.25)
-
-                    now = time.monotonic()
-                    current_pid = self._get_active_process_id()
-
-                    if (
-                        not self._first_key_logged
-                        and self._hook_started_at is not None
-                        and now - self._hook_started_at >= 30.0
-                        and self._no_event_restart_attempts < 3
-                    ):
-                        idle_ms = self._get_system_idle_ms()
-                        if idle_ms is not None and idle_ms < 5000:
-                            self._no_event_restart_attempts += 1
-                            logging.warning(
-                                "[RESTART] Нет событий клавиатуры; перезапуск хука (%d/3)",
-                                self._no_event_restart_attempts,
-                            )
-                            self.scan_buffer = []
-                            if self.listener:
-                                self.listener.stop()
-                            break
-                    if current_pid and current_pid != self.last_active_pid:
-                        self.last_active_pid = current_pid
-                        self.scan_buffer = []
-                        active_process = get_active_process_name()
-                        process_key = active_process or f"pid:{current_pid}"
-                        last_refresh = self._last_hook_refresh_by_process.get(process_key)
-                        should_schedule = (
-                            last_refresh is None or (now - last_refresh) >= 20.0
-                        )
-                        if should_schedule:
-                            self._scheduled_hook_refresh_pid = current_pid
-                            self._scheduled_hook_refresh_process_key = process_key
-                            self._scheduled_hook_refresh_deadlines = [
-                                now + 0.5,
-                                now + 3.0,
-                                now + 10.0,
-                                now + 20.0,
-                            ]
-                            logging.info(
-                                "[RESTART] Активный процесс %s, планируем обновление хука",
-                                active_process or current_pid,
-                            )
-                        else:
-                            self._scheduled_hook_refresh_pid = None
-                            self._scheduled_hook_refresh_process_key = None
-                            self._scheduled_hook_refresh_deadlines = []
-
-                    if (
-                        self._scheduled_hook_refresh_pid
-                        and current_pid == self._scheduled_hook_refresh_pid
-                        and self._scheduled_hook_refresh_deadlines
-                        and now >= self._scheduled_hook_refresh_deadlines[0]
-                    ):
-                        self._scheduled_hook_refresh_deadlines.pop(0)
-                        self.scan_buffer = []
-                        is_last_refresh = not self._scheduled_hook_refresh_deadlines
-                        if is_last_refresh and self._scheduled_hook_refresh_process_key:
-                            self._last_hook_refresh_by_process[
-                                self._scheduled_hook_refresh_process_key
-                            ] = now
-                            self._scheduled_hook_refresh_pid = None
-                            self._scheduled_hook_refresh_process_key = None
-                        logging.info(
-                            "[RESTART] Обновление хука для активного процесса %s",
-                            get_active_process_name() or current_pid,
-                        )
-                        if self.listener:
-                            self.listener.stop()
-                        break
+                self._start_listener()
+                self._supervise()
                 # Если listener неожиданно остановился, цикл создаст его заново
-
             except Exception as exc:
                 logging.exception("[WARN] Ошибка слушателя: %s", exc)
+                self._retire_listener(self.listener)
+                self.listener = None
                 time.sleep(1.0)
-            finally:
-                if self.listener:
-                    self.listener.stop()
-                    self.listener.join(timeout=1.0)
-                    self.listener = None
 
-        logging.info("[STOP] Слушатель остановлен")
+        self._retire_listener(self._retiring_listener)
+        self._retire_listener(self.listener)
+        self.listener = None
+        logging.info(
+            "[STOP] Слушатель остановлен; кэш имён процессов: %s; хук: %s; "
+            "дублей при передаче хука: %d; раскрытия: %s; "
+            "подготовка: попаданий %d, промахов %d",
+            process_names.describe(),
+            self.hook_policy.describe(),
+            self._dedupe.dropped,
+            self.expansions.describe(),
+            self.prestage_hits,
+            self.prestage_misses,
+        )
+
+    def _start_listener(self):
+        """
+        Запускает новый хук; работающий старый снимается не сразу.
+
+        Новый хук ставится раньше, чем снимается старый, поэтому нажатия
+        в момент замены не теряются, а scan_buffer сохраняется. Пока
+        работают оба хука, одинаковые события склеиваются EventDeduplicator.
+        """
+        previous = self.listener
+        self._hook_generation += 1
+        listener = keyboard.Listener(
+            on_press=self._make_press_handler(self._hook_generation),
+            win32_event_filter=self._win32_event_filter,
+        )
+        # Имя потока хука нужно профилировщику и журналу.
+        listener.name = f"TextExpanderHook-{self._hook_generation}"
+        listener.start()
+        try:
+            listener.wait()
+        except Exception:
+            pass
+        self.listener = listener
+        # Остановку хука замечает отдельный поток, а не периодический опрос.
+        threading.Thread(
+            target=self._watch_listener,
+            args=(listener,),
+            name="TextExpanderHookWatch",
+            daemon=True,
+        ).start()
+        if previous is not None and previous.running:
+            self._retire_listener(self._retiring_listener)
+            self._dedupe.reset()
+            self._retiring_listener = previous
+            self._handover_active = True
+            self.scheduler.schedule(EVENT_RETIRE_HOOK, HANDOVER_OVERLAP, previous)
+        else:
+            self._retire_listener(previous)
+        self._hook_started_at = self.scheduler.now()
+        if self.trace.enabled:
+            self.trace.record(kt.EVENT_HOOK_START, value=self._hook_generation)
+        if not self._first_key_logged and self._no_event_restart_attempts < 3:
+            self.scheduler.schedule(EVENT_NO_KEYS, NO_KEYS_TIMEOUT)
+
+    def _win32_event_filter(self, msg, data):
+        # Собственные события вставки текста не доходят до on_press, а
+        # нажатия пользователя во время вставки обрабатываются как обычно.
+        return not sc.is_own_injected_event(data)
+
+    def _make_press_handler(self, hook_id):
+        def on_hook_press(key):
+            if self._handover_active and self._dedupe.is_duplicate(
+                hook_id, key, time.monotonic()
+            ):
+                return
+            self.on_press(key)
+
+        return on_hook_press
+
+    def _retire_listener(self, listener):
+        if listener is None:
+            return
+        listener.stop()
+        listener.join(timeout=1.0)
+        if self.trace.enabled:
+            self.trace.record(kt.EVENT_HOOK_RETIRE)
+        if listener is self._retiring_listener:
+            self._retiring_listener = None
+            self._handover_active = False
+
+    def _watch_listener(self, listener):
+        listener.join()
+        self.scheduler.post(EVENT_LISTENER_STOPPED, listener)
+
+    def _supervise(self):
+        """
+        Обрабатывает события и дедлайны, пока не потребуется перезапуск хука.
+
+        Поток спит до смены активного окна, истечения дедлайна или
+        остановки; если ничего не запланировано, ожидание не ограничено.
+        """
+        while self.should_run:
+            item = self.scheduler.wait_next()
+            if item is None:
+                return
+            _, name, payload = item
+            if name == EVENT_LISTENER_STOPPED:
+                if payload is self.listener:
+                    return
+            elif name == EVENT_FOREGROUND:
+                self._on_foreground_changed(payload)
+            elif name == EVENT_NO_KEYS:
+                if self._check_no_key_events():
+                    return
+            elif name == EVENT_HOOK_REFRESH:
+                if self._run_hook_refresh(payload):
+                    return
+            elif name == EVENT_HOOK_PROBE:
+                if self._run_hook_probe():
+                    return
+            elif name == EVENT_RETIRE_HOOK:
+                self._retire_listener(payload)
+            elif name == EVENT_PRESTAGE:
+                self._prestage(payload)
+            elif name == EVENT_RETIRE_INDEX:
+                self._close_retired_indexes()
+            elif name == EVENT_SAVE_HOOK_POLICY:
+                self.hook_policy.flush()
+
+    def _prestage(self, payload):
+        """
+        Готовит раскрытия для кандидатов, присланных хуком.
+
+        Выполняется в потоке супервизора, пока пользователь дописывает
+        аббревиатуру: решение фильтра окна, текст (или готовый шаблон) и
+        массив SendInput для выделения получаются заранее, и пробел только
+        отправляет их. Неверные догадки просто отбрасываются.
+        """
+        index, candidates = payload
+        if index is not self.snippet_index:
+            return
+        window = self.window_context.snapshot()
+        staged = {}
+        for seq_key in candidates:
+            entry = index.lookup(seq_key, window)
+            if entry is None:
+                continue
+            staged[seq_key] = _StagedExpansion(
+                index,
+                window,
+                entry,
+                index.expansion_of(entry),
+                sc.selection_inputs(len(seq_key) + 1),
+            )
+        self._staged = staged
+
+    def _note_prefix(self):
+        """
+        Сужает диапазон кандидатов под набранный символ (поток хука).
+
+        Подготовка отправляется супервизору вместе со снимком кандидатов и
+        только когда их набор изменился и достаточно мал; чаще всего это
+        один бинарный поиск внутри уже известного диапазона.
+        """
+        index = self.snippet_index
+        prefix = tuple(self.scan_buffer)
+        state = self._prefix_state
+        if state is not None and state[0] is index and state[1] == len(prefix) - 1:
+            lo, hi = index.prefix_range(prefix, state[2], state[3])
+            changed = (lo, hi) != (state[2], state[3])
+        else:
+            lo, hi = index.prefix_range(prefix)
+            changed = True
+        self._prefix_state = (index, len(prefix), lo, hi)
+        if changed and 0 < hi - lo <= PRESTAGE_LIMIT:
+            self.scheduler.post(EVENT_PRESTAGE, (index, index.sorted_scans[lo:hi]))
+
+    def _schedule_hook_policy_save(self):
+        # Дедлайн не переносится: при частых переключениях окон таблица
+        # всё равно записывается не позже чем через HOOK_POLICY_SAVE_DELAY.
+        if not self.scheduler.is_scheduled(EVENT_SAVE_HOOK_POLICY):
+            self.scheduler.schedule(EVENT_SAVE_HOOK_POLICY, HOOK_POLICY_SAVE_DELAY)
+
+    def _check_no_key_events(self):
+        """Перезапускает хук, если клавиши нажимают, а событий нет."""
+        if self._first_key_logged or self._no_event_restart_attempts >= 3:
+            return False
+        idle_ms = self._get_system_idle_ms()
+        if idle_ms is None or idle_ms >= 5000:
+            # Пользователь не печатает; проверим ещё раз позже.
+            self.scheduler.schedule(EVENT_NO_KEYS, NO_KEYS_RECHECK)
+            return False
+        self._no_event_restart_attempts += 1
+        logging.warning(
+            "[RESTART] Нет событий клавиатуры; перезапуск хука (%d/3)",
+            self._no_event_restart_attempts,
+        )
+        return True
+
+    def _on_foreground_changed(self, window):
+        current_pid = window.pid
+        if not current_pid or current_pid == self.last_active_pid:
+            return
+        now = self.scheduler.now()
+        self.last_active_pid = current_pid
+        self.scan_buffer = []
+        active_process = window.process_name
+        process_key = active_process or f"pid:{current_pid}"
+        self._probe = None
+        self.scheduler.cancel(EVENT_HOOK_PROBE)
+        last_refresh = self._last_hook_refresh_by_process.get(process_key)
+        if not self.hook_policy.needs_refresh(process_key) or (
+            last_refresh is not None and (now - last_refresh) < 20.0
+        ):
+            self._scheduled_hook_refresh_pid = None
+            self._scheduled_hook_refresh_process_key = None
+            self._scheduled_hook_refresh_deadlines = []
+            self.scheduler.cancel(EVENT_HOOK_REFRESH)
+            if active_process and last_refresh is None:
+                # Процесс не известен как перехватчик: хук не перезапускаем,
+                # а только проверяем, доходят ли до него нажатия.
+                self._start_hook_probe(current_pid, process_key, now)
+            return
+        self._scheduled_hook_refresh_pid = current_pid
+        self._scheduled_hook_refresh_process_key = process_key
+        self._scheduled_hook_refresh_deadlines = [
+            now + delay for delay in HOOK_REFRESH_DELAYS
+        ]
+        self._schedule_next_hook_refresh(now)
+        logging.info(
+            "[RESTART] Активный процесс %s, планируем обновление хука",
+            active_process or current_pid,
+        )
+
+    def _start_hook_probe(self, pid, process_key, now):
+        self._probe = _HookProbe(pid, process_key, now, self._key_event_count)
+        self._keyboard_touched()
+        self.scheduler.schedule(EVENT_HOOK_PROBE, HOOK_PROBE_INTERVAL)
+
+    def _keyboard_touched(self):
+        """True, если с прошлого вызова нажимались буквы, цифры или пробел."""
+        try:
+            get_state = ctypes.windll.user32.GetAsyncKeyState
+        except Exception:
+            return False
+        touched = False
+        for vkey in _PROBE_VKEYS:
+            if get_state(vkey) & 0x0001:
+                touched = True
+        return touched
+
+    def _run_hook_probe(self):
+        """
+        Проверяет, не «замолчал» ли хук в активном процессе.
+
+        Тишина — это нажатия клавиш (по GetLastInputInfo и GetAsyncKeyState)
+        без событий в on_press. Тогда хук перезапускается; если после этого
+        события пошли, процесс записывается как перехватчик хука.
+        Возвращает True, если нужен перезапуск хука.
+        """
+        probe = self._probe
+        if probe is None or self.window_context.snapshot().pid != probe.pid:
+            self._probe = None
+            return False
+        now = self.scheduler.now()
+        if self._key_event_count > probe.keys:
+            if probe.refreshed:
+                self.hook_policy.record_steal(probe.process_key)
+            else:
+                self.hook_policy.record_healthy(probe.process_key)
+            self._schedule_hook_policy_save()
+            self._probe = None
+            return False
+        idle_ms = self._get_system_idle_ms()
+        typed = (
+            self._keyboard_touched()
+            and idle_ms is not None
+            and idle_ms >= HOOK_EVENT_GRACE_MS
+            and now - idle_ms / 1000.0 > probe.since
+        )
+        if typed:
+            if probe.refreshed:
+                # Нажатия не доходят и до нового хука — дело не в процессе.
+                self._probe = None
+                return False
+            logging.info(
+                "[HOOK] Хук молчит при вводе в %s; перезапуск хука",
+                probe.process_key,
+            )
+            probe.refreshed = True
+            probe.since = now
+            probe.keys = self._key_event_count
+            self.scheduler.schedule(EVENT_HOOK_PROBE, HOOK_PROBE_INTERVAL)
+            return True
+        if now - probe.started >= HOOK_PROBE_LIMIT:
+            self._probe = None
+            return False
+        self.scheduler.schedule(EVENT_HOOK_PROBE, HOOK_PROBE_INTERVAL)
+        return False
+
+    def _schedule_next_hook_refresh(self, now):
+        if self._scheduled_hook_refresh_deadlines:
+            self.scheduler.schedule(
+                EVENT_HOOK_REFRESH,
+                max(0.0, self._scheduled_hook_refresh_deadlines[0] - now),
+                self._scheduled_hook_refresh_pid,
+            )
+
+    def _run_hook_refresh(self, pid):
+        """Выполняет очередное запланированное обновление хука."""
+        window = self.window_context.snapshot()
+        if pid != self._scheduled_hook_refresh_pid or window.pid != pid:
+            return False
+        now = self.scheduler.now()
+        self._scheduled_hook_refresh_deadlines.pop(0)
+        if not self._scheduled_hook_refresh_deadlines:
+            if self._scheduled_hook_refresh_process_key:
+                self._last_hook_refresh_by_process[
+                    self._scheduled_hook_refresh_process_key
+                ] = now
+            self._scheduled_hook_refresh_pid = None
+            self._scheduled_hook_refresh_process_key = None
+        else:
+            # План переживает перезапуск хука, который он сам вызывает.
+            self._schedule_next_hook_refresh(now)
+        logging.info(
+            "[RESTART] Обновление хука для активного процесса %s",
+            window.process_name or pid,
+        )
+        return True
 
     def stop(self):
         """Останавливает слушатель."""
         self.should_run = False
-        if self.listener:
-            self.listener.stop()
+        self.window_context.unsubscribe(self._on_window_changed)
+        self.scheduler.stop()
+        self.expansions.stop()
+        for listener in (self.listener, self._retiring_listener):
+            if listener:
+                listener.stop()
+        self._close_retired_indexes()
+        self.hook_policy.flush()
 
     def _get_active_process_id(self):
         """Возвращает PID активного процесса (ForegroundWindow), если он доступен."""
-        try:
-            hwnd = ctypes.windll.user32.GetForegroundWindow()
-            if not hwnd:
-                return None
-            pid = wintypes.DWORD()
-            ctypes.windll.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
-            return pid.value or None
-        except Exception:
-            return None
+        return self.window_context.snapshot().pid
 
+    def _swap_index(self, index):
+        """
+        Публикует новый индекс, а прежний откладывает на закрытие.
+
+        Хранилище текстов прежнего индекса закрывается не сразу: хук и
+        супервизор читают self.snippet_index без блокировки и могут ещё
+        раскрывать из него сниппет.
+        """
+        previous = self.snippet_index
+        self.snippet_index = index
+        self._staged = {}
+        if previous is None or previous is index:
+            return
+        with self._retired_lock:
+            self._retired_indexes.append(previous)
+        self.scheduler.schedule(EVENT_RETIRE_INDEX, INDEX_RETIRE_DELAY)
+
+    def _close_retired_indexes(self):
+        with self._retired_lock:
+            retired, self._retired_indexes = self._retired_indexes, []
+        for index in retired:
+            index.close()
+
+    @span("reload_snippets")
     def reload_snippets(self):
         """Перезагружает сниппеты из файла в расширенный словарь с фильтрами окон."""
+        index = None
         try:
             if os.path.exists(self.snippets_file):
-                with open(self.snippets_file, "r", encoding="utf-8") as f:
-                    categorized_data = json.load(f)
-                flat_snippets = {}
-                if isinstance(categorized_data, dict):
-                    is_flat = bool(categorized_data) and all(
-                        isinstance(v, str) for v in categorized_data.values()
-                    )
-                    if is_flat:
-                        # Плоский формат без фильтров (для обратной совместимости)
-                        flat_snippets = {
-                            abbr: {"text": text, "filter": None}
-                            for abbr, text in categorized_data.items()
-                            if isinstance(text, str)
-                        }
-                    else:
-                        # Иерархический формат: category -> {enabled, snippets, categories, window_filter}
-                        def _ingest_payload(
-                            payload, default_enabled=True, inherited_filter=None
-                        ):
-                            if not isinstance(payload, dict):
-                                return
-                            category_default_enabled = payload.get(
-                                "enabled", default_enabled
-                            )
-                            # Получаем window_filter категории (если есть)
-                            category_filter = payload.get("window_filter")
-                            # Если у категории нет своего фильтра, наследуем от родителя
-                            effective_filter = (
-                                category_filter if category_filter else inherited_filter
-                            )
-
-                            snippets_block = payload.get("snippets")
-                            if not isinstance(snippets_block, dict):
-                                snippets_block = {
-                                    key: value
-                                    for key, value in payload.items()
-                                    if key not in {"enabled", "categories", "window_filter"}
-                                }
-
-                            for abbr, snippet_payload in snippets_block.items():
-                                if isinstance(snippet_payload, dict):
-                                    snippet_text = snippet_payload.get("text", "")
-                                    snippet_enabled = snippet_payload.get("enabled")
-                                    # Сниппет может иметь свой фильтр или наследовать от категории
-                                    snippet_filter = snippet_payload.get("window_filter")
-                                    if not snippet_filter:
-                                        snippet_filter = effective_filter
-                                else:
-                                    snippet_text = snippet_payload
-                                    snippet_enabled = None
-                                    snippet_filter = effective_filter
-                                if snippet_enabled is None:
-                                    snippet_enabled = category_default_enabled
-                                if not snippet_enabled:
-                                    continue
-                                if not isinstance(snippet_text, str):
-                                    snippet_text = str(snippet_text)
-                                flat_snippets[abbr] = {
-                                    "text": snippet_text,
-                                    "filter": snippet_filter,
-                                }
-
-                            subcategories = payload.get("categories", {})
-                            if isinstance(subcategories, dict):
-                                for sub_payload in subcategories.values():
-                                    _ingest_payload(
-                                        sub_payload,
-                                        category_default_enabled,
-                                        effective_filter,
-                                    )
-
-                        for payload in categorized_data.values():
-                            _ingest_payload(payload)
-                elif isinstance(categorized_data, list):
-                    # Неподдерживаемый тип (для совместимости).
-                    flat_snippets = {}
-                else:
-                    flat_snippets = {}
-                self.snippets_by_abbr, self.snippets_by_scan = sc.build_snippet_index(
-                    flat_snippets
+                # Файлы текущей схемы разбираются потоково, без построения
+                # исходного дерева; старые форматы читаются целиком и мигрируют.
+                # Тексты сразу уходят в файловое хранилище индекса, в памяти
+                # остаются только аббревиатуры, фильтры и ссылки на тексты.
+                index = SnippetIndex(os.path.dirname(self.snippets_file))
+                flat_snippets = stream_flat_snippets(
+                    self.snippets_file,
+                    store_text=index.store_text,
+                    accept_abbr=sc.supports_abbreviation,
                 )
-                print("[INFO] Сниппеты успешно перезагружены.")
+                if flat_snippets is None:
+                    categorized_data = load_snippet_document(self.snippets_file)
+                    flat_snippets = flatten_snippet_store(categorized_data)
+                    del categorized_data
+                index = sc.build_snippet_index(flat_snippets, index)
+                del flat_snippets
+                index.views.view_for(self.window_context.snapshot())
+                self._swap_index(index)
                 logging.info(
-                    "[INFO] Сниппеты загружены: %d, индекс: %d",
-                    len(self.snippets_by_abbr),
-                    len(self.snippets_by_scan),
+                    "[INFO] Сниппеты загружены: %d, индекс: %d, память: %s",
+                    len(index.by_abbr),
+                    len(index.by_scan),
+                    index.describe_memory(),
                 )
             else:
-                self.snippets_by_abbr = {}
-                self.snippets_by_scan = {}
-                print("[WARN] Файл сниппетов не найден.")
+                self._swap_index(SnippetIndex())
                 logging.warning(
                     "[WARN] Файл сниппетов не найден: %s", self.snippets_file
                 )
-        except (json.JSONDecodeError, IOError, StopIteration) as e:
-            print(f"[ERROR] Ошибка при загрузке сниппетов: {e}")
-            self.snippets_by_abbr = {}
-            self.snippets_by_scan = {}
+        except (
+            json.JSONDecodeError,
+            SnippetCodecError,
+            IOError,
+            StopIteration,
+            KeyError,
+            TypeError,
+        ) as e:
+            # Недостроенный индекс никто не видел, его файл удаляется сразу.
+            if index is not None and index is not self.snippet_index:
+                index.close()
+            self._swap_index(SnippetIndex())
             logging.exception("[ERROR] Ошибка загрузки сниппетов: %s", e)
 
+    def stats(self):
+        """Сводка состояния слушателя (для трея и канала управления)."""
+        return {
+            "paused": self.is_paused,
+            "keys": self._key_event_count,
+            "snippets": len(self.snippet_index.by_abbr),
+            "process_names": process_names.describe(),
+            "hook": self.hook_policy.describe(),
+            "handover_duplicates": self._dedupe.dropped,
+            "expansions": self.expansions.describe(),
+            "prestage_hits": self.prestage_hits,
+            "prestage_misses": self.prestage_misses,
+        }
+
     def toggle_pause(self):
         """Переключает состояние паузы."""
         self.is_paused = not self.is_paused
         status = "приостановлен" if self.is_paused else "возобновлен"
-        print(f"[INFO] Слушатель {status}.")
+        logging.info("[INFO] Слушатель %s", status)
 
     def on_press(self, key):
         """Обработчик нажатия клавиши."""
-        if self.is_paused or self.is_replacing:
+        # Счётчик событий показывает, жив ли хук, поэтому идёт до паузы.
+        self._key_event_count += 1
+        if self.is_paused:
             return
         self._last_key_event_at = time.monotonic()
         if not self._first_key_logged:
             logging.info("[INFO] Первое событие клавиши: %s", key)
+            timeline.note_first_hook_event()
             self._first_key_logged = True
+            self.scheduler.cancel(EVENT_NO_KEYS)
         scan_code = sc.scan_code_from_key(key)
+        key_class = self._process_key(key, scan_code)
+        trace = self.trace
+        if trace.enabled:
+            trace.record(
+                kt.EVENT_KEY, scan_code or 0, key_class, len(self.scan_buffer)
+            )
+
+    def _process_key(self, key, scan_code):
+        """Обновляет scan_buffer по нажатию и возвращает класс клавиши."""
         is_space = key == keyboard.Key.space
         is_backspace = key == keyboard.Key.backspace
 
         if scan_code == sc.SC_SPACE or is_space:
+            # Пробел сдвигает курсор для уже ожидающих раскрытий, но не для
+            # того, которое он сам запускает.
+            self.expansions.note_typed(1)
             self.check_for_snippet(self.scan_buffer)
             self.scan_buffer = []
-            return
+            return kt.CLASS_SPACE
 
         if scan_code == sc.SC_BACKSPACE or is_backspace:
+            self.expansions.note_typed(-1)
             if self.scan_buffer:
                 self.scan_buffer.pop()
-            return
+            return kt.CLASS_BACKSPACE
 
         if scan_code is None:
-            return
+            return kt.CLASS_NONE
 
+        key_class = kt.CLASS_SPECIAL
         try:
             if key.char:
                 # Фильтруем управляющие символы (ASCII < 32 и DEL область)
                 if ord(key.char) >= 32 and not (127 <= ord(key.char) <= 159):
                     self.scan_buffer.append(scan_code)
+                    self.expansions.note_typed(1)
+                    self._note_prefix()
+                    key_class = kt.CLASS_CHAR
                 else:
                     self.scan_buffer = []
+                    self.expansions.cancel_pending("сочетание клавиш")
+                    key_class = kt.CLASS_CONTROL
             else:
                 self.scan_buffer = []
         except AttributeError:
             self.scan_buffer = []
+            if key in _CARET_STEP_KEYS:
+                self.expansions.note_typed(1)
+            elif key not in _CARET_NEUTRAL_KEYS:
+                self.expansions.cancel_pending(f"клавиша {key}")
 
         if len(self.scan_buffer) > self.BUFFER_SIZE:
             self.scan_buffer = self.scan_buffer[-self.BUFFER_SIZE :]
+        return key_class
 
     def check_for_snippet(self, current_buffer):
         """Проверяет скан-коды в буфере и запускает замену с задержкой."""
         if not current_buffer:
             return False
 
-        entries = self.snippets_by_scan.get(tuple(current_buffer))
-        if not entries:
-            if sc.is_dot_prefix(current_buffer):
-                active_process = get_active_process_name()
-                logging.info(
-                    "[SNIPPET] Нет совпадения (%s) в %s",
-                    sc.format_scancodes(current_buffer),
-                    active_process or "unknown",
-                )
-            return False
-
-        matched_entry = None
-        for entry in entries:
-            window_filter = entry.get("filter")
-            if window_filter and not self._matches_window_filter(window_filter):
-                continue
-            matched_entry = entry
-            break
-
+        # Индекс читается один раз: перезагрузка может подменить его в любой момент.
+        index = self.snippet_index
+        # Снимок окна неизменяем и не требует обращений к WinAPI.
+        window = self.window_context.snapshot()
+        seq_key = tuple(current_buffer)
+        trace = self.trace
+        started_ns = time.perf_counter_ns() if trace.enabled else 0
+        staged = self._staged.get(seq_key)
+        if staged is not None and staged.index is index and staged.window is window:
+            self.prestage_hits += 1
+            matched_entry = staged.entry
+        else:
+            if staged is not None:
+                self.prestage_misses += 1
+            staged = None
+            # Фильтры уже применены в срезе индекса для этого окна.
+            matched_entry = index.lookup(seq_key, window)
+        if trace.enabled:
+            if matched_entry:
+                outcome = kt.OUTCOME_MATCH
+            elif seq_key in index.by_scan:
+                outcome = kt.OUTCOME_FILTERED
+            else:
+                outcome = kt.OUTCOME_MISS
+            trace.record(
+                kt.EVENT_TRIGGER,
+                buffer_len=len(seq_key),
+                outcome=outcome,
+                # Набранное мимо аббревиатур в трассу не попадает.
+                value=trace.digest(seq_key) if outcome != kt.OUTCOME_MISS else 0,
+                duration_ns=time.perf_counter_ns() - started_ns,
+            )
         if not matched_entry:
             if sc.is_dot_prefix(current_buffer):
-                active_process = get_active_process_name()
+                reason = (
+                    "Отфильтровано по окну" if seq_key in index.by_scan
+                    else "Нет совпадения"
+                )
                 logging.info(
-                    "[SNIPPET] Отфильтровано по окну (%s) в %s",
-                    sc.format_scancodes(current_buffer),
-                    active_process or "unknown",
+                    "[SNIPPET] %s (%s) в %s",
+                    reason,
+                    LazyFormat(sc.format_scancodes, seq_key),
+                    window.process_name or "unknown",
                 )
             return False
 
-        text_to_insert = matched_entry["text"]
-        resolved_abbr = matched_entry.get("abbr", "")
+        # Строка или скомпилированный шаблон; шаблон рендерится при вставке.
+        if staged is not None:
+            text_to_insert = staged.payload
+            select_inputs = staged.select_inputs
+        else:
+            text_to_insert = index.expansion_of(matched_entry)
+            select_inputs = None
+        resolved_abbr = matched_entry.abbr
         if sc.is_dot_prefix(current_buffer):
-            active_process = get_active_process_name()
             logging.info(
                 "[SNIPPET] Сработал '%s' (%s) в %s",
                 resolved_abbr,
-                sc.format_scancodes(current_buffer),
-                active_process or "unknown",
+                LazyFormat(sc.format_scancodes, seq_key),
+                window.process_name or "unknown",
             )
-        Timer(
-            0.05,
-            self.replace_text,
-            args=[len(current_buffer), text_to_insert],
-        ).start()
+        # Раскрытия выполняются по очереди, в порядке срабатывания.
+        self.expansions.submit(
+            len(current_buffer), text_to_insert, resolved_abbr, select_inputs
+        )
         return True
 
-    def _matches_window_filter(self, window_filter):
-        """Проверяет, соответствует ли активное окно заданному фильтру."""
-        if not window_filter:
-            return True
-
-        filter_title = window_filter.get("title", "").strip()
-        filter_class = window_filter.get("class", "").strip()
-        match_mode = window_filter.get("match_mode", "contains")
-
-        # Если фильтры пустые, пропускаем
-        if not filter_title and not filter_class:
-            return True
-
-        # Получаем информацию об активном окне
-        current_title = get_active_window_title() or ""
-        current_class = get_active_window_class() or ""
-
-        # Проверяем заголовок
-        if filter_title:
-            if match_mode == "exact":
-                if current_title != filter_title:
-                    return False
-            else:  # contains (по умолчанию)
-                if filter_title.lower() not in current_title.lower():
-                    return False
-
-        # Проверяем класс окна
-        if filter_class:
-            if match_mode == "exact":
-                if current_class != filter_class:
-                    return False
-            else:  # contains
-                if filter_class.lower() not in current_class.lower():
-                    return False
-
-        return True
+    def _execute_expansion(self, expansion):
+        started_ns = time.perf_counter_ns()
+        self.replace_text(expansion)
+        trace = self.trace
+        if trace.enabled:
+            trace.record(
+                kt.EVENT_EXPANSION,
+                buffer_len=expansion.typed_length,
+                value=expansion.caret_offset,
+                duration_ns=time.perf_counter_ns() - started_ns,
+            )
 
-    def replace_text(self, typed_length, text):
+    @span("replace_text")
+    def replace_text(self, expansion):
         """
         Выполняет замену текста, используя разные методы для Word и других программ.
+
+        caret_offset раскрытия — число символов, набранных после пробела-триггера:
+        курсор сдвигается на них влево перед заменой и возвращается после неё.
+        Смещение фиксируется только перед сдвигом курсора, поэтому ввод во
+        время работы с буфером обмена тоже учитывается.
+        text — строка или CompiledTemplate; {cursor} шаблона ставит курсор
+        тем же вызовом SendInput, что и вставка.
         """
-        if self.is_replacing:
-            return
-        self.is_replacing = True
+        typed_length = expansion.typed_length
+        text = expansion.text
         original_clipboard = None
         try:
-            active_process = get_active_process_name()
-            is_word = active_process == "winword.exe" if active_process else False
+            active_process = self.window_context.snapshot().process_name
+            is_word = active_process == "winword.exe"
 
             try:
                 original_clipboard = pyperclip.paste()
@@ -437,6 +815,10 @@ class ListenerWorker:
                 logging.exception("[WARN] Ошибка чтения буфера обмена")
                 original_clipboard = None
 
+            cursor_back = 0
+            if isinstance(text, CompiledTemplate):
+                text, cursor_back = text.render(clipboard=original_clipboard)
+
             try:
                 pyperclip.copy(text)
             except Exception:
@@ -444,30 +826,41 @@ class ListenerWorker:
                 return
             time.sleep(0.05)
 
+            caret_offset = self.expansions.commit_caret(expansion)
+            if caret_offset is None:
+                logging.info(
+                    "[EXPAND] Раскрытие '%s' отменено: аббревиатура изменена",
+                    expansion.abbr,
+                )
+                return
+            if caret_offset:
+                # Пользователь уже печатает дальше — курсор возвращается к нему.
+                cursor_back = 0
+                sc.tap_key_times(sc.SC_LEFT, caret_offset, extended=True)
+                time.sleep(0.01)
+
             if is_word:
                 # --- Метод для Word ---
                 for _ in range(typed_length + 1):
                     sc.tap_key(sc.SC_BACKSPACE)
                     time.sleep(0.01)
                 time.sleep(0.05)
-                sc.press_key(sc.SC_CTRL)
-                sc.tap_key(sc.SC_V)
-                sc.release_key(sc.SC_CTRL)
+                sc.paste_clipboard(use_ctrl_v=True, caret_left=cursor_back)
                 time.sleep(0.05)
             else:
                 # --- Метод для всех остальных программ ---
-                sc.press_key(sc.SC_SHIFT)
-                for _ in range(typed_length + 1):
-                    sc.tap_key(sc.SC_LEFT, extended=True)
-                sc.release_key(sc.SC_SHIFT)
+                sc.send_prepared(
+                    expansion.select_inputs or sc.selection_inputs(typed_length + 1)
+                )
                 time.sleep(0.03)
                 sc.tap_key(sc.SC_DELETE, extended=True)
                 time.sleep(0.05)
-                sc.press_key(sc.SC_SHIFT)
-                sc.tap_key(sc.SC_INSERT, extended=True)
-                sc.release_key(sc.SC_SHIFT)
+                sc.paste_clipboard(caret_left=cursor_back)
                 time.sleep(0.05)
 
+            if caret_offset:
+                sc.tap_key_times(sc.SC_RIGHT, caret_offset, extended=True)
+
         except Exception as e:
             logging.exception("[ERROR] Ошибка при замене текста: %s", e)
         finally:
@@ -476,4 +869,3 @@ class ListenerWorker:
                     pyperclip.copy(original_clipboard)
                 except Exception:
                     logging.exception("[WARN] Ошибка восстановления буфера обмена")
-            self.is_replacing = False
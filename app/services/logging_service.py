@@ -1,27 +1,134 @@
+import atexit
 import logging
 import os
+import queue
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILENAME = "Text_expander.log"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+RING_CAPACITY = 500
 
 _LOG_CONFIGURED = False
+_listener = None
+_ring_handler = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в вызывающем потоке.
+
+    Стандартный prepare() склеивает сообщение с аргументами ещё до постановки
+    в очередь; здесь запись уходит как есть, а форматирование и запись в файл
+    выполняет поток QueueListener. Поток хука только кладёт запись в очередь.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class RingBufferHandler(logging.Handler):
+    """Хранит последние записи журнала в памяти для просмотра из трея."""
+
+    def __init__(self, capacity=RING_CAPACITY):
+        super().__init__()
+        self._records = deque(maxlen=capacity)
+        self._lock_ring = threading.Lock()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._lock_ring:
+            self._records.append(line)
+
+    def lines(self):
+        with self._lock_ring:
+            return list(self._records)
+
 
+class LazyFormat:
+    """
+    Откладывает вычисление аргумента сообщения до форматирования.
 
-def configure_logging(log_dir):
-    global _LOG_CONFIGURED
+    logging.info("%s", LazyFormat(func, arg)) не вызывает func, если уровень
+    отключён, а при включённом вызывает её в потоке журнала.
+    """
+
+    __slots__ = ("_func", "_args")
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+
+    def __str__(self):
+        return str(self._func(*self._args))
+
+
+def configure_logging(log_dir, filename=LOG_FILENAME):
+    """
+    Настраивает асинхронный журнал: очередь -> файл с ротацией и кольцевой буфер.
+
+    Файл открывается на дозапись и ротируется по размеру, поэтому история
+    сохраняется между запусками.
+    """
+    global _LOG_CONFIGURED, _listener, _ring_handler
     if _LOG_CONFIGURED:
         return
     try:
-        os.makedirs(log_dir, exist_ok=True)
-        log_path = os.path.join(log_dir, "Text_expander.log")
-        logging.basicConfig(
-            filename=log_path,
-            filemode="w",
-            encoding="utf-8",
-            level=logging.INFO,
-            format="%(asctime)s %(levelname)s %(message)s",
-            force=True,
-        )
+        formatter = logging.Formatter(LOG_FORMAT)
+        _ring_handler = RingBufferHandler()
+        _ring_handler.setFormatter(formatter)
+        handlers = [_ring_handler]
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                os.path.join(log_dir, filename),
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT,
+                encoding="utf-8",
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        except OSError:
+            # Без файла журнала остаётся буфер в памяти.
+            pass
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_DeferredQueueHandler(log_queue))
+        root.setLevel(logging.INFO)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
         logging.info("=== Запуск Text expander ===")
     except Exception:
         # Не ломаем приложение из-за логирования.
         pass
     finally:
         _LOG_CONFIGURED = True
+
+
+def shutdown_logging():
+    """Дописывает очередь журнала и останавливает поток записи."""
+    global _listener
+    listener = _listener
+    _listener = None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def recent_log_lines():
+    """Последние записи журнала (для окна просмотра в трее)."""
+    if _ring_handler is None:
+        return []
+    return _ring_handler.lines()
@@ -0,0 +1,317 @@
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_FLAG = "--profile"
+PROFILE_DIRNAME = "profiles"
+DEFAULT_DURATION = 30.0
+DEFAULT_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+SAMPLER_THREAD_NAME = "TextExpanderProfiler"
+
+# Статистика спанов активного сеанса; None — профилирование выключено.
+_spans = None
+_spans_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def span(name):
+    """
+    Декоратор именованного участка для профилирования.
+
+    Пока сеанс не запущен, обёртка лишь проверяет глобальную переменную и
+    вызывает функцию напрямую, поэтому стоимость в обычной работе ничтожна.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _spans is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record_span(name, time.perf_counter_ns() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def _record_span(name, elapsed_ns):
+    with _spans_lock:
+        spans = _spans
+        if spans is None:
+            return
+        thread_name = threading.current_thread().name
+        stats = spans.get(name)
+        if stats is None:
+            stats = spans[name] = SpanStats(name)
+        stats.add(elapsed_ns, thread_name)
+
+
+class SpanStats:
+    __slots__ = ("name", "count", "total_ns", "max_ns", "threads")
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.threads = set()
+
+    def add(self, elapsed_ns, thread_name):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        self.max_ns = max(self.max_ns, elapsed_ns)
+        self.threads.add(thread_name)
+
+
+def default_thread_filter(thread):
+    """Главный поток Qt и рабочие потоки приложения (TextExpander*)."""
+    if thread is threading.main_thread():
+        return True
+    name = thread.name or ""
+    return name.startswith("TextExpander") and name != SAMPLER_THREAD_NAME
+
+
+def _frame_label(code, lineno):
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{lineno})"
+
+
+def collapse_stack(frame, max_depth=MAX_STACK_DEPTH):
+    """Стек кадра от корня к вершине в виде списка подписей."""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class StackSampler:
+    """
+    Статистический профилировщик: через равные интервалы снимает стеки
+    выбранных потоков через sys._current_frames и считает одинаковые стеки.
+
+    Результат — свёрнутые стеки в формате flamegraph.pl/speedscope:
+    "поток;кадр;кадр;... число".
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_filter=None):
+        self.interval = interval
+        self.thread_filter = thread_filter or default_thread_filter
+        self.stacks = Counter()
+        self.samples = 0
+        self.sample_time_ns = 0
+
+    def _targets(self):
+        return {
+            thread.ident: thread.name
+            for thread in threading.enumerate()
+            if thread.ident is not None and self.thread_filter(thread)
+        }
+
+    def sample_once(self):
+        started = time.perf_counter_ns()
+        targets = self._targets()
+        frames = sys._current_frames()
+        for ident, name in targets.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            labels = collapse_stack(frame)
+            self.stacks[";".join([name] + labels)] += 1
+        del frames
+        self.samples += 1
+        self.sample_time_ns += time.perf_counter_ns() - started
+
+    def run(self, stop_event, deadline):
+        while not stop_event.is_set() and time.monotonic() < deadline:
+            self.sample_once()
+            stop_event.wait(self.interval)
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """
+    Ограниченный по времени сеанс профилирования: сэмплирование стеков в
+    отдельном потоке и сбор статистики спанов. По окончании пишет файлы
+    <имя>.collapsed и <имя>-spans.txt в каталог out_dir.
+    """
+
+    def __init__(
+        self,
+        out_dir,
+        duration=DEFAULT_DURATION,
+        interval=DEFAULT_INTERVAL,
+        thread_filter=None,
+    ):
+        self.out_dir = out_dir
+        self.duration = duration
+        self.sampler = StackSampler(interval, thread_filter)
+        self.spans = {}
+        self.started_at = None
+        self.result = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._finish_lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self.result is None
+
+    def start(self):
+        global _spans
+        self.started_at = time.time()
+        with _spans_lock:
+            _spans = self.spans
+        deadline = time.monotonic() + self.duration
+        self._thread = threading.Thread(
+            target=self._run, args=(deadline,), name=SAMPLER_THREAD_NAME, daemon=True
+        )
+        self._thread.start()
+        logging.info(
+            "[PROFILE] Профилирование запущено на %.0f с (интервал %.1f мс)",
+            self.duration,
+            self.sampler.interval * 1000,
+        )
+
+    def stop(self):
+        """Останавливает сеанс досрочно; возвращает пути к файлам результата."""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+        return self._finish()
+
+    def _run(self, deadline):
+        try:
+            self.sampler.run(self._stop_event, deadline)
+        except Exception:
+            logging.exception("[PROFILE] Ошибка сэмплирования")
+        self._finish()
+
+    def _finish(self):
+        global _spans
+        with self._finish_lock:
+            if self.result is not None:
+                return self.result
+            with _spans_lock:
+                if _spans is self.spans:
+                    _spans = None
+            self.result = self._write()
+            return self.result
+
+    def _write(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        base = os.path.join(self.out_dir, f"profile-{stamp}")
+        collapsed_path = f"{base}.collapsed"
+        spans_path = f"{base}-spans.txt"
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            self.sampler.write_collapsed(collapsed_path)
+            with open(spans_path, "w", encoding="utf-8") as f:
+                f.write(self.summary())
+        except OSError as e:
+            logging.error("[PROFILE] Не удалось сохранить профиль: %s", e)
+            return ()
+        logging.info("[PROFILE] Профиль сохранён: %s", collapsed_path)
+        return collapsed_path, spans_path
+
+    def summary(self):
+        sampler = self.sampler
+        elapsed = time.time() - self.started_at
+        lines = [
+            f"Длительность: {elapsed:.1f} с, срезов стеков: {sampler.samples}, "
+            f"стоимость сэмплирования: {sampler.sample_time_ns / 1e6:.1f} мс",
+            "",
+            f"{'спан':32} {'вызовов':>8} {'всего, мс':>11} "
+            f"{'ср., мс':>9} {'макс., мс':>10}  потоки",
+        ]
+        with _spans_lock:
+            spans = sorted(self.spans.values(), key=lambda s: -s.total_ns)
+            rows = [
+                (s.name, s.count, s.total_ns, s.max_ns, sorted(s.threads))
+                for s in spans
+            ]
+        for name, count, total_ns, max_ns, threads in rows:
+            lines.append(
+                f"{name:32} {count:8d} {total_ns / 1e6:11.2f} "
+                f"{total_ns / count / 1e6:9.3f} {max_ns / 1e6:10.2f}  "
+                f"{', '.join(threads)}"
+            )
+        if not rows:
+            lines.append("(спаны не вызывались)")
+
+        per_thread = Counter()
+        for stack, count in sampler.stacks.items():
+            per_thread[stack.split(";", 1)[0]] += count
+        lines.append("")
+        lines.append("Срезы по потокам:")
+        for thread_name, count in per_thread.most_common():
+            lines.append(f"  {thread_name}: {count}")
+        return "\n".join(lines) + "\n"
+
+
+def start_profiling(out_dir, duration=DEFAULT_DURATION, interval=DEFAULT_INTERVAL):
+    """Запускает общий сеанс профилирования, если он ещё не идёт."""
+    global _session
+    with _session_lock:
+        if _session is not None and _session.is_running:
+            return _session
+        _session = ProfileSession(out_dir, duration, interval)
+        _session.start()
+        return _session
+
+
+def stop_profiling():
+    """Останавливает общий сеанс; возвращает пути к файлам или ()."""
+    global _session
+    with _session_lock:
+        session = _session
+        _session = None
+    if session is None:
+        return ()
+    return session.stop()
+
+
+def is_profiling():
+    session = _session
+    return session is not None and session.is_running
+
+
+def current_session():
+    return _session
+
+
+def pop_profile_flag(argv):
+    """
+    Извлекает из argv флаг --profile[=секунды]; возвращает длительность или None.
+    """
+    duration = None
+    kept = []
+    for arg in argv:
+        if arg == PROFILE_FLAG:
+            duration = DEFAULT_DURATION
+            continue
+        if arg.startswith(f"{PROFILE_FLAG}="):
+            try:
+                duration = float(arg.split("=", 1)[1])
+            except ValueError:
+                duration = DEFAULT_DURATION
+            continue
+        kept.append(arg)
+    argv[:] = kept
+    return duration
@@ -2,7 +2,14 @@ import ctypes
 import logging
 from ctypes import wintypes
 
-_USER32 = ctypes.WinDLL("user32", use_last_error=True)
+from app.core.snippet_index import SnippetIndex
+
+try:
+    _USER32 = ctypes.WinDLL("user32", use_last_error=True)
+except (AttributeError, OSError):
+    # Вне Windows модуль нужен только для построения скан-последовательностей
+    # (например, в инструменте разбора трасс); отправка ввода недоступна.
+    _USER32 = None
 
 try:
     ULONG_PTR = wintypes.ULONG_PTR
@@ -16,18 +23,23 @@ KEYEVENTF_SCANCODE = 0x0008
 
 MAPVK_VK_TO_VSC = 0
 
+# Метка в dwExtraInfo для собственных событий SendInput («TXEX»): по ней
+# хук отличает вставку текста от нажатий пользователя.
+INJECTED_INPUT_TAG = 0x54584558
+
 SC_BACKSPACE = 0x0E
 SC_SPACE = 0x39
 SC_DOT = 0x34
 SC_SLASH = 0x35
 SC_LEFT = 0x4B
+SC_RIGHT = 0x4D
 SC_DELETE = 0x53
 SC_INSERT = 0x52
 SC_CTRL = 0x1D
 SC_SHIFT = 0x2A
 SC_V = 0x2F
 
-EXTENDED_SCANCODES = {SC_LEFT, SC_DELETE, SC_INSERT}
+EXTENDED_SCANCODES = {SC_LEFT, SC_RIGHT, SC_DELETE, SC_INSERT}
 
 _EN_BASE = {
     "`": 0x29,
@@ -190,15 +202,19 @@ class _INPUT(ctypes.Structure):
     _fields_ = [("type", wintypes.DWORD), ("u", _INPUT_UNION)]
 
 
-_USER32.SendInput.argtypes = (
-    wintypes.UINT,
-    ctypes.POINTER(_INPUT),
-    ctypes.c_int,
-)
-_USER32.SendInput.restype = wintypes.UINT
+if _USER32 is not None:
+    _USER32.SendInput.argtypes = (
+        wintypes.UINT,
+        ctypes.POINTER(_INPUT),
+        ctypes.c_int,
+    )
+    _USER32.SendInput.restype = wintypes.UINT
+
+    _USER32.MapVirtualKeyW.argtypes = (wintypes.UINT, wintypes.UINT)
+    _USER32.MapVirtualKeyW.restype = wintypes.UINT
 
-_USER32.MapVirtualKeyW.argtypes = (wintypes.UINT, wintypes.UINT)
-_USER32.MapVirtualKeyW.restype = wintypes.UINT
+# Готовые массивы выделения по длине аббревиатуры (selection_inputs).
+_SELECTION_INPUTS = {}
 
 
 def _is_cyrillic_char(ch):
@@ -249,35 +265,62 @@ def build_scan_sequences(abbr):
     return sequences, missing
 
 
-def build_snippet_index(snippets):
-    snippets_by_abbr = {}
-    snippets_by_scan = {}
+def _warn_unsupported(abbr, missing):
+    details = ""
+    if missing:
+        details = f" (неподдерживаемые символы: {''.join(sorted(missing))})"
+    logging.warning(
+        "[SNIPPET] Пропуск '%s': не удалось построить скан-коды%s",
+        abbr,
+        details,
+    )
+
+
+def supports_abbreviation(abbr):
+    """
+    Можно ли набрать аббревиатуру скан-кодами; иначе пишет предупреждение.
+
+    Годится как accept_abbr для stream_flat_snippets: тексты пропускаемых
+    сниппетов тогда не попадают в хранилище индекса.
+    """
+    sequences, missing = build_scan_sequences(abbr)
+    if not sequences:
+        _warn_unsupported(abbr, missing)
+        return False
+    return True
+
+
+def build_snippet_index(snippets, index=None):
+    """
+    Строит индекс по словарю abbr -> {text, filter}.
+
+    index можно передать заранее созданным, если тексты уже записаны в его
+    хранилище при потоковой загрузке (тогда text — ссылка, а не строка).
+    """
+    index = index if index is not None else SnippetIndex()
+    raw_buckets = {}
     for abbr, payload in snippets.items():
         sequences, missing = build_scan_sequences(abbr)
         if not sequences:
-            details = ""
-            if missing:
-                details = f" (неподдерживаемые символы: {''.join(sorted(missing))})"
-            logging.warning(
-                "[SNIPPET] Пропуск '%s': не удалось построить скан-коды%s",
-                abbr,
-                details,
-            )
+            _warn_unsupported(abbr, missing)
             continue
-        entry = dict(payload)
-        entry["abbr"] = abbr
-        entry["scan_sequences"] = [tuple(seq) for seq in sequences]
-        snippets_by_abbr[abbr] = entry
-        for seq_key in entry["scan_sequences"]:
-            bucket = snippets_by_scan.setdefault(seq_key, [])
+        entry = index.add(
+            abbr,
+            payload.get("text", ""),
+            payload.get("filter"),
+            (tuple(seq) for seq in sequences),
+        )
+        for seq_key in entry.scan_sequences:
+            bucket = raw_buckets.setdefault(seq_key, [])
             if bucket:
                 logging.warning(
                     "[SNIPPET] Коллизия скан-кодов: '%s' и '%s'",
-                    bucket[0].get("abbr"),
+                    bucket[0].abbr,
                     abbr,
                 )
             bucket.append(entry)
-    return snippets_by_abbr, snippets_by_scan
+    index.compile_buckets(raw_buckets)
+    return index
 
 
 def scan_code_from_key(key):
@@ -288,7 +331,7 @@ def scan_code_from_key(key):
     if vk is None:
         key_value = getattr(key, "value", None)
         vk = getattr(key_value, "vk", None) if key_value else None
-    if vk is None:
+    if vk is None or _USER32 is None:
         return None
     mapped = _USER32.MapVirtualKeyW(int(vk), MAPVK_VK_TO_VSC)
     return int(mapped) if mapped else None
@@ -316,16 +359,27 @@ def _make_input(scan_code, key_up=False, extended=False):
                 wScan=scan_code,
                 dwFlags=flags,
                 time=0,
-                dwExtraInfo=0,
+                dwExtraInfo=INJECTED_INPUT_TAG,
             )
         ),
     )
 
 
+def is_own_injected_event(data):
+    """True для события низкоуровневого хука, отправленного через _send_inputs."""
+    return getattr(data, "dwExtraInfo", 0) == INJECTED_INPUT_TAG
+
+
 def _send_inputs(inputs):
-    if not inputs:
+    if not inputs or _USER32 is None:
+        return
+    send_prepared((_INPUT * len(inputs))(*inputs))
+
+
+def send_prepared(data):
+    """Отправляет заранее собранный массив INPUT одним вызовом SendInput."""
+    if not data or _USER32 is None:
         return
-    data = (_INPUT * len(inputs))(*inputs)
     sent = _USER32.SendInput(len(data), data, ctypes.sizeof(_INPUT))
     if sent != len(data):
         error_code = ctypes.get_last_error()
@@ -352,3 +406,52 @@ def tap_key(scan_code, extended=False):
             _make_input(scan_code, key_up=True, extended=extended),
         ]
     )
+
+
+def tap_key_times(scan_code, count, extended=False):
+    """Нажимает клавишу count раз одним вызовом SendInput."""
+    inputs = []
+    for _ in range(count):
+        inputs.append(_make_input(scan_code, key_up=False, extended=extended))
+        inputs.append(_make_input(scan_code, key_up=True, extended=extended))
+    _send_inputs(inputs)
+
+
+def selection_inputs(count):
+    """
+    Массив INPUT для Shift + Left×count: выделение набранной аббревиатуры.
+
+    Массив зависит только от длины, поэтому собирается один раз и
+    переиспользуется; слушатель готовит его заранее, пока аббревиатура
+    ещё набирается.
+    """
+    data = _SELECTION_INPUTS.get(count)
+    if data is None:
+        inputs = [_make_input(SC_SHIFT, key_up=False)]
+        for _ in range(count):
+            inputs.append(_make_input(SC_LEFT, key_up=False, extended=True))
+            inputs.append(_make_input(SC_LEFT, key_up=True, extended=True))
+        inputs.append(_make_input(SC_SHIFT, key_up=True))
+        data = (_INPUT * len(inputs))(*inputs)
+        _SELECTION_INPUTS[count] = data
+    return data
+
+
+def paste_clipboard(use_ctrl_v=False, caret_left=0):
+    """
+    Вставляет буфер обмена (Shift+Insert или Ctrl+V) и сразу сдвигает курсор
+    влево на caret_left символов — одним вызовом SendInput.
+    """
+    modifier, key, extended = (
+        (SC_CTRL, SC_V, False) if use_ctrl_v else (SC_SHIFT, SC_INSERT, True)
+    )
+    inputs = [
+        _make_input(modifier, key_up=False),
+        _make_input(key, key_up=False, extended=extended),
+        _make_input(key, key_up=True, extended=extended),
+        _make_input(modifier, key_up=True),
+    ]
+    for _ in range(caret_left):
+        inputs.append(_make_input(SC_LEFT, key_up=False, extended=True))
+        inputs.append(_make_input(SC_LEFT, key_up=True, extended=True))
+    _send_inputs(inputs)
@@ -0,0 +1,183 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TOP_IMPORTS = 15
+
+
+class _TimedLoader:
+    """
+    Обёртка загрузчика, замеряющая exec_module.
+
+    Перед выполнением модуля в его __spec__ и __loader__ возвращается
+    исходный загрузчик, поэтому после импорта обёртка нигде не остаётся.
+    """
+
+    def __init__(self, loader, fullname, timer):
+        self._loader = loader
+        self._fullname = fullname
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        spec = getattr(module, "__spec__", None)
+        if spec is not None:
+            spec.loader = self._loader
+        try:
+            module.__loader__ = self._loader
+        except AttributeError:
+            pass
+        self._timer._enter(self._fullname)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer._leave()
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer:
+    """
+    Поиск модулей в sys.meta_path, который сам ничего не находит, а только
+    оборачивает загрузчики остальных искателей и замеряет время выполнения
+    каждого модуля: полное (с вложенными импортами) и собственное.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self._local = threading.local()
+        self._installed = False
+
+    def install(self):
+        if not self._installed:
+            sys.meta_path.insert(0, self)
+            self._installed = True
+
+    def uninstall(self):
+        if self._installed:
+            try:
+                sys.meta_path.remove(self)
+            except ValueError:
+                pass
+            self._installed = False
+
+    def find_spec(self, fullname, path=None, target=None):
+        local = self._local
+        if getattr(local, "searching", False):
+            return None
+        local.searching = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self:
+                    continue
+                find_spec = getattr(finder, "find_spec", None)
+                if find_spec is None:
+                    continue
+                spec = find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            local.searching = False
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _TimedLoader(spec.loader, fullname, self)
+        return spec
+
+    def _enter(self, fullname):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append([fullname, time.perf_counter_ns(), 0])
+
+    def _leave(self):
+        stack = self._local.stack
+        fullname, started, children = stack.pop()
+        total = time.perf_counter_ns() - started
+        if stack:
+            stack[-1][2] += total
+        self.records[fullname] = (total, total - children)
+
+    def total_ns(self):
+        return sum(own for _, own in self.records.values())
+
+    def slowest(self, count=TOP_IMPORTS):
+        """Самые медленные модули по собственному времени."""
+        return sorted(self.records.items(), key=lambda item: -item[1][1])[:count]
+
+
+class StartupTimeline:
+    """
+    Фазы запуска с отметками от начала процесса. Фазы могут вкладываться;
+    report() пишет в журнал ещё не выведенные фазы.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._t0 = clock()
+        self.phases = []
+        self._depth = 0
+        self._reported = 0
+        self.startup_reported = False
+        self.first_hook_event = None
+
+    def elapsed(self):
+        return self._clock() - self._t0
+
+    @contextmanager
+    def phase(self, name):
+        entry = [name, self.elapsed(), None, self._depth]
+        self.phases.append(entry)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            entry[2] = self.elapsed() - entry[1]
+
+    def note_first_hook_event(self):
+        if self.first_hook_event is not None:
+            return
+        self.first_hook_event = self.elapsed()
+        logging.info(
+            "[STARTUP] Первое событие хука через %.0f мс после запуска",
+            self.first_hook_event * 1000,
+        )
+
+    def report(self, title, import_timer=None):
+        lines = [f"[STARTUP] {title}: {self.elapsed() * 1000:.0f} мс от запуска"]
+        for name, started, duration, depth in self.phases[self._reported :]:
+            took = f"{duration * 1000:8.1f} мс" if duration is not None else "   ..."
+            lines.append(
+                f"[STARTUP]   {started * 1000:8.1f} мс {took}  "
+                f"{'  ' * depth}{name}"
+            )
+        self._reported = len(self.phases)
+        if import_timer is not None and import_timer.records:
+            lines.append(
+                f"[STARTUP] Импорт: {len(import_timer.records)} модулей, "
+                f"{import_timer.total_ns() / 1e6:.0f} мс"
+            )
+            for fullname, (total, own) in import_timer.slowest():
+                lines.append(
+                    f"[STARTUP]   {own / 1e6:8.1f} мс (всего {total / 1e6:7.1f}) "
+                    f"{fullname}"
+                )
+        self.startup_reported = True
+        logging.info("\n".join(lines))
+
+
+timeline = StartupTimeline()
+import_timer = ImportTimer()
+
+
+def finish_startup_report(title):
+    """Пишет сводку запуска в журнал и снимает замер импортов."""
+    import_timer.uninstall()
+    timeline.report(title, import_timer)
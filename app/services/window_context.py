@@ -0,0 +1,357 @@
+import ctypes
+import logging
+import threading
+from collections import namedtuple
+from ctypes import wintypes
+
+from app.services import windows_api
+
+WindowSnapshot = namedtuple(
+    "WindowSnapshot", ("hwnd", "pid", "title", "window_class", "process_name")
+)
+WindowSnapshot.__doc__ = """
+Неизменяемый снимок активного окна.
+
+Атрибуты title/window_class/process_name совпадают с теми, что читают
+скомпилированные фильтры окон, поэтому снимок передаётся им напрямую.
+"""
+
+EMPTY_SNAPSHOT = WindowSnapshot(None, None, "", "", "")
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_NAMECHANGE = 0x800C
+WINEVENT_OUTOFCONTEXT = 0x0000
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+WM_QUIT = 0x0012
+
+POLL_INTERVAL = 0.25
+
+
+class Win32WindowProvider:
+    """Источник сведений об окнах через WinAPI и уведомления SetWinEventHook."""
+
+    def __init__(self):
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+        self._hooks_ok = False
+        self._callbacks = []
+        # Хук смены заголовков ставится только на поток активного окна,
+        # чтобы не получать события всех окон системы (вкладки, подсказки,
+        # индикаторы фоновых программ). Меняется с активным окном.
+        self._name_hook = None
+        self._name_target = None
+        self._name_hwnd = None
+
+    def foreground(self):
+        return windows_api.get_foreground_hwnd()
+
+    def describe(self, hwnd):
+        if not hwnd:
+            return EMPTY_SNAPSHOT
+        pid = windows_api.get_window_pid(hwnd)
+        return WindowSnapshot(
+            hwnd,
+            pid,
+            windows_api.get_window_title(hwnd) or "",
+            windows_api.get_window_class(hwnd) or "",
+            windows_api.get_process_name(pid, hwnd) or "",
+        )
+
+    def title(self, hwnd):
+        return windows_api.get_window_title(hwnd) or ""
+
+    def start_notifications(self, on_foreground, on_name_change):
+        """
+        Подписывается на смену активного окна и смену заголовков.
+
+        Возвращает False, если хуки установить не удалось (тогда контекст
+        переходит на опрос).
+        """
+        if not windows_api.WIN_LIBS_LOADED or not hasattr(ctypes, "WINFUNCTYPE"):
+            return False
+        self._ready.clear()
+        self._thread = threading.Thread(
+            target=self._message_loop,
+            args=(on_foreground, on_name_change),
+            name="TextExpanderWindowEvents",
+            daemon=True,
+        )
+        self._thread.start()
+        self._ready.wait(timeout=2.0)
+        return self._hooks_ok
+
+    def stop_notifications(self):
+        if self._thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        self._thread_id = None
+
+    def _message_loop(self, on_foreground, on_name_change):
+        user32 = ctypes.windll.user32
+        proc_type = ctypes.WINFUNCTYPE(
+            None,
+            wintypes.HANDLE,
+            wintypes.DWORD,
+            wintypes.HWND,
+            wintypes.LONG,
+            wintypes.LONG,
+            wintypes.DWORD,
+            wintypes.DWORD,
+        )
+
+        def _callback(hook, event, hwnd, id_object, id_child, thread, event_time):
+            try:
+                if event == EVENT_SYSTEM_FOREGROUND:
+                    self._watch_names(hwnd)
+                    on_foreground(hwnd)
+                elif (
+                    hwnd == self._name_hwnd
+                    and id_object == OBJID_WINDOW
+                    and id_child == CHILDID_SELF
+                ):
+                    on_name_change(hwnd)
+            except Exception:
+                logging.exception("[WINDOW] Ошибка обработки события окна")
+
+        # Ссылку на callback держим, пока работает цикл сообщений.
+        self._callbacks = [proc_type(_callback)]
+        foreground_hook = user32.SetWinEventHook(
+            EVENT_SYSTEM_FOREGROUND,
+            EVENT_SYSTEM_FOREGROUND,
+            0,
+            self._callbacks[0],
+            0,
+            0,
+            WINEVENT_OUTOFCONTEXT,
+        )
+        self._hooks_ok = bool(foreground_hook)
+        self._thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        if self._hooks_ok:
+            self._watch_names(user32.GetForegroundWindow())
+        self._ready.set()
+        if not self._hooks_ok:
+            return
+        msg = wintypes.MSG()
+        try:
+            while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            user32.UnhookWinEvent(foreground_hook)
+            self._unhook_names()
+            self._callbacks = []
+
+    def _watch_names(self, hwnd):
+        """
+        Переносит хук смены заголовков на поток окна hwnd.
+
+        Вызывается в потоке цикла сообщений. Если окно принадлежит тому же
+        потоку, что и прежнее, хук остаётся на месте.
+        """
+        user32 = ctypes.windll.user32
+        self._name_hwnd = hwnd or None
+        target = None
+        if hwnd:
+            pid = wintypes.DWORD()
+            thread_id = user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            if thread_id:
+                target = (pid.value, thread_id)
+        if target == self._name_target and self._name_hook:
+            return
+        self._unhook_names()
+        if target is None:
+            return
+        hook = user32.SetWinEventHook(
+            EVENT_OBJECT_NAMECHANGE,
+            EVENT_OBJECT_NAMECHANGE,
+            0,
+            self._callbacks[0],
+            target[0],
+            target[1],
+            WINEVENT_OUTOFCONTEXT,
+        )
+        if not hook:
+            logging.debug(
+                "[WINDOW] Не удалось подписаться на заголовки потока %s", target[1]
+            )
+            return
+        self._name_hook = hook
+        self._name_target = target
+
+    def _unhook_names(self):
+        if self._name_hook:
+            ctypes.windll.user32.UnhookWinEvent(self._name_hook)
+        self._name_hook = None
+        self._name_target = None
+
+
+class FakeWindowProvider:
+    """
+    Подставной источник окон для проверки логики без Windows.
+
+    Окна задаются через set_window(), переключение — через activate()
+    и rename(), которые сразу доставляют уведомления как настоящие хуки.
+    """
+
+    def __init__(self, notifications=True):
+        self._windows = {}
+        self._foreground = None
+        self._notifications = notifications
+        self._on_foreground = None
+        self._on_name_change = None
+
+    def set_window(self, hwnd, pid, title="", window_class="", process_name=""):
+        self._windows[hwnd] = WindowSnapshot(
+            hwnd, pid, title, window_class, process_name
+        )
+
+    def activate(self, hwnd):
+        self._foreground = hwnd
+        if self._on_foreground:
+            self._on_foreground(hwnd)
+
+    def rename(self, hwnd, title):
+        self._windows[hwnd] = self._windows[hwnd]._replace(title=title)
+        if self._on_name_change:
+            self._on_name_change(hwnd)
+
+    def foreground(self):
+        return self._foreground
+
+    def describe(self, hwnd):
+        return self._windows.get(hwnd, EMPTY_SNAPSHOT)
+
+    def title(self, hwnd):
+        return self.describe(hwnd).title
+
+    def start_notifications(self, on_foreground, on_name_change):
+        if not self._notifications:
+            return False
+        self._on_foreground = on_foreground
+        self._on_name_change = on_name_change
+        return True
+
+    def stop_notifications(self):
+        self._on_foreground = None
+        self._on_name_change = None
+
+
+class WindowContext:
+    """
+    Кэш сведений об активном окне (hwnd, pid, заголовок, класс, процесс).
+
+    Обновляется по уведомлениям о смене активного окна и его заголовка;
+    если хуки недоступны — опросом. snapshot() лишь возвращает текущий
+    неизменяемый снимок и не обращается к WinAPI.
+    """
+
+    def __init__(self, provider, poll_interval=POLL_INTERVAL):
+        self._provider = provider
+        self._poll_interval = poll_interval
+        self._snapshot = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._started = False
+        self._stop_event = threading.Event()
+        self._poll_thread = None
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._stop_event.clear()
+        self.refresh()
+        if not self._provider.start_notifications(
+            self._on_foreground, self._on_name_change
+        ):
+            logging.info("[WINDOW] Уведомления недоступны, используется опрос")
+            self._poll_thread = threading.Thread(
+                target=self._poll_loop, name="TextExpanderWindowPoll", daemon=True
+            )
+            self._poll_thread.start()
+
+    def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        self._stop_event.set()
+        self._provider.stop_notifications()
+        if self._poll_thread:
+            self._poll_thread.join(timeout=1.0)
+            self._poll_thread = None
+
+    @property
+    def is_running(self):
+        return self._started
+
+    def snapshot(self):
+        return self._snapshot
+
+    def subscribe(self, callback):
+        """callback(snapshot, previous) вызывается при каждом изменении снимка."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def refresh(self):
+        """Перечитывает активное окно целиком (используется и при опросе)."""
+        self._publish(self._provider.describe(self._provider.foreground()))
+        return self._snapshot
+
+    def _on_foreground(self, hwnd):
+        self._publish(self._provider.describe(hwnd))
+
+    def _on_name_change(self, hwnd):
+        current = self._snapshot
+        if not hwnd or hwnd != current.hwnd:
+            return
+        title = self._provider.title(hwnd)
+        if title != current.title:
+            self._publish(current._replace(title=title))
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self._poll_interval):
+            try:
+                hwnd = self._provider.foreground()
+                current = self._snapshot
+                if hwnd != current.hwnd:
+                    self._on_foreground(hwnd)
+                elif hwnd:
+                    self._on_name_change(hwnd)
+            except Exception:
+                logging.exception("[WINDOW] Ошибка опроса активного окна")
+
+    def _publish(self, snapshot):
+        with self._lock:
+            previous = self._snapshot
+            if snapshot == previous:
+                return
+            self._snapshot = snapshot
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(snapshot, previous)
+            except Exception:
+                logging.exception("[WINDOW] Ошибка подписчика контекста окна")
+
+
+_shared_context = None
+_shared_lock = threading.Lock()
+
+
+def get_window_context():
+    """Возвращает общий для процесса контекст окна (создаётся при первом вызове)."""
+    global _shared_context
+    with _shared_lock:
+        if _shared_context is None:
+            _shared_context = WindowContext(Win32WindowProvider())
+            windows_api.register_window_context(_shared_context)
+        return _shared_context
@@ -1,3 +1,7 @@
+import threading
+import time
+from collections import OrderedDict
+
 try:
     import win32gui
     import win32process
@@ -25,38 +29,219 @@ if WIN_LIBS_LOADED:
     HTCLOSE = getattr(win32con, "HTCLOSE", HTCLOSE)
 
 
-def get_active_process_name():
-    """Возвращает имя активного процесса в нижнем регистре (например, 'winword.exe')."""
+PROCESS_NAME_CACHE_SIZE = 64
+# Как часто (в секундах) запись, найденная по тому же окну, перепроверяется
+# по времени создания процесса.
+PROCESS_REVALIDATE_INTERVAL = 30.0
+
+
+class ProcessNameCache:
+    """
+    Ограниченный LRU-кэш PID -> (имя процесса, время создания).
+
+    Windows переиспользует PID, поэтому запись проверяется по времени
+    создания процесса. Проверка требует psutil.Process(pid), то есть
+    открытия дескриптора процесса, поэтому выполняется не на каждом
+    обращении: запись, найденная для того же окна (hwnd), считается верной
+    до истечения revalidate_interval. PID не может достаться другому
+    процессу, пока живёт окно с этим PID, так что смена hwnd или PID —
+    единственный повод проверить запись раньше.
+    """
+
+    def __init__(
+        self,
+        maxsize=PROCESS_NAME_CACHE_SIZE,
+        process_factory=None,
+        revalidate_interval=PROCESS_REVALIDATE_INTERVAL,
+        clock=time.monotonic,
+    ):
+        self._maxsize = maxsize
+        self._process_factory = process_factory
+        self._revalidate_interval = revalidate_interval
+        self._clock = clock
+        # pid -> [имя, время создания, hwnd последней проверки, момент проверки]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.revalidations = 0
+
+    def _factory(self):
+        if self._process_factory is not None:
+            return self._process_factory
+        return psutil.Process if WIN_LIBS_LOADED else None
+
+    def lookup(self, pid, hwnd=None):
+        """
+        Возвращает имя процесса в нижнем регистре или None.
+
+        hwnd — окно, которому принадлежит PID; без него запись
+        перепроверяется при каждом обращении.
+        """
+        factory = self._factory()
+        if not pid or factory is None:
+            return None
+        now = self._clock()
+        with self._lock:
+            cached = self._entries.get(pid)
+            if (
+                cached is not None
+                and hwnd is not None
+                and cached[2] == hwnd
+                and now - cached[3] < self._revalidate_interval
+            ):
+                self._entries.move_to_end(pid)
+                self.hits += 1
+                return cached[0]
+        try:
+            process = factory(pid)
+            create_time = process.create_time()
+        except Exception:
+            self.forget(pid)
+            return None
+        with self._lock:
+            self.revalidations += 1
+            cached = self._entries.get(pid)
+            if cached is not None:
+                if cached[1] == create_time:
+                    cached[2] = hwnd
+                    cached[3] = now
+                    self._entries.move_to_end(pid)
+                    self.hits += 1
+                    return cached[0]
+                # PID достался другому процессу.
+                self.stale += 1
+            self.misses += 1
+        try:
+            name = process.name().lower()
+        except Exception:
+            return None
+        with self._lock:
+            self._entries[pid] = [name, create_time, hwnd, now]
+            self._entries.move_to_end(pid)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return name
+
+    def forget(self, pid):
+        with self._lock:
+            self._entries.pop(pid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "revalidations": self.revalidations,
+            }
+
+    def describe(self):
+        stats = self.stats()
+        return (
+            f"{stats['size']} записей, попаданий {stats['hits']}, "
+            f"промахов {stats['misses']} (из них PID переиспользован {stats['stale']}), "
+            f"проверок процесса {stats['revalidations']}"
+        )
+
+
+process_names = ProcessNameCache()
+
+_window_context = None
+
+
+def register_window_context(context):
+    """
+    Подключает WindowContext: get_active_* читают его снимок вместо WinAPI.
+
+    Пока контекст не запущен, функции по-прежнему обращаются к WinAPI.
+    """
+    global _window_context
+    _window_context = context
+
+
+def _active_snapshot():
+    context = _window_context
+    if context is not None and context.is_running:
+        return context.snapshot()
+    return None
+
+
+def get_foreground_hwnd():
     if not WIN_LIBS_LOADED:
         return None
     try:
-        pid = win32process.GetWindowThreadProcessId(win32gui.GetForegroundWindow())
-        return psutil.Process(pid[-1]).name().lower()
+        return win32gui.GetForegroundWindow() or None
     except Exception:
         return None
 
 
-def get_active_window_title():
-    """Возвращает заголовок активного окна."""
-    if not WIN_LIBS_LOADED:
+def get_window_pid(hwnd):
+    if not WIN_LIBS_LOADED or not hwnd:
         return None
     try:
-        hwnd = win32gui.GetForegroundWindow()
-        if hwnd:
-            return win32gui.GetWindowText(hwnd)
-        return None
+        return win32process.GetWindowThreadProcessId(hwnd)[-1] or None
     except Exception:
         return None
 
 
-def get_active_window_class():
-    """Возвращает имя класса активного окна."""
-    if not WIN_LIBS_LOADED:
+def get_window_title(hwnd):
+    if not WIN_LIBS_LOADED or not hwnd:
         return None
     try:
-        hwnd = win32gui.GetForegroundWindow()
-        if hwnd:
-            return win32gui.GetClassName(hwnd)
+        return win32gui.GetWindowText(hwnd)
+    except Exception:
         return None
+
+
+def get_window_class(hwnd):
+    if not WIN_LIBS_LOADED or not hwnd:
+        return None
+    try:
+        return win32gui.GetClassName(hwnd)
     except Exception:
         return None
+
+
+def get_process_name(pid, hwnd=None):
+    """Возвращает имя процесса по PID в нижнем регистре (через кэш)."""
+    return process_names.lookup(pid, hwnd)
+
+
+def get_active_process_id():
+    """Возвращает PID активного процесса, если он доступен."""
+    snapshot = _active_snapshot()
+    if snapshot is not None:
+        return snapshot.pid
+    return get_window_pid(get_foreground_hwnd())
+
+
+def get_active_process_name():
+    """Возвращает имя активного процесса в нижнем регистре (например, 'winword.exe')."""
+    snapshot = _active_snapshot()
+    if snapshot is not None:
+        return snapshot.process_name or None
+    hwnd = get_foreground_hwnd()
+    return get_process_name(get_window_pid(hwnd), hwnd)
+
+
+def get_active_window_title():
+    """Возвращает заголовок активного окна."""
+    snapshot = _active_snapshot()
+    if snapshot is not None:
+        return snapshot.title if snapshot.hwnd else None
+    return get_window_title(get_foreground_hwnd())
+
+
+def get_active_window_class():
+    """Возвращает имя класса активного окна."""
+    snapshot = _active_snapshot()
+    if snapshot is not None:
+        return snapshot.window_class if snapshot.hwnd else None
+    return get_window_class(get_foreground_hwnd())
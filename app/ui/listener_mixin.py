@@ -6,21 +6,51 @@ import threading
 from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QSystemTrayIcon
 
-from app.services.listener_worker import ListenerWorker
+from app.services.listener_process import (
+    LISTENER_MODE_PROCESS,
+    ListenerClient,
+    ListenerUnavailable,
+)
 
 
 class ListenerMixin:
     def _start_listener_thread(self):
         """Создает и запускает поток клавиатурного слушателя."""
+        if self.listener_mode == LISTENER_MODE_PROCESS:
+            if self._connect_listener_process():
+                return
         if self.worker and self.listener_thread and self.listener_thread.is_alive():
             return
+        # pynput, pyperclip и psutil загружаются, только когда слушатель
+        # работает в потоке менеджера, а не в отдельном процессе.
+        from app.services.listener_worker import ListenerWorker
+
         self.worker = ListenerWorker(self.snippets_file)
+        self.worker.trace.enabled = self.key_trace_enabled
         self.listener_thread = threading.Thread(
             target=self.worker.run, name="TextExpanderListener", daemon=True
         )
         self.listener_thread.start()
         logging.info("[RUN] Поток слушателя запущен")
 
+    def _connect_listener_process(self):
+        """
+        Подключается к слушателю в отдельном процессе (запуская его при
+        необходимости). Если процесс недоступен, слушатель работает в потоке.
+        """
+        if isinstance(self.worker, ListenerClient) and self.worker.connected:
+            return True
+        try:
+            self.worker = ListenerClient.connect_or_spawn()
+        except ListenerUnavailable as e:
+            logging.error("[IPC] %s; слушатель будет запущен в потоке", e)
+            self.worker = None
+            return False
+        self.worker.trace.enabled = self.key_trace_enabled
+        self.listener_thread = None
+        logging.info("[RUN] Подключен процесс слушателя")
+        return True
+
     def _stop_listener_thread(self):
         """Останавливает поток слушателя, если он запущен."""
         worker = getattr(self, "worker", None)
@@ -50,9 +80,7 @@ class ListenerMixin:
         свои хуки ввода. Чтобы не требовать ручного перезапуска, делаем 1-2
         мягких перезапуска слушателя в первые минуты после загрузки.
         """
-        if not getattr(self, "autostart_check", None):
-            return
-        if not self.autostart_check.isChecked():
+        if not self.autostart_enabled:
             return
         try:
             uptime_ms = int(ctypes.windll.kernel32.GetTickCount64())
@@ -1,34 +1,60 @@
+import importlib
 import logging
 import os
 import sys
 
-from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QMainWindow
 
+from app.core.snippet_codec import DEFAULT_FORMAT
+from app.services.listener_process import LISTENER_MODE_THREAD
 from app.services.logging_service import configure_logging
 from app.services.paths import get_application_path
+from app.services.profiler import current_session, is_profiling
 from app.services.startup_service import get_startup_locations
+from app.services.startup_timing import timeline
 from app.ui.listener_mixin import ListenerMixin
 from app.ui.settings_mixin import SettingsMixin
-from app.ui.snippet_data_mixin import SnippetDataMixin
-from app.ui.snippet_editor_mixin import SnippetEditorMixin
 from app.ui.tray_mixin import TrayMixin
 from app.ui.ui_setup_mixin import UiSetupMixin
 from app.ui.window_events_mixin import WindowEventsMixin
 from app.version import __version__
 
+# Редактор сниппетов, импорт и экспорт нужны только окну менеджера. Их
+# модули (с QInputDialog/QMessageBox/QFileDialog и разбором форматов
+# импорта) загружаются при первом построении окна, а не при запуске в трей.
+_MANAGER_MIXINS = (
+    ("app.ui.snippet_data_mixin", "SnippetDataMixin"),
+    ("app.ui.snippet_editor_mixin", "SnippetEditorMixin"),
+)
+
 
 class TextExpanderApp(
     WindowEventsMixin,
     QMainWindow,
     UiSetupMixin,
-    SnippetDataMixin,
-    SnippetEditorMixin,
     ListenerMixin,
     TrayMixin,
     SettingsMixin,
 ):
     CATEGORY_PATH_SEPARATOR = " / "
+    _manager_mixins_loaded = False
+
+    @classmethod
+    def _load_manager_mixins(cls):
+        """
+        Подмешивает методы редактора в класс окна (один раз за процесс).
+
+        Вызывается из _ensure_ui до создания виджетов; до этого методы
+        редактора не нужны: все обращения к ним проверяют _ui_built.
+        """
+        if cls._manager_mixins_loaded:
+            return
+        for module_name, class_name in _MANAGER_MIXINS:
+            mixin = getattr(importlib.import_module(module_name), class_name)
+            for name, value in vars(mixin).items():
+                if not name.startswith("__"):
+                    setattr(cls, name, value)
+        cls._manager_mixins_loaded = True
 
     def __init__(self, is_admin=False):
         super().__init__()
@@ -47,6 +73,10 @@ class TextExpanderApp(
         self.settings_file = os.path.join(application_path, "expander_settings.json")
         self.snippets_file = os.path.join(application_path, "snippets.json")
         self.snippets_data = {}
+        self.snippets_storage_format = DEFAULT_FORMAT
+        self.key_trace_enabled = False
+        self.listener_mode = LISTENER_MODE_THREAD
+        self._profile_session = None
         self.category_combo_paths = {}
         self.original_abbr = None
         self.original_category_path = None
@@ -57,23 +87,27 @@ class TextExpanderApp(
         self.startup_locations = get_startup_locations()
         self.autostart_shortcut_name = "Text_expander.lnk"
         self._capture_countdown = 0
+        self.is_admin = is_admin
+        self.autostart_enabled = False
+        self.autostart_task_cleaned = False
+        self._autostart = None
+        self.start_minimized = False
+        self._ui_built = False
 
-        self._create_widgets()
-        self._create_layout()
-        self._create_tray_icon()
-        self._connect_signals()
-        self._apply_styles()
-        self._setup_status_bar(is_admin)
-        self._load_snippets()
-        self._load_settings()
-        if hasattr(self, "autostart_tray_action"):
-            self.autostart_tray_action.blockSignals(True)
-            self.autostart_tray_action.setChecked(self.autostart_check.isChecked())
-            self.autostart_tray_action.blockSignals(False)
-        self.set_autostart(self.autostart_check.isChecked(), silent=True)
-        self._start_listener_thread()
+        # Окно менеджера строится при первом показе: при запуске свернутым
+        # поднимаются только трей и слушатель.
+        with timeline.phase("_read_settings_file"):
+            settings = self._read_settings_file()
+            self._apply_core_settings(settings)
+        with timeline.phase("_create_tray_icon"):
+            self._create_tray_icon()
+        if is_profiling():
+            # Сеанс, запущенный флагом --profile, виден в меню трея.
+            self._watch_profiling_session(current_session())
+        if not self.start_minimized:
+            self._ensure_ui(settings)
+        with timeline.phase("set_autostart"):
+            self.set_autostart(self.autostart_enabled, silent=True)
+        with timeline.phase("listener start"):
+            self._start_listener_thread()
         self._schedule_post_boot_listener_restarts()
-
-        # Если включен запуск свернутым - прячем окно через небольшую задержку
-        if self.start_minimized_check.isChecked():
-            QTimer.singleShot(100, self.hide_to_tray)
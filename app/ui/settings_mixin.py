@@ -1,43 +1,83 @@
 import base64
 import json
+import logging
 import os
-import subprocess
 import sys
-import tempfile
-import traceback
 
-from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QObject, Signal
 
+from app.core.snippet_codec import STORAGE_FORMAT_LABELS
+from app.services.autostart import (
+    AutostartReconciler,
+    ShortcutSpec,
+    Win32ShellBackend,
+)
+from app.services.listener_process import LISTENER_MODE_LABELS
 from app.services.paths import get_project_root
 
 
+class _AutostartSignals(QObject):
+    # Результат сверки автозапуска из фонового потока: (AutostartResult, silent).
+    finished = Signal(object, bool)
+
+
 class SettingsMixin:
     def on_autostart_changed(self, state):
         """Обрабатывает изменение состояния чекбокса автозапуска."""
         enabled = bool(state)
+        self.autostart_enabled = enabled
         if hasattr(self, "autostart_tray_action"):
             self.autostart_tray_action.blockSignals(True)
             self.autostart_tray_action.setChecked(enabled)
             self.autostart_tray_action.blockSignals(False)
         self._save_specific_setting("autostart_enabled", enabled)
-        QApplication.processEvents()
         self.set_autostart(enabled)
-        status = "включен" if enabled else "выключен"
-        self.statusBar().showMessage(f"Автозапуск {status}", 3000)
 
     def on_start_minimized_changed(self, state):
         """Обрабатывает изменение состояния чекбокса 'запускать свернутым'."""
         enabled = bool(state)
+        self.start_minimized = enabled
         self._save_specific_setting("start_minimized", enabled)
         status = "включен" if enabled else "выключен"
         self.statusBar().showMessage(f"Запуск свернутым {status}", 3000)
 
+    def on_storage_format_changed(self, index):
+        """Сохраняет выбранный формат хранения и сразу перезаписывает файл сниппетов."""
+        fmt = self.storage_format_combo.itemData(index)
+        if not fmt or fmt == self.snippets_storage_format:
+            return
+        self.snippets_storage_format = fmt
+        self._save_specific_setting("snippets_storage_format", fmt)
+        self._save_snippets_to_file()
+        self.statusBar().showMessage(
+            f"Формат хранения: {self.storage_format_combo.currentText()}", 3000
+        )
+
+    def on_listener_mode_changed(self, index):
+        """Переключает режим слушателя (поток или отдельный процесс) и перезапускает его."""
+        mode = self.listener_mode_combo.itemData(index)
+        if not mode or mode == self.listener_mode:
+            return
+        self.listener_mode = mode
+        self._save_specific_setting("listener_mode", mode)
+        self._stop_listener_thread()
+        self._start_listener_thread()
+        self._update_detach_action()
+        if hasattr(self, "pause_resume_action"):
+            self.pause_resume_action.setText("Приостановить")
+        self.statusBar().showMessage(
+            f"Слушатель: {self.listener_mode_combo.currentText()}", 3000
+        )
+
     def _tray_autostart_toggled(self, checked):
         """
         Обрабатывает переключение автозапуска из меню трея,
         синхронизируя состояние с чекбоксом настроек.
         """
-        if self.autostart_check.isChecked() != checked:
+        if not self._ui_built:
+            if self.autostart_enabled != checked:
+                self.on_autostart_changed(checked)
+        elif self.autostart_check.isChecked() != checked:
             self.autostart_check.setChecked(checked)
 
     def _save_specific_setting(self, key, value):
@@ -50,55 +90,96 @@ class SettingsMixin:
             with open(self.settings_file, "w", encoding="utf-8") as f:
                 json.dump(settings, f, indent=4, ensure_ascii=False)
         except (IOError, json.JSONDecodeError) as e:
-            print(f"Ошибка при сохранении настройки '{key}': {e}")
+            logging.error("[SETTINGS] Ошибка при сохранении настройки '%s': %s", key, e)
 
-    def _load_settings(self):
+    def _read_settings_file(self):
         if not os.path.exists(self.settings_file):
-            return
+            return {}
         try:
             with open(self.settings_file, "r", encoding="utf-8") as f:
                 settings = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            return {}
+        return settings if isinstance(settings, dict) else {}
+
+    def _apply_core_settings(self, settings):
+        """Настройки, нужные до построения окна: трею, слушателю и автозапуску."""
+        self.autostart_enabled = bool(settings.get("autostart_enabled", False))
+        self.start_minimized = bool(settings.get("start_minimized", False))
+        self.autostart_task_cleaned = bool(
+            settings.get("autostart_task_cleaned", False)
+        )
+        storage_format = settings.get("snippets_storage_format")
+        if storage_format in STORAGE_FORMAT_LABELS:
+            self.snippets_storage_format = storage_format
+        listener_mode = settings.get("listener_mode")
+        if listener_mode in LISTENER_MODE_LABELS:
+            self.listener_mode = listener_mode
+        self.key_trace_enabled = bool(settings.get("key_trace_enabled", False))
+
+    def _apply_ui_settings(self, settings):
+        """Переносит настройки в виджеты только что построенного окна."""
+        try:
             if "geometry" in settings:
                 self.restoreGeometry(base64.b64decode(settings["geometry"]))
             if "splitter_state" in settings:
                 self.splitter.restoreState(
                     base64.b64decode(settings["splitter_state"])
                 )
+        except (TypeError, ValueError):
+            pass
 
-            autostart_enabled = settings.get("autostart_enabled")
-            if autostart_enabled is not None:
-                self.autostart_check.blockSignals(True)
-                self.autostart_check.setChecked(bool(autostart_enabled))
-                self.autostart_check.blockSignals(False)
+        for widget, checked in (
+            (self.autostart_check, self.autostart_enabled),
+            (self.start_minimized_check, self.start_minimized),
+        ):
+            widget.blockSignals(True)
+            widget.setChecked(checked)
+            widget.blockSignals(False)
 
-            start_minimized = settings.get("start_minimized")
-            if start_minimized is not None:
-                self.start_minimized_check.blockSignals(True)
-                self.start_minimized_check.setChecked(bool(start_minimized))
-                self.start_minimized_check.blockSignals(False)
+        for combo, value in (
+            (self.storage_format_combo, self.snippets_storage_format),
+            (self.listener_mode_combo, self.listener_mode),
+        ):
+            combo.blockSignals(True)
+            combo.setCurrentIndex(combo.findData(value))
+            combo.blockSignals(False)
 
-            expanded = settings.get("expanded_categories", [])
-            self._restore_tree_expanded_state(expanded)
-        except (IOError, json.JSONDecodeError):
-            pass
+        self._restore_tree_expanded_state(settings.get("expanded_categories", []))
 
     def _save_settings(self):
-        """Собирает данные из виджетов и сохраняет их в JSON-файл."""
-        settings = {
-            "geometry": base64.b64encode(self.saveGeometry().data()).decode("utf-8"),
-            "splitter_state": base64.b64encode(self.splitter.saveState().data()).decode(
-                "utf-8"
-            ),
-            "expanded_categories": self._save_tree_expanded_state(),
-            "autostart_enabled": self.autostart_check.isChecked(),
-            "start_minimized": self.start_minimized_check.isChecked(),
-        }
+        """
+        Сохраняет настройки в JSON-файл. Пока окно не строилось, его
+        геометрия и раскрытые категории остаются такими, какими были в файле.
+        """
+        settings = self._read_settings_file()
+        settings.update(
+            {
+                "autostart_enabled": self.autostart_enabled,
+                "start_minimized": self.start_minimized,
+                "snippets_storage_format": self.snippets_storage_format,
+                "key_trace_enabled": self.key_trace_enabled,
+                "listener_mode": self.listener_mode,
+            }
+        )
+        if self._ui_built:
+            settings.update(
+                {
+                    "geometry": base64.b64encode(self.saveGeometry().data()).decode(
+                        "utf-8"
+                    ),
+                    "splitter_state": base64.b64encode(
+                        self.splitter.saveState().data()
+                    ).decode("utf-8"),
+                    "expanded_categories": self._save_tree_expanded_state(),
+                }
+            )
 
         try:
             with open(self.settings_file, "w", encoding="utf-8") as f:
                 json.dump(settings, f, indent=4, ensure_ascii=False)
         except Exception as e:
-            print(f"Ошибка при сохранении настроек: {e}")
+            logging.error("[SETTINGS] Ошибка при сохранении настроек: %s", e)
 
     def closeEvent(self, event):
         """Перехватывает стандартное событие закрытия окна."""
@@ -109,68 +190,42 @@ class SettingsMixin:
 
     def set_autostart(self, enabled, silent=False):
         """
-        Настраивает запуск программы вместе с Windows.
+        Запрашивает сверку ярлыка автозапуска с желаемым состоянием.
+
+        Сверка идёт в фоновом потоке и ничего не меняет, если ярлык уже
+        указывает на нужный файл; результат приходит сигналом в поток GUI.
         """
-        try:
-            target_path = self._resolve_autostart_target()
-            if not target_path:
-                return
-
-            task_name = "Text_expander"
-            subprocess.run(
-                ["schtasks", "/Delete", "/TN", task_name, "/F"],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="ignore",
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                check=False,
+        target_path = self._resolve_autostart_target()
+        if not target_path:
+            return
+        spec = ShortcutSpec(
+            target_path, "", os.path.dirname(target_path), "Text expander"
+        )
+        if self._autostart is None:
+            self._autostart = AutostartReconciler(
+                Win32ShellBackend(),
+                self.startup_locations,
+                self.autostart_shortcut_name,
             )
-
-            if enabled:
-                created = False
-                for folder in self.startup_locations:
-                    if not folder:
-                        continue
-                    try:
-                        os.makedirs(folder, exist_ok=True)
-                    except OSError:
-                        continue
-                    shortcut_path = os.path.join(folder, self.autostart_shortcut_name)
-                    if self._create_shortcut(shortcut_path, target_path):
-                        created = True
-                        if not silent:
-                            self.statusBar().showMessage("Автозапуск включен", 4000)
-                        break
-
-                if not created:
-                    if not silent:
-                        self.statusBar().showMessage(
-                            "Не удалось создать ярлык", 5000
-                        )
-
-            else:
-                removed = False
-                for folder in self.startup_locations:
-                    if not folder:
-                        continue
-                    shortcut_path = os.path.join(folder, self.autostart_shortcut_name)
-                    if os.path.exists(shortcut_path):
-                        try:
-                            os.remove(shortcut_path)
-                            removed = True
-                        except Exception as err:
-                            print(f"Ошибка удаления ярлыка '{shortcut_path}': {err}")
-                            traceback.print_exc()
-
-                if removed and not silent:
-                    self.statusBar().showMessage("Автозапуск отключен", 4000)
-
-        except Exception as e:
-            print(f"Критическая ошибка в set_autostart: {e}")
-            traceback.print_exc()
-            if not silent:
-                self.statusBar().showMessage("Критическая ошибка автозапуска", 5000)
+            self._autostart_signals = _AutostartSignals()
+            self._autostart_signals.finished.connect(self._on_autostart_reconciled)
+        signals = self._autostart_signals
+        self._autostart.request(
+            enabled,
+            spec,
+            lambda result: signals.finished.emit(result, silent),
+            cleanup_legacy=not self.autostart_task_cleaned,
+        )
+
+    def _on_autostart_reconciled(self, result, silent):
+        if result.legacy_checked and not self.autostart_task_cleaned:
+            self.autostart_task_cleaned = True
+            self._save_specific_setting("autostart_task_cleaned", True)
+        if result.changed or not result.ok:
+            log = logging.info if result.ok else logging.error
+            log("[AUTOSTART] %s", result.message)
+        if not silent:
+            self.statusBar().showMessage(result.message, 4000 if result.ok else 5000)
 
     def _resolve_autostart_target(self):
         if getattr(sys, "frozen", False):
@@ -185,43 +240,3 @@ class SettingsMixin:
             )
             return None
         return target_path
-
-    def _create_shortcut(self, shortcut_path, target_path):
-        vbs_script = f"""
-Set oWS = WScript.CreateObject("WScript.Shell")
-sLinkFile = "{shortcut_path}"
-Set oLink = oWS.CreateShortcut(sLinkFile)
-oLink.TargetPath = "{target_path}"
-oLink.WorkingDirectory = "{os.path.dirname(target_path)}"
-oLink.Description = "Text expander"
-oLink.Save
-"""
-        tmp_file = None
-        try:
-            with tempfile.NamedTemporaryFile(
-                "w", delete=False, suffix=".vbs", encoding="utf-8"
-            ) as tmp:
-                tmp.write(vbs_script)
-                tmp_file = tmp.name
-
-            subprocess.run(
-                ["cscript", "//Nologo", tmp_file],
-                capture_output=True,
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                check=False,
-            )
-            if not os.path.exists(shortcut_path):
-                self.statusBar().showMessage("Ошибка создания ярлыка", 5000)
-                return False
-            return True
-        except Exception as err:
-            print(f"Ошибка при создании ярлыка: {err}")
-            traceback.print_exc()
-            self.statusBar().showMessage("Ошибка создания ярлыка", 5000)
-            return False
-        finally:
-            if tmp_file and os.path.exists(tmp_file):
-                try:
-                    os.remove(tmp_file)
-                except OSError:
-                    pass
@@ -1,10 +1,41 @@
 import json
+import logging
 import os
 from functools import partial
 
 from PySide6.QtCore import Qt, QTimer
-from PySide6.QtWidgets import QCheckBox, QMessageBox, QStyle, QTreeWidgetItem
+from PySide6.QtWidgets import (
+    QCheckBox,
+    QFileDialog,
+    QMessageBox,
+    QStyle,
+    QTreeWidgetItem,
+)
 
+from app.core.snippet_codec import (
+    FORMAT_PRETTY,
+    SnippetCodecError,
+    load_snippet_document,
+    save_snippet_document,
+)
+from app.core.snippet_import import (
+    IMPORT_FILE_FILTER,
+    IMPORT_FORMAT_LABELS,
+    IMPORT_REPORT_FILENAME,
+    SnippetImportError,
+    apply_import,
+    detect_import_format,
+    iter_library_abbrs,
+    plan_import,
+    read_import_file,
+    write_import_report,
+)
+from app.core.snippet_store import (
+    new_category_payload,
+    normalize_snippet_store,
+    wrap_snippet_store,
+)
+from app.services.profiler import span
 from app.ui.constants import (
     CATEGORY_ITEM_KIND,
     ITEM_KIND_ROLE,
@@ -174,7 +205,7 @@ class SnippetDataMixin:
         return None
 
     def _new_category_payload(self, enabled=True):
-        return {"enabled": bool(enabled), "snippets": {}, "categories": {}}
+        return new_category_payload(enabled)
 
     def _are_all_snippets_enabled(self, payload):
         if not isinstance(payload, dict):
@@ -264,100 +295,6 @@ class SnippetDataMixin:
                     if snippet_entry:
                         snippet_entry["enabled"] = enabled
 
-    def _normalize_category_payload(self, payload):
-        needs_resave = False
-        if not isinstance(payload, dict):
-            return self._new_category_payload(), True
-
-        normalized_payload = self._new_category_payload(
-            enabled=payload.get("enabled", True)
-        )
-
-        # Сохраняем window_filter категории, если он есть
-        if "window_filter" in payload and payload.get("window_filter"):
-            normalized_payload["window_filter"] = payload["window_filter"]
-
-        snippets_block = {}
-        if "snippets" in payload and isinstance(payload.get("snippets"), dict):
-            snippets_block = payload.get("snippets") or {}
-        elif isinstance(payload, dict):
-            snippets_block = {
-                key: value
-                for key, value in payload.items()
-                if key not in {"enabled", "categories", "window_filter"}
-            }
-            if snippets_block:
-                needs_resave = True
-
-        normalized_snippets = {}
-        for abbr, snippet_payload in snippets_block.items():
-            snippet_enabled = True
-            snippet_text = ""
-            snippet_window_filter = None
-            if isinstance(snippet_payload, dict):
-                snippet_text = str(snippet_payload.get("text", ""))
-                snippet_enabled = bool(snippet_payload.get("enabled", True))
-                # Сохраняем window_filter сниппета
-                snippet_window_filter = snippet_payload.get("window_filter")
-                if "text" not in snippet_payload or "enabled" not in snippet_payload:
-                    needs_resave = True
-            else:
-                snippet_text = str(snippet_payload) if snippet_payload else ""
-                snippet_enabled = True
-                needs_resave = True
-
-            snippet_data = {
-                "text": snippet_text,
-                "enabled": snippet_enabled,
-            }
-            # Добавляем window_filter только если он есть
-            if snippet_window_filter:
-                snippet_data["window_filter"] = snippet_window_filter
-
-            normalized_snippets[abbr] = snippet_data
-
-        raw_subcategories = payload.get("categories", {})
-        normalized_subcategories = {}
-        if isinstance(raw_subcategories, dict):
-            for sub_name, sub_payload in raw_subcategories.items():
-                normalized_child, child_resave = self._normalize_category_payload(
-                    sub_payload
-                )
-                normalized_subcategories[sub_name] = normalized_child
-                needs_resave = needs_resave or child_resave
-        elif raw_subcategories:
-            needs_resave = True
-
-        normalized_payload["snippets"] = normalized_snippets
-        normalized_payload["categories"] = normalized_subcategories
-        return normalized_payload, needs_resave
-
-    def _normalize_snippet_store(self, data):
-        normalized = {}
-        needs_resave = False
-        if not isinstance(data, dict):
-            return normalized, True
-
-        if data and all(isinstance(v, str) for v in data.values()):
-            normalized["Без категории"] = {
-                "enabled": True,
-                "snippets": {
-                    abbr: {"text": str(text), "enabled": True}
-                    for abbr, text in data.items()
-                },
-                "categories": {},
-            }
-            return normalized, True
-
-        for category_name, payload in data.items():
-            normalized_payload, payload_resave = self._normalize_category_payload(
-                payload
-            )
-            normalized[category_name] = normalized_payload
-            needs_resave = needs_resave or payload_resave
-
-        return normalized, needs_resave
-
     def _attach_checkbox_widget(self, item, *, is_category, state):
         checkbox = QCheckBox()
         checkbox.setTristate(is_category)
@@ -439,6 +376,7 @@ class SnippetDataMixin:
         self._sync_parent_payload_flags(category_path[:-1])
         self.reload_listener_snippets()
 
+    @span("_load_snippets")
     def _load_snippets(self):
         try:
             if not os.path.exists(self.snippets_file):
@@ -456,9 +394,8 @@ class SnippetDataMixin:
                 }
                 self._save_snippets_to_file()
             else:
-                with open(self.snippets_file, "r", encoding="utf-8") as f:
-                    raw_data = json.load(f)
-                normalized, needs_resave = self._normalize_snippet_store(raw_data)
+                raw_data = load_snippet_document(self.snippets_file)
+                normalized, needs_resave = normalize_snippet_store(raw_data)
                 self.snippets_data = normalized
                 if needs_resave:
                     self._save_snippets_to_file()
@@ -529,7 +466,7 @@ class SnippetDataMixin:
 
             self._restore_tree_expanded_state(expanded_categories)
 
-        except (json.JSONDecodeError, IOError) as e:
+        except (json.JSONDecodeError, SnippetCodecError, IOError) as e:
             QMessageBox.warning(
                 self, "Ошибка", f"Не удалось загрузить файл сниппетов: {e}"
             )
@@ -566,11 +503,131 @@ class SnippetDataMixin:
         elif focus_category_path:
             self._select_category_in_tree(focus_category_path)
 
+    @span("_save_snippets_to_file")
     def _save_snippets_to_file(self):
         try:
-            with open(self.snippets_file, "w", encoding="utf-8") as f:
-                json.dump(self.snippets_data, f, indent=4, ensure_ascii=False)
-        except IOError as e:
+            save_snippet_document(
+                self.snippets_file,
+                wrap_snippet_store(self.snippets_data),
+                self.snippets_storage_format,
+            )
+        except (IOError, SnippetCodecError) as e:
             QMessageBox.critical(
                 self, "Ошибка", f"Не удалось сохранить файл сниппетов: {e}"
             )
+
+    def _export_snippets_pretty(self):
+        """Экспортирует библиотеку в читаемый JSON (для людей и систем контроля версий)."""
+        default_path = os.path.join(
+            os.path.dirname(self.snippets_file), "snippets_export.json"
+        )
+        export_path, _ = QFileDialog.getSaveFileName(
+            self, "Экспорт сниппетов", default_path, "JSON (*.json)"
+        )
+        if not export_path:
+            return
+        try:
+            save_snippet_document(
+                export_path, wrap_snippet_store(self.snippets_data), FORMAT_PRETTY
+            )
+        except (IOError, SnippetCodecError) as e:
+            QMessageBox.critical(
+                self, "Ошибка", f"Не удалось экспортировать сниппеты: {e}"
+            )
+            return
+        self.statusBar().showMessage(f"Сниппеты экспортированы: {export_path}", 4000)
+
+    def _import_snippets(self):
+        """
+        Импортирует внешнюю библиотеку одной операцией: записи проверяются
+        целиком, затем следуют одно сохранение файла, одна перестройка
+        дерева и одна перезагрузка индекса слушателя.
+        """
+        # Скан-коды нужны только для проверки импорта; при запуске не грузятся.
+        from app.services.scan_code_keyboard import build_scan_sequences
+
+        snippets_dir = os.path.dirname(self.snippets_file)
+        import_path, _ = QFileDialog.getOpenFileName(
+            self, "Импорт сниппетов", snippets_dir, IMPORT_FILE_FILTER
+        )
+        if not import_path:
+            return
+        try:
+            fmt = detect_import_format(import_path)
+            plan = plan_import(
+                read_import_file(import_path, fmt),
+                iter_library_abbrs(self.snippets_data),
+                build_scan_sequences,
+                fmt,
+            )
+        except (SnippetImportError, SnippetCodecError, IOError) as e:
+            QMessageBox.critical(
+                self, "Ошибка", f"Не удалось импортировать сниппеты: {e}"
+            )
+            return
+        logging.info("[IMPORT] %s (%s): %s", import_path, fmt, plan.summary())
+
+        report_path = None
+        if plan.rejected:
+            report_path = os.path.join(snippets_dir, IMPORT_REPORT_FILENAME)
+            try:
+                write_import_report(report_path, plan, import_path)
+            except IOError:
+                logging.exception("[IMPORT] Не удалось записать отчёт импорта")
+                report_path = None
+
+        if not plan.added and not plan.existing:
+            QMessageBox.warning(
+                self,
+                "Импорт сниппетов",
+                "Нечего импортировать.\n\n" + "\n".join(plan.report_lines(limit=10)),
+            )
+            return
+
+        target_name = f"Импорт {os.path.splitext(os.path.basename(import_path))[0]}"
+        target_path = (target_name,)
+        lines = [
+            f"Формат: {IMPORT_FORMAT_LABELS[fmt]}",
+            plan.summary(),
+            "",
+            f"Новые сниппеты попадут в категорию '{target_name}'.",
+        ]
+        if report_path:
+            lines.append(f"Отклонённые записи: {report_path}")
+        buttons = QMessageBox.StandardButton.Ok | QMessageBox.StandardButton.Cancel
+        if plan.existing:
+            lines.append("")
+            lines.append(
+                f"Заменить текст у {len(plan.existing)} уже существующих сниппетов?"
+            )
+            buttons = (
+                QMessageBox.StandardButton.Yes
+                | QMessageBox.StandardButton.No
+                | QMessageBox.StandardButton.Cancel
+            )
+        reply = QMessageBox.question(
+            self, "Импорт сниппетов", "\n".join(lines), buttons
+        )
+        if reply == QMessageBox.StandardButton.Cancel:
+            return
+
+        added, replaced = apply_import(
+            self.snippets_data,
+            target_path,
+            plan,
+            replace_existing=reply == QMessageBox.StandardButton.Yes,
+        )
+        if not added and not replaced:
+            self.statusBar().showMessage("Импорт: библиотека не изменилась", 4000)
+            return
+        if added:
+            target_payload = self._get_category_payload(target_path)
+            target_payload["enabled"] = self._are_all_snippets_enabled(target_payload)
+        self._save_snippets_to_file()
+        self._load_snippets()
+        self.reload_listener_snippets()
+        if added:
+            self._select_category_in_tree(target_path)
+        self.statusBar().showMessage(
+            f"Импортировано сниппетов: {added}, заменено: {replaced}", 5000
+        )
@@ -1,7 +1,14 @@
+import logging
+
 from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWidgets import QInputDialog, QMessageBox
 
-from app.services.windows_api import get_active_window_class, get_active_window_title
+from app.core.window_filter import MATCH_CONTAINS, MATCH_MODES, validate_window_filter
+from app.services.windows_api import (
+    get_active_process_name,
+    get_active_window_class,
+    get_active_window_title,
+)
 from app.ui.constants import ITEM_KIND_ROLE, SNIPPET_ITEM_KIND
 
 
@@ -38,11 +45,15 @@ class SnippetEditorMixin:
                 if window_filter:
                     self.window_title_input.setText(window_filter.get("title", ""))
                     self.window_class_input.setText(window_filter.get("class", ""))
-                    match_mode = window_filter.get("match_mode", "contains")
-                    if match_mode == "exact":
-                        self.match_mode_combo.setCurrentIndex(1)
-                    else:
-                        self.match_mode_combo.setCurrentIndex(0)
+                    self.window_process_input.setText(
+                        window_filter.get("process", "")
+                    )
+                    match_mode = window_filter.get("match_mode", MATCH_CONTAINS)
+                    self.match_mode_combo.setCurrentIndex(
+                        MATCH_MODES.index(match_mode)
+                        if match_mode in MATCH_MODES
+                        else 0
+                    )
                 else:
                     self._clear_window_filter_fields()
             else:
@@ -63,6 +74,7 @@ class SnippetEditorMixin:
         """Очищает поля фильтра окна."""
         self.window_title_input.clear()
         self.window_class_input.clear()
+        self.window_process_input.clear()
         self.match_mode_combo.setCurrentIndex(0)
 
     def _capture_current_window(self):
@@ -88,11 +100,14 @@ class SnippetEditorMixin:
             # Захватываем информацию об активном окне
             title = get_active_window_title()
             window_class = get_active_window_class()
+            process = get_active_process_name()
 
             if title:
                 self.window_title_input.setText(title)
             if window_class:
                 self.window_class_input.setText(window_class)
+            if process:
+                self.window_process_input.setText(process)
 
             self.capture_window_button.setText("Захватить текущее окно")
             self.capture_window_button.setEnabled(True)
@@ -145,6 +160,24 @@ class SnippetEditorMixin:
             )
             return
 
+        # Формируем window_filter если указаны данные
+        window_filter = None
+        window_title = self.window_title_input.text().strip()
+        window_class = self.window_class_input.text().strip()
+        window_process = self.window_process_input.text().strip()
+        if window_title or window_class or window_process:
+            window_filter = {
+                "title": window_title,
+                "class": window_class,
+                "match_mode": MATCH_MODES[self.match_mode_combo.currentIndex()],
+            }
+            if window_process:
+                window_filter["process"] = window_process
+        filter_error = validate_window_filter(window_filter)
+        if filter_error:
+            QMessageBox.warning(self, "Некорректный фильтр окна", filter_error)
+            return
+
         snippet_enabled = True
         if self.original_abbr and self.original_category_path:
             original_payload = self._get_category_payload(self.original_category_path)
@@ -177,20 +210,6 @@ class SnippetEditorMixin:
 
         category_payload = self._get_category_payload(category_path, create=True)
 
-        # Формируем window_filter если указаны данные
-        window_filter = None
-        window_title = self.window_title_input.text().strip()
-        window_class = self.window_class_input.text().strip()
-        if window_title or window_class:
-            match_mode = (
-                "exact" if self.match_mode_combo.currentIndex() == 1 else "contains"
-            )
-            window_filter = {
-                "title": window_title,
-                "class": window_class,
-                "match_mode": match_mode,
-            }
-
         snippet_data = {
             "text": text,
             "enabled": snippet_enabled,
@@ -198,25 +217,26 @@ class SnippetEditorMixin:
         if window_filter:
             snippet_data["window_filter"] = window_filter
 
-        print(f"[DEBUG] Сохранение сниппета '{abbr}' с данными: {snippet_data}")
+        logging.debug("[DEBUG] Сохранение сниппета '%s' с данными: %s", abbr, snippet_data)
 
         category_payload["snippets"][abbr] = snippet_data
         category_payload["enabled"] = self._are_all_snippets_enabled(category_payload)
         self._sync_parent_payload_flags(category_path)
 
-        print(
-            f"[DEBUG] Данные категории для '{abbr}': "
-            f"{category_payload['snippets'].get(abbr)}"
+        logging.debug(
+            "[DEBUG] Данные категории для '%s': %s",
+            abbr,
+            category_payload["snippets"].get(abbr),
         )
 
         self._save_snippets_to_file()
         self._load_snippets()
 
         reloaded_payload = self._get_category_payload(category_path)
-        if reloaded_payload:
-            print(
-                f"[DEBUG] После перезагрузки - данные сниппета: "
-                f"{reloaded_payload.get('snippets', {}).get(abbr)}"
+        if reloaded_payload and logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(
+                "[DEBUG] После перезагрузки - данные сниппета: %s",
+                reloaded_payload.get("snippets", {}).get(abbr),
             )
 
         # Автоматически применяем изменения
@@ -1,9 +1,27 @@
+import logging
 import os
+import time
+from functools import partial
 
+from PySide6.QtCore import QTimer
 from PySide6.QtGui import QIcon, QAction
 from PySide6.QtWidgets import QMenu, QStyle, QSystemTrayIcon
 
-from app.services.paths import resource_path
+from app.services.listener_process import (
+    LISTENER_MODE_PROCESS,
+    ListenerClient,
+    ListenerUnavailable,
+)
+from app.services.logging_service import recent_log_lines, shutdown_logging
+from app.services.paths import get_application_path, resource_path
+from app.services.profiler import (
+    DEFAULT_DURATION,
+    PROFILE_DIRNAME,
+    is_profiling,
+    start_profiling,
+    stop_profiling,
+)
+from app.services.window_context import get_window_context
 from app.version import __version__
 
 
@@ -24,8 +42,9 @@ class TrayMixin:
         tray_icon_path = resource_path("logo.ico")
         tray_icon = QIcon(tray_icon_path) if os.path.exists(tray_icon_path) else QIcon()
         if tray_icon.isNull():
-            print(
-                f"[WARN] Не удалось загрузить '{tray_icon_path}', используем стандартную иконку трея."
+            logging.warning(
+                "[WARN] Не удалось загрузить '%s', используем стандартную иконку трея.",
+                tray_icon_path,
             )
             tray_icon = self.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon)
         self.tray_icon.setIcon(tray_icon)
@@ -39,22 +58,143 @@ class TrayMixin:
         tray_menu.addAction(self.pause_resume_action)
         self.autostart_tray_action = QAction("Автозапуск", self)
         self.autostart_tray_action.setCheckable(True)
-        self.autostart_tray_action.setChecked(self.autostart_check.isChecked())
+        self.autostart_tray_action.setChecked(self.autostart_enabled)
         self.autostart_tray_action.toggled.connect(self._tray_autostart_toggled)
         tray_menu.addAction(self.autostart_tray_action)
         reload_action = QAction("Обновить сниппеты", self)
         reload_action.triggered.connect(self.reload_listener_snippets)
         tray_menu.addAction(reload_action)
+        log_action = QAction("Журнал…", self)
+        log_action.triggered.connect(self.show_log_viewer)
+        tray_menu.addAction(log_action)
+        self.key_trace_action = QAction("Трассировка клавиш", self)
+        self.key_trace_action.setCheckable(True)
+        self.key_trace_action.setChecked(self.key_trace_enabled)
+        self.key_trace_action.toggled.connect(self._toggle_key_trace)
+        tray_menu.addAction(self.key_trace_action)
+        dump_trace_action = QAction("Сохранить трассировку…", self)
+        dump_trace_action.triggered.connect(self._dump_key_trace)
+        tray_menu.addAction(dump_trace_action)
+        self.profile_action = QAction(
+            f"Профилирование ({DEFAULT_DURATION:.0f} с)", self
+        )
+        self.profile_action.setCheckable(True)
+        self.profile_action.setChecked(is_profiling())
+        self.profile_action.toggled.connect(self._toggle_profiling)
+        tray_menu.addAction(self.profile_action)
 
         tray_menu.addSeparator()
 
+        self.detach_action = QAction("Закрыть менеджер, оставить слушатель", self)
+        self.detach_action.triggered.connect(self.quit_manager_only)
+        tray_menu.addAction(self.detach_action)
+        self._update_detach_action()
+
         quit_action = QAction("Выход", self)
         quit_action.triggered.connect(self.quit_application)
         tray_menu.addAction(quit_action)
 
         self.tray_icon.setContextMenu(tray_menu)
+        self.tray_icon.activated.connect(self.on_tray_icon_activated)
         self.tray_icon.show()
 
+    def show_log_viewer(self):
+        """Показывает последние записи журнала из буфера в памяти."""
+        from PySide6.QtWidgets import (
+            QDialog,
+            QDialogButtonBox,
+            QPlainTextEdit,
+            QVBoxLayout,
+        )
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Журнал Text expander")
+        dialog.resize(800, 500)
+        layout = QVBoxLayout(dialog)
+        view = QPlainTextEdit(dialog)
+        view.setReadOnly(True)
+        view.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        layout.addWidget(view)
+
+        def refresh():
+            view.setPlainText("\n".join(recent_log_lines()))
+            view.verticalScrollBar().setValue(view.verticalScrollBar().maximum())
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close, dialog)
+        refresh_button = buttons.addButton(
+            "Обновить", QDialogButtonBox.ButtonRole.ActionRole
+        )
+        refresh_button.clicked.connect(refresh)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        refresh()
+        dialog.exec()
+
+    def _toggle_key_trace(self, checked):
+        self.key_trace_enabled = bool(checked)
+        if self.worker:
+            self.worker.trace.enabled = self.key_trace_enabled
+        self._save_specific_setting("key_trace_enabled", self.key_trace_enabled)
+        logging.info("[TRACE] Трассировка клавиш: %s", self.key_trace_enabled)
+
+    def _dump_key_trace(self):
+        """Сохраняет кольцевой буфер трассировки клавиш в файл."""
+        from PySide6.QtWidgets import QFileDialog
+
+        if not self.worker:
+            self.statusBar().showMessage("Слушатель ещё не запущен", 3000)
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Сохранить трассировку клавиш",
+            os.path.join(os.path.dirname(self.snippets_file), "key_trace.bin"),
+            "Трасса клавиш (*.bin)",
+        )
+        if not path:
+            return
+        try:
+            count = self.worker.trace.dump(path)
+        except OSError as e:
+            logging.exception("[TRACE] Ошибка сохранения трассы: %s", e)
+            self.statusBar().showMessage("Не удалось сохранить трассировку", 5000)
+            return
+        self.statusBar().showMessage(f"Трассировка сохранена: {count} записей", 4000)
+
+    def _toggle_profiling(self, checked):
+        if checked:
+            profile_dir = os.path.join(get_application_path(), PROFILE_DIRNAME)
+            self._watch_profiling_session(start_profiling(profile_dir))
+        elif self._profile_session is not None:
+            self._finish_profiling_session(self._profile_session)
+
+    def _watch_profiling_session(self, session):
+        """Отмечает сеанс в меню и забирает результат по его окончании."""
+        self._profile_session = session
+        self.profile_action.blockSignals(True)
+        self.profile_action.setChecked(True)
+        self.profile_action.blockSignals(False)
+        remaining = session.started_at + session.duration - time.time()
+        QTimer.singleShot(
+            max(0, int(remaining * 1000)) + 500,
+            partial(self._finish_profiling_session, session),
+        )
+
+    def _finish_profiling_session(self, session):
+        if session is not self._profile_session:
+            return
+        self._profile_session = None
+        stop_profiling()
+        self.profile_action.blockSignals(True)
+        self.profile_action.setChecked(False)
+        self.profile_action.blockSignals(False)
+        if session.result:
+            message = f"Профиль сохранён: {os.path.basename(session.result[0])}"
+        else:
+            message = "Не удалось сохранить профиль"
+        self.tray_icon.showMessage(
+            "Профилирование", message, QSystemTrayIcon.MessageIcon.Information, 3000
+        )
+
     def on_tray_icon_activated(self, reason):
         if reason == QSystemTrayIcon.ActivationReason.Trigger:
             self.show_hide_window()
@@ -64,16 +204,31 @@ class TrayMixin:
             self.hide()
             self.show_hide_action.setText("Показать менеджер")
         else:
+            self._ensure_ui()
             self.show()
             self.activateWindow()
             self.raise_()
             self.show_hide_action.setText("Скрыть менеджер")
 
+    def _update_detach_action(self):
+        if hasattr(self, "detach_action"):
+            self.detach_action.setVisible(self.listener_mode == LISTENER_MODE_PROCESS)
+
+    def _listener_unavailable(self, error):
+        """Сообщает о потере процесса слушателя и подключается заново."""
+        logging.warning("[IPC] %s", error)
+        self.statusBar().showMessage("Процесс слушателя недоступен, перезапуск...", 3000)
+        self._start_listener_thread()
+
     def toggle_listening(self):
         if not self.worker:
             self.statusBar().showMessage("Слушатель ещё не запущен", 3000)
             return
-        self.worker.toggle_pause()
+        try:
+            self.worker.toggle_pause()
+        except ListenerUnavailable as e:
+            self._listener_unavailable(e)
+            return
         status_text = "Возобновить" if self.worker.is_paused else "Приостановить"
         self.pause_resume_action.setText(status_text)
         message = (
@@ -87,17 +242,35 @@ class TrayMixin:
 
     def reload_listener_snippets(self):
         """Применяет изменения: сохраняет сниппеты в файл и перезагружает их в слушателе."""
-        # Сохраняем текущее состояние сниппетов в файл перед перезагрузкой
-        self._save_snippets_to_file()
+        # Сохраняем текущее состояние сниппетов в файл перед перезагрузкой.
+        # Пока окно не строилось, сниппеты в памяти не загружены и файл
+        # остаётся как есть.
+        if self._ui_built:
+            self._save_snippets_to_file()
 
         # Перезагружаем сниппеты в рабочем потоке слушателя
         if self.worker:
-            self.worker.reload_snippets()
+            try:
+                self.worker.reload_snippets()
+            except ListenerUnavailable as e:
+                # Новый процесс сам загрузит сохранённый файл.
+                self._listener_unavailable(e)
+
+    def quit_manager_only(self):
+        """Закрывает менеджер, оставляя слушатель в отдельном процессе."""
+        if isinstance(self.worker, ListenerClient):
+            self.worker.detach()
+            self.worker = None
+            logging.info("[IPC] Менеджер закрыт, слушатель продолжает работу")
+        self.quit_application()
 
     def quit_application(self):
         """Полностью завершает приложение."""
         self.is_closing = True
         self._save_settings()
         self._stop_listener_thread()
+        stop_profiling()
+        get_window_context().stop()
+        shutdown_logging()
         self.tray_icon.hide()
         self.close()
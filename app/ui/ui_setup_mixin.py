@@ -13,6 +13,7 @@ from PySide6.QtWidgets import (
     QLabel,
     QLineEdit,
     QMenu,
+    QMessageBox,
     QPushButton,
     QSplitter,
     QTabWidget,
@@ -21,13 +22,52 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
-from app.services.windows_api import get_active_window_class, get_active_window_title
-from app.ui.snippet_tree_widget import SnippetTreeWidget
+from app.core.snippet_codec import STORAGE_FORMAT_LABELS
+from app.core.window_filter import (
+    MATCH_CONTAINS,
+    MATCH_MODE_LABELS,
+    MATCH_MODES,
+    validate_window_filter,
+)
+from app.services.listener_process import LISTENER_MODE_LABELS
+from app.services.startup_timing import timeline
+from app.services.windows_api import (
+    get_active_process_name,
+    get_active_window_class,
+    get_active_window_title,
+)
 from app.version import __version__
 
 
 class UiSetupMixin:
+    def _ensure_ui(self, settings=None):
+        """Строит окно менеджера и дерево сниппетов при первом обращении."""
+        if self._ui_built:
+            return
+        self._ui_built = True
+        if settings is None:
+            settings = self._read_settings_file()
+        with timeline.phase("_ensure_ui"):
+            with timeline.phase("import editor"):
+                self._load_manager_mixins()
+            with timeline.phase("_create_widgets"):
+                self._create_widgets()
+                self._create_layout()
+                self._connect_signals()
+                self._apply_styles()
+                self._setup_status_bar(self.is_admin)
+            with timeline.phase("_load_snippets"):
+                self._load_snippets()
+            with timeline.phase("_apply_ui_settings"):
+                self._apply_ui_settings(settings)
+        if timeline.startup_reported:
+            # Окно строится позже запуска — по первому "Показать менеджер".
+            timeline.report("Построение окна менеджера")
+
     def _create_widgets(self):
+        # Дерево нужно только окну менеджера, которое строится по требованию.
+        from app.ui.snippet_tree_widget import SnippetTreeWidget
+
         self.tabs = QTabWidget()
         self.main_tab = QWidget()
         self.about_tab = QWidget()
@@ -56,6 +96,10 @@ class UiSetupMixin:
         self.abbreviation_input = QLineEdit()
         self.text_label = QLabel("Текст для вставки:")
         self.text_input = QTextEdit()
+        self.text_input.setToolTip(
+            "Плейсхолдеры: {date}, {date:%d.%m.%Y}, {time}, {time:%H:%M}, "
+            "{clipboard}, {cursor}, {snippet:.abbr}; {{date}} — буквально"
+        )
 
         # Группа фильтра окна для сниппета
         self.window_filter_group = QGroupBox("Фильтр по окну (опционально)")
@@ -65,10 +109,16 @@ class UiSetupMixin:
         self.window_class_label = QLabel("Класс окна:")
         self.window_class_input = QLineEdit()
         self.window_class_input.setPlaceholderText("Например: Notepad, XLMAIN")
+        self.window_process_label = QLabel("Процесс:")
+        self.window_process_input = QLineEdit()
+        self.window_process_input.setPlaceholderText("Например: winword.exe")
         self.match_mode_label = QLabel("Режим сопоставления:")
         self.match_mode_combo = QComboBox()
         self.match_mode_combo.addItems(
-            ["Содержит (contains)", "Точное совпадение (exact)"]
+            [MATCH_MODE_LABELS[mode] for mode in MATCH_MODES]
+        )
+        self.match_mode_combo.setToolTip(
+            "Регулярные выражения ищутся без учёта регистра"
         )
         self.capture_window_button = QPushButton("Захватить текущее окно")
         self.capture_window_button.setToolTip("Заполнит поля данными активного окна")
@@ -129,6 +179,8 @@ class UiSetupMixin:
         window_filter_layout.addWidget(self.window_title_input)
         window_filter_layout.addWidget(self.window_class_label)
         window_filter_layout.addWidget(self.window_class_input)
+        window_filter_layout.addWidget(self.window_process_label)
+        window_filter_layout.addWidget(self.window_process_input)
         window_filter_layout.addWidget(self.match_mode_label)
         window_filter_layout.addWidget(self.match_mode_combo)
         window_filter_layout.addWidget(self.capture_window_button)
@@ -172,6 +224,42 @@ class UiSetupMixin:
         autostart_layout.addWidget(self.start_minimized_check)
         layout.addWidget(autostart_group)
 
+        # Группа хранения библиотеки сниппетов
+        storage_group = QGroupBox("Хранение сниппетов")
+        storage_layout = QVBoxLayout(storage_group)
+        storage_layout.addWidget(QLabel("Формат файла сниппетов:"))
+        self.storage_format_combo = QComboBox()
+        for fmt, label in STORAGE_FORMAT_LABELS.items():
+            self.storage_format_combo.addItem(label, fmt)
+        self.storage_format_combo.setToolTip(
+            "Формат определяется автоматически при чтении, "
+            "поэтому его можно менять в любой момент"
+        )
+        self.export_snippets_button = QPushButton("Экспорт в читаемый JSON...")
+        storage_layout.addWidget(self.storage_format_combo)
+        storage_layout.addWidget(self.export_snippets_button)
+        self.import_snippets_button = QPushButton("Импорт сниппетов...")
+        self.import_snippets_button.setToolTip(
+            "CSV, JSON, библиотеки Text Expander, Beeftext, Espanso и "
+            "хотстроки AutoHotkey"
+        )
+        storage_layout.addWidget(self.import_snippets_button)
+        layout.addWidget(storage_group)
+
+        # Группа режима работы слушателя
+        listener_group = QGroupBox("Слушатель клавиатуры")
+        listener_layout = QVBoxLayout(listener_group)
+        listener_layout.addWidget(QLabel("Где работает перехват клавиш:"))
+        self.listener_mode_combo = QComboBox()
+        for mode, label in LISTENER_MODE_LABELS.items():
+            self.listener_mode_combo.addItem(label, mode)
+        self.listener_mode_combo.setToolTip(
+            "В отдельном процессе хук не ждёт интерфейс, а слушатель может "
+            "работать и после закрытия менеджера"
+        )
+        listener_layout.addWidget(self.listener_mode_combo)
+        layout.addWidget(listener_group)
+
         layout.addStretch()
         return tab
 
@@ -248,9 +336,16 @@ class UiSetupMixin:
         self.delete_button.clicked.connect(self._delete_item)
         self.save_button.clicked.connect(self._save_snippet)
         self.capture_window_button.clicked.connect(self._capture_current_window)
-        self.tray_icon.activated.connect(self.on_tray_icon_activated)
         self.autostart_check.stateChanged.connect(self.on_autostart_changed)
         self.start_minimized_check.stateChanged.connect(self.on_start_minimized_changed)
+        self.storage_format_combo.currentIndexChanged.connect(
+            self.on_storage_format_changed
+        )
+        self.export_snippets_button.clicked.connect(self._export_snippets_pretty)
+        self.import_snippets_button.clicked.connect(self._import_snippets)
+        self.listener_mode_combo.currentIndexChanged.connect(
+            self.on_listener_mode_changed
+        )
 
     def _show_tree_context_menu(self, position):
         item = self.snippet_tree_widget.itemAt(position)
@@ -290,8 +385,11 @@ class UiSetupMixin:
         current_filter = category_payload.get("window_filter", {})
         current_title = current_filter.get("title", "") if current_filter else ""
         current_class = current_filter.get("class", "") if current_filter else ""
+        current_process = current_filter.get("process", "") if current_filter else ""
         current_mode = (
-            current_filter.get("match_mode", "contains") if current_filter else "contains"
+            current_filter.get("match_mode", MATCH_CONTAINS)
+            if current_filter
+            else MATCH_CONTAINS
         )
 
         dialog = QDialog(self)
@@ -308,9 +406,15 @@ class UiSetupMixin:
         class_input.setPlaceholderText("Класс окна (например, Notepad)")
         layout.addRow("Класс окна:", class_input)
 
+        process_input = QLineEdit(current_process)
+        process_input.setPlaceholderText("Имя процесса (например, winword.exe)")
+        layout.addRow("Процесс:", process_input)
+
         mode_combo = QComboBox()
-        mode_combo.addItems(["Содержит (contains)", "Точное совпадение (exact)"])
-        mode_combo.setCurrentIndex(1 if current_mode == "exact" else 0)
+        mode_combo.addItems([MATCH_MODE_LABELS[mode] for mode in MATCH_MODES])
+        mode_combo.setCurrentIndex(
+            MATCH_MODES.index(current_mode) if current_mode in MATCH_MODES else 0
+        )
         layout.addRow("Режим:", mode_combo)
 
         # Кнопка захвата окна
@@ -324,10 +428,13 @@ class UiSetupMixin:
         def finish_capture():
             title = get_active_window_title()
             wclass = get_active_window_class()
+            process = get_active_process_name()
             if title:
                 title_input.setText(title)
             if wclass:
                 class_input.setText(wclass)
+            if process:
+                process_input.setText(process)
             capture_btn.setText("Захватить текущее окно (3 сек)")
             capture_btn.setEnabled(True)
             dialog.activateWindow()
@@ -347,24 +454,40 @@ class UiSetupMixin:
         def clear_filter():
             title_input.clear()
             class_input.clear()
+            process_input.clear()
             mode_combo.setCurrentIndex(0)
 
+        def collect_filter():
+            new_title = title_input.text().strip()
+            new_class = class_input.text().strip()
+            new_process = process_input.text().strip()
+            if not (new_title or new_class or new_process):
+                return None
+            new_filter = {
+                "title": new_title,
+                "class": new_class,
+                "match_mode": MATCH_MODES[mode_combo.currentIndex()],
+            }
+            if new_process:
+                new_filter["process"] = new_process
+            return new_filter
+
+        def accept_if_valid():
+            error = validate_window_filter(collect_filter())
+            if error:
+                QMessageBox.warning(dialog, "Некорректный фильтр", error)
+                return
+            dialog.accept()
+
         clear_btn.clicked.connect(clear_filter)
-        buttons.accepted.connect(dialog.accept)
+        buttons.accepted.connect(accept_if_valid)
         buttons.rejected.connect(dialog.reject)
         layout.addRow(buttons)
 
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            new_title = title_input.text().strip()
-            new_class = class_input.text().strip()
-            new_mode = "exact" if mode_combo.currentIndex() == 1 else "contains"
-
-            if new_title or new_class:
-                category_payload["window_filter"] = {
-                    "title": new_title,
-                    "class": new_class,
-                    "match_mode": new_mode,
-                }
+            new_filter = collect_filter()
+            if new_filter:
+                category_payload["window_filter"] = new_filter
             else:
                 # Удаляем фильтр если оба поля пустые
                 category_payload.pop("window_filter", None)
@@ -0,0 +1,126 @@
+"""
+Разбор и воспроизведение трассы клавиш, сохранённой из трея.
+
+    python -m app.utils.trace_replay key_trace.bin snippets.json [--keys]
+
+Для каждого срабатывания трасса сопоставляется с указанным файлом
+сниппетов: какой сниппет соответствует набранной последовательности и
+совпадает ли это с решением, принятым слушателем. В скрытой трассе
+(по умолчанию) нажатия не записаны — последовательность опознаётся по
+хэшу с солью трассы только среди аббревиатур файла, а у промахов хэша
+нет, и они не сверяются.
+"""
+
+import argparse
+import sys
+
+from app.core import key_trace as kt
+from app.core.snippet_codec import SnippetCodecError, load_snippet_document
+from app.core.snippet_store import flatten_snippet_store
+from app.core.snippet_stream import stream_flat_snippets
+from app.services import scan_code_keyboard as sc
+
+BUFFER_SIZE = 20
+
+
+def _expected_outcome(bucket):
+    if bucket is None:
+        return kt.OUTCOME_MISS, ""
+    if bucket.needs_window:
+        candidates = ", ".join(entry.abbr for entry in bucket)
+        return None, f"зависит от окна: {candidates}"
+    if bucket.fallback is None:
+        return kt.OUTCOME_FILTERED, ""
+    return kt.OUTCOME_MATCH, bucket.fallback.abbr
+
+
+def replay(trace_path, snippets_path, show_keys=False, out=sys.stdout):
+    header, records = kt.load_trace(trace_path)
+    # Файл разворачивается так же, как при загрузке в слушателе.
+    flat_snippets = stream_flat_snippets(snippets_path)
+    if flat_snippets is None:
+        flat_snippets = flatten_snippet_store(load_snippet_document(snippets_path))
+    index = sc.build_snippet_index(flat_snippets)
+    by_digest = {
+        kt.sequence_digest(seq_key, header["salt"]): bucket
+        for seq_key, bucket in index.by_scan.items()
+    }
+
+    out.write(
+        f"Трасса: {header['count']} записей, "
+        f"{'символы скрыты' if header['redacted'] else 'символы записаны'}\n"
+    )
+    buffer = []
+    mismatches = 0
+    triggers = 0
+    for record in records:
+        event = record.event
+        stamp = f"{record.t_us / 1_000_000:12.6f}"
+        if event == kt.EVENT_KEY:
+            key_class = record.key_class
+            if key_class == kt.CLASS_CHAR:
+                buffer.append(record.scan_code)
+                buffer = buffer[-BUFFER_SIZE:]
+            elif key_class == kt.CLASS_BACKSPACE:
+                if buffer:
+                    buffer.pop()
+            elif key_class in (kt.CLASS_SPACE, kt.CLASS_CONTROL, kt.CLASS_SPECIAL):
+                buffer = []
+            if show_keys:
+                code = "**" if header["redacted"] else f"{record.scan_code:02X}"
+                out.write(
+                    f"{stamp} key      {kt.CLASS_NAMES.get(key_class, '?'):9} "
+                    f"{code} буфер={record.buffer_len}\n"
+                )
+        elif event == kt.EVENT_TRIGGER:
+            triggers += 1
+            if header["redacted"] and record.outcome == kt.OUTCOME_MISS:
+                expected, detail = None, "последовательность не записана"
+            else:
+                expected, detail = _expected_outcome(by_digest.get(record.value))
+            recorded = kt.OUTCOME_NAMES.get(record.outcome, "?")
+            mark = " "
+            if expected is not None and expected != record.outcome:
+                mark = "!"
+                mismatches += 1
+            sequence = ""
+            if not header["redacted"] and len(buffer) == record.buffer_len:
+                sequence = f" ({sc.format_scancodes(buffer)})"
+            expected_name = kt.OUTCOME_NAMES[expected] if expected is not None else "?"
+            if detail:
+                expected_name = f"{expected_name} {detail}"
+            out.write(
+                f"{stamp}{mark}trigger  длина={record.buffer_len}{sequence} "
+                f"слушатель={recorded} файл={expected_name} "
+                f"[{record.duration_us} мкс]\n"
+            )
+        elif event == kt.EVENT_EXPANSION:
+            out.write(
+                f"{stamp} expand   длина={record.buffer_len} "
+                f"смещение={record.value} [{record.duration_us / 1000:.1f} мс]\n"
+            )
+        else:
+            out.write(f"{stamp} {kt.EVENT_NAMES.get(event, '?')} {record.value}\n")
+
+    out.write(f"Срабатываний: {triggers}, расхождений с файлом: {mismatches}\n")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Разбор трассы клавиш Text expander")
+    parser.add_argument("trace", help="файл трассы (key_trace.bin)")
+    parser.add_argument("snippets", help="файл сниппетов (snippets.json)")
+    parser.add_argument(
+        "--keys", action="store_true", help="показывать отдельные нажатия"
+    )
+    args = parser.parse_args(argv)
+    try:
+        mismatches = replay(args.trace, args.snippets, show_keys=args.keys)
+    except (kt.KeyTraceError, SnippetCodecError, OSError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
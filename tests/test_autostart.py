@@ -0,0 +1,98 @@
+import os
+import threading
+
+from app.services.autostart import (
+    LEGACY_TASK_NAME,
+    AutostartReconciler,
+    FakeShellBackend,
+    ShortcutSpec,
+)
+
+USER_STARTUP = os.path.join("user", "Startup")
+COMMON_STARTUP = os.path.join("common", "Startup")
+NAME = "Text expander.lnk"
+USER_LINK = os.path.join(USER_STARTUP, NAME)
+COMMON_LINK = os.path.join(COMMON_STARTUP, NAME)
+SPEC = ShortcutSpec(os.path.join("app", "te.exe"), "--tray", "app", "Text expander")
+
+
+def _reconciler(backend):
+    return AutostartReconciler(backend, [USER_STARTUP, COMMON_STARTUP, None], NAME)
+
+
+def test_matching_shortcut_is_left_alone():
+    backend = FakeShellBackend({COMMON_LINK: SPEC._replace(description="старый")})
+
+    result = _reconciler(backend).reconcile(True, SPEC)
+
+    assert result.ok and not result.changed
+    assert backend.operations == []
+
+
+def test_missing_shortcut_is_created_in_first_writable_folder():
+    backend = FakeShellBackend()
+    backend.unwritable.add(USER_STARTUP)
+
+    result = _reconciler(backend).reconcile(True, SPEC)
+
+    assert result.ok and result.changed
+    assert backend.shortcuts == {COMMON_LINK: SPEC}
+
+
+def test_outdated_shortcut_is_rewritten_in_place():
+    backend = FakeShellBackend({COMMON_LINK: SPEC._replace(target="old.exe")})
+
+    _reconciler(backend).reconcile(True, SPEC)
+
+    assert backend.operations == [("write", COMMON_LINK)]
+    assert backend.shortcuts[COMMON_LINK] == SPEC
+
+
+def test_no_writable_folder_is_reported():
+    backend = FakeShellBackend()
+    backend.unwritable.update((USER_STARTUP, COMMON_STARTUP))
+
+    result = _reconciler(backend).reconcile(True, SPEC)
+
+    assert not result.ok and not result.changed
+
+
+def test_disable_removes_every_shortcut_once():
+    backend = FakeShellBackend({USER_LINK: SPEC, COMMON_LINK: SPEC})
+    reconciler = _reconciler(backend)
+
+    first = reconciler.reconcile(False, SPEC)
+    second = reconciler.reconcile(False, SPEC)
+
+    assert first.ok and first.changed
+    assert second.ok and not second.changed
+    assert backend.shortcuts == {}
+
+
+def test_legacy_task_is_cleaned_up_on_request():
+    backend = FakeShellBackend(tasks={LEGACY_TASK_NAME})
+
+    result = _reconciler(backend).reconcile(True, SPEC, cleanup_legacy=True)
+
+    assert result.legacy_checked
+    assert backend.tasks == set()
+
+
+def test_request_applies_latest_state_in_background():
+    backend = FakeShellBackend()
+    reconciler = _reconciler(backend)
+    results = []
+    done = threading.Event()
+
+    def callback(result):
+        results.append(result)
+        if not result.enabled:
+            done.set()
+
+    reconciler.request(True, SPEC, callback)
+    reconciler.request(False, SPEC, callback)
+    assert done.wait(2.0)
+    reconciler.wait(2.0)
+
+    assert results[-1].enabled is False
+    assert backend.shortcuts == {}
@@ -0,0 +1,101 @@
+import threading
+
+from app.services.expansion_queue import ExpansionQueue
+
+
+def _run_queue(execute):
+    queue = ExpansionQueue(execute, delay=0.0)
+    queue.start()
+    return queue
+
+
+def test_every_expansion_runs_in_trigger_order():
+    done = []
+    finished = threading.Event()
+
+    def execute(expansion):
+        done.append(expansion.abbr)
+        if len(done) == 3:
+            finished.set()
+
+    queue = _run_queue(execute)
+    try:
+        for abbr in (".a", ".b", ".c"):
+            queue.submit(2, "text", abbr)
+        assert finished.wait(2.0)
+    finally:
+        queue.stop()
+    assert done == [".a", ".b", ".c"]
+    assert queue.stats()["processed"] == 3
+
+
+def test_typing_during_injection_updates_active_offset():
+    started = threading.Event()
+    resume = threading.Event()
+    offsets = []
+
+    def execute(expansion):
+        started.set()
+        resume.wait(2.0)
+        offsets.append(queue.commit_caret(expansion))
+        # После фиксации нажатия только считаются.
+        queue.note_typed(1)
+
+    queue = _run_queue(execute)
+    try:
+        queue.submit(3, "text", ".x")
+        assert started.wait(2.0)
+        queue.note_typed(1)
+        queue.note_typed(1)
+        resume.set()
+        queue.stop()
+        queue._thread.join(2.0)
+    finally:
+        resume.set()
+        queue.stop()
+    assert offsets == [2]
+    assert queue.interleaved == 1
+
+
+def test_backspace_into_abbreviation_cancels_active_expansion():
+    started = threading.Event()
+    resume = threading.Event()
+    offsets = []
+
+    def execute(expansion):
+        started.set()
+        resume.wait(2.0)
+        offsets.append(queue.commit_caret(expansion))
+
+    queue = _run_queue(execute)
+    try:
+        queue.submit(3, "text", ".x")
+        assert started.wait(2.0)
+        queue.note_typed(-1)
+        resume.set()
+        queue._thread.join(0.5)
+    finally:
+        resume.set()
+        queue.stop()
+    assert offsets == [None]
+    assert queue.cancelled == 1
+
+
+def test_pending_expansion_is_cancelled_by_backspace():
+    queue = ExpansionQueue(lambda expansion: None, delay=10.0)
+    expansion = queue.submit(3, "text", ".x")
+    queue.note_typed(1)
+    assert expansion.caret_offset == 1
+    queue.note_typed(-1)
+    queue.note_typed(-1)
+    assert queue.depth == 0
+    assert queue.cancelled == 1
+
+
+def test_cancel_pending_clears_queue():
+    queue = ExpansionQueue(lambda expansion: None, delay=10.0)
+    queue.submit(3, "a", ".a")
+    queue.submit(3, "b", ".b")
+    queue.cancel_pending("стрелка")
+    assert queue.depth == 0
+    assert queue.cancelled == 2
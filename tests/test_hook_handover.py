@@ -0,0 +1,39 @@
+from app.core.hook_handover import EventDeduplicator
+
+
+def test_second_copy_from_other_hook_is_dropped():
+    dedupe = EventDeduplicator(window=0.05)
+
+    assert not dedupe.is_duplicate(1, "a", 10.00)
+    assert dedupe.is_duplicate(2, "a", 10.01)
+    assert dedupe.dropped == 1
+
+
+def test_repeated_key_from_both_hooks_pairs_up():
+    dedupe = EventDeduplicator(window=0.05)
+    seen = [
+        dedupe.is_duplicate(1, "o", 10.00),
+        dedupe.is_duplicate(1, "o", 10.01),
+        dedupe.is_duplicate(2, "o", 10.02),
+        dedupe.is_duplicate(2, "o", 10.03),
+    ]
+
+    assert seen == [False, False, True, True]
+
+
+def test_same_hook_and_stale_events_are_kept():
+    dedupe = EventDeduplicator(window=0.05)
+
+    assert not dedupe.is_duplicate(1, "a", 10.00)
+    assert not dedupe.is_duplicate(1, "a", 10.01)
+    assert not dedupe.is_duplicate(2, "b", 10.02)
+    # Копия старше окна не склеивается.
+    assert not dedupe.is_duplicate(2, "a", 10.20)
+
+
+def test_reset_forgets_pending_events():
+    dedupe = EventDeduplicator(window=0.05)
+    dedupe.is_duplicate(1, "a", 10.00)
+    dedupe.reset()
+
+    assert not dedupe.is_duplicate(2, "a", 10.01)
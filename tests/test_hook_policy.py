@@ -0,0 +1,48 @@
+import json
+
+from app.services.hook_policy import HookRefreshPolicy
+
+
+def test_records_are_written_only_on_flush(tmp_path):
+    path = tmp_path / "hook_policy.json"
+    policy = HookRefreshPolicy(str(path))
+
+    policy.record_healthy("winword.exe")
+    policy.record_steal("game.exe")
+    assert policy.dirty
+    assert not path.exists()
+
+    policy.flush()
+    assert not policy.dirty
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["processes"]["game.exe"]["steals"] == 1
+    assert data["processes"]["winword.exe"]["healthy"] == 1
+
+
+def test_flush_without_changes_does_not_write(tmp_path):
+    path = tmp_path / "hook_policy.json"
+    policy = HookRefreshPolicy(str(path))
+
+    policy.flush()
+    assert not path.exists()
+
+
+def test_flushed_table_is_loaded_by_next_session(tmp_path):
+    path = tmp_path / "hook_policy.json"
+    policy = HookRefreshPolicy(str(path))
+    policy.record_steal("game.exe")
+    policy.record_healthy("game.exe")
+    policy.flush()
+
+    restored = HookRefreshPolicy(str(path))
+    assert restored.needs_refresh("game.exe")
+    assert not restored.needs_refresh("winword.exe")
+    assert not restored.dirty
+
+
+def test_failed_write_keeps_table_dirty(tmp_path):
+    policy = HookRefreshPolicy(str(tmp_path / "missing" / "hook_policy.json"))
+    policy.record_steal("game.exe")
+
+    policy.flush()
+    assert policy.dirty
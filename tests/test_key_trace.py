@@ -0,0 +1,112 @@
+import io
+import json
+import threading
+
+from app.core import key_trace as kt
+from app.services import scan_code_keyboard as sc
+from app.utils.trace_replay import replay
+
+ABBR_SCANS = (52, 35, 23)  # ".hi"
+WORD_SCANS = (20, 35, 23)  # произвольное слово
+
+
+def _recorder(redact=True):
+    recorder = kt.KeyTraceRecorder(capacity=16, redact=redact)
+    recorder.enabled = True
+    return recorder
+
+
+def _type(recorder, scans, outcome):
+    for i, scan_code in enumerate(scans):
+        recorder.record(kt.EVENT_KEY, scan_code, kt.CLASS_CHAR, i)
+    recorder.record(
+        kt.EVENT_TRIGGER,
+        buffer_len=len(scans),
+        outcome=outcome,
+        value=recorder.digest(scans),
+    )
+    recorder.record(kt.EVENT_KEY, sc.SC_SPACE, kt.CLASS_SPACE, len(scans))
+
+
+def test_redacted_trace_keeps_no_scan_codes_or_miss_digests(tmp_path):
+    recorder = _recorder()
+    _type(recorder, WORD_SCANS, kt.OUTCOME_MISS)
+    recorder.record(kt.EVENT_KEY, 0x1D, kt.CLASS_CONTROL, 0)
+    path = tmp_path / "trace.bin"
+    recorder.dump(str(path))
+
+    header, records = kt.load_trace(str(path))
+    assert header["redacted"]
+    assert all(record.scan_code == 0 for record in records)
+    trigger = [r for r in records if r.event == kt.EVENT_TRIGGER][0]
+    assert trigger.value == 0
+    assert trigger.outcome == kt.OUTCOME_MISS
+
+
+def test_redacted_trace_keeps_digest_of_matched_abbreviation(tmp_path):
+    recorder = _recorder()
+    _type(recorder, ABBR_SCANS, kt.OUTCOME_MATCH)
+    path = tmp_path / "trace.bin"
+    recorder.dump(str(path))
+
+    header, records = kt.load_trace(str(path))
+    trigger = [r for r in records if r.event == kt.EVENT_TRIGGER][0]
+    assert trigger.value == kt.sequence_digest(ABBR_SCANS, header["salt"])
+
+
+def test_unredacted_trace_keeps_scan_codes(tmp_path):
+    recorder = _recorder(redact=False)
+    _type(recorder, WORD_SCANS, kt.OUTCOME_MISS)
+    path = tmp_path / "trace.bin"
+    recorder.dump(str(path))
+
+    _, records = kt.load_trace(str(path))
+    keys = [r.scan_code for r in records if r.key_class == kt.CLASS_CHAR]
+    assert tuple(keys) == WORD_SCANS
+
+
+def test_ring_buffer_keeps_latest_records():
+    recorder = _recorder()
+    for i in range(20):
+        recorder.record(kt.EVENT_HOOK_START, value=i)
+
+    values = [fields[1] for fields in kt.RECORD.iter_unpack(recorder.snapshot())]
+    assert values == list(range(4, 20))
+
+
+def test_replay_matches_abbreviations_and_skips_misses(tmp_path):
+    snippets = tmp_path / "snippets.json"
+    snippets.write_text(json.dumps({".hi": "Hello"}), encoding="utf-8")
+    recorder = _recorder()
+    _type(recorder, ABBR_SCANS, kt.OUTCOME_MATCH)
+    _type(recorder, WORD_SCANS, kt.OUTCOME_MISS)
+    trace = tmp_path / "trace.bin"
+    recorder.dump(str(trace))
+
+    out = io.StringIO()
+    mismatches = replay(str(trace), str(snippets), show_keys=True, out=out)
+
+    assert mismatches == 0
+    report = out.getvalue()
+    assert "файл=match .hi" in report
+    assert "последовательность не записана" in report
+
+
+def test_concurrent_records_never_share_a_slot():
+    recorder = kt.KeyTraceRecorder(capacity=4000)
+    recorder.enabled = True
+
+    def write(source):
+        for i in range(1000):
+            recorder.record(kt.EVENT_HOOK_START, value=source * 10000 + i)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    values = [fields[1] for fields in kt.RECORD.iter_unpack(recorder.snapshot())]
+    assert len(recorder) == 4000
+    expected = [n * 10000 + i for n in range(4) for i in range(1000)]
+    assert sorted(values) == expected
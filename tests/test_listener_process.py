@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+from multiprocessing import connection
+
+import pytest
+
+from app.services import listener_process as lp
+
+
+class _FakeTrace:
+    enabled = False
+
+    def dump(self, path):
+        return 0
+
+
+class _FakeIndex:
+    by_abbr = {".a": None}
+
+
+class _FakeWorker:
+    def __init__(self):
+        self.snippet_index = _FakeIndex()
+        self.is_paused = False
+        self.trace = _FakeTrace()
+        self.reloads = 0
+        self.stopped = False
+
+    def reload_snippets(self):
+        self.reloads += 1
+
+    def toggle_pause(self):
+        self.is_paused = not self.is_paused
+
+    def stats(self):
+        return {"keys": 3}
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_pipe_listener_builds_named_pipe_listener(monkeypatch):
+    created = []
+
+    class FakeListener:
+        def __init__(self, address, family=None, authkey=None):
+            created.append((address, family, authkey))
+
+    monkeypatch.setattr(connection, "Listener", FakeListener)
+    listener = lp._pipe_listener(r"\\.\pipe\test", b"key")
+    assert isinstance(listener, FakeListener)
+    assert created == [(r"\\.\pipe\test", "AF_PIPE", b"key")]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="проверка через AF_UNIX")
+def test_server_and_client_round_trip(monkeypatch, tmp_path):
+    address = str(tmp_path / "pipe")
+    monkeypatch.setattr(lp, "get_application_path", lambda: str(tmp_path))
+    monkeypatch.setattr(
+        lp,
+        "_pipe_listener",
+        lambda _, authkey: connection.Listener(address, "AF_UNIX", authkey=authkey),
+    )
+    monkeypatch.setattr(
+        lp,
+        "_pipe_client",
+        lambda _, authkey: connection.Client(address, "AF_UNIX", authkey=authkey),
+    )
+    worker = _FakeWorker()
+    server = lp.ListenerServer(worker, address, lp._write_authkey())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = lp.ListenerClient.connect(1.0)
+    try:
+        assert client.reload_snippets() == 1
+        assert worker.reloads == 1
+        client.toggle_pause()
+        assert client.is_paused and worker.is_paused
+        assert client.stats() == {"keys": 3}
+        with pytest.raises(RuntimeError):
+            client.call("unknown")
+    finally:
+        client.stop()
+    thread.join(3.0)
+    assert not thread.is_alive()
+    assert worker.stopped
+    assert os.path.exists(tmp_path / lp.PIPE_KEY_FILENAME)
@@ -0,0 +1,102 @@
+from app.services.windows_api import ProcessNameCache
+
+
+class _FakeProcess:
+    def __init__(self, registry, pid):
+        self._registry = registry
+        self._pid = pid
+
+    def create_time(self):
+        return self._registry.processes[self._pid][1]
+
+    def name(self):
+        return self._registry.processes[self._pid][0]
+
+
+class _Registry:
+    def __init__(self):
+        self.processes = {}
+        self.opened = 0
+
+    def __call__(self, pid):
+        self.opened += 1
+        if pid not in self.processes:
+            raise LookupError(pid)
+        return _FakeProcess(self, pid)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(registry, clock, interval=30.0):
+    return ProcessNameCache(
+        process_factory=registry, revalidate_interval=interval, clock=clock
+    )
+
+
+def test_hit_for_same_window_does_not_open_process():
+    registry, clock = _Registry(), _Clock()
+    registry.processes[10] = ("WINWORD.EXE", 1.0)
+    cache = _cache(registry, clock)
+
+    assert cache.lookup(10, hwnd=100) == "winword.exe"
+    for _ in range(50):
+        assert cache.lookup(10, hwnd=100) == "winword.exe"
+
+    assert registry.opened == 1
+    assert cache.stats()["hits"] == 50
+
+
+def test_window_change_revalidates_and_detects_reused_pid():
+    registry, clock = _Registry(), _Clock()
+    registry.processes[10] = ("winword.exe", 1.0)
+    cache = _cache(registry, clock)
+    cache.lookup(10, hwnd=100)
+
+    registry.processes[10] = ("notepad.exe", 2.0)
+    assert cache.lookup(10, hwnd=100) == "winword.exe"
+    assert cache.lookup(10, hwnd=200) == "notepad.exe"
+    assert cache.stats()["stale"] == 1
+    assert registry.opened == 2
+
+
+def test_revalidates_after_interval():
+    registry, clock = _Registry(), _Clock()
+    registry.processes[10] = ("winword.exe", 1.0)
+    cache = _cache(registry, clock, interval=5.0)
+    cache.lookup(10, hwnd=100)
+
+    clock.now = 4.0
+    cache.lookup(10, hwnd=100)
+    assert registry.opened == 1
+
+    clock.now = 6.0
+    assert cache.lookup(10, hwnd=100) == "winword.exe"
+    assert registry.opened == 2
+    assert cache.stats()["revalidations"] == 2
+
+
+def test_lookup_without_window_always_revalidates():
+    registry, clock = _Registry(), _Clock()
+    registry.processes[10] = ("winword.exe", 1.0)
+    cache = _cache(registry, clock)
+
+    cache.lookup(10)
+    cache.lookup(10)
+    assert registry.opened == 2
+
+
+def test_vanished_process_is_forgotten():
+    registry, clock = _Registry(), _Clock()
+    registry.processes[10] = ("winword.exe", 1.0)
+    cache = _cache(registry, clock)
+    cache.lookup(10, hwnd=100)
+
+    del registry.processes[10]
+    assert cache.lookup(10, hwnd=200) is None
+    assert cache.stats()["size"] == 0
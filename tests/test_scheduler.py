@@ -0,0 +1,97 @@
+import threading
+
+from app.core.scheduler import KIND_DEADLINE, KIND_EVENT, DeadlineScheduler
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_events_come_before_deadlines_in_post_order():
+    clock = _Clock()
+    scheduler = DeadlineScheduler(clock)
+    scheduler.schedule("late", 0.0)
+    scheduler.post("first", 1)
+    scheduler.post("second", 2)
+
+    assert scheduler.poll() == (KIND_EVENT, "first", 1)
+    assert scheduler.poll() == (KIND_EVENT, "second", 2)
+    assert scheduler.poll() == (KIND_DEADLINE, "late", None)
+    assert scheduler.poll() is None
+
+
+def test_deadlines_fire_in_time_order():
+    clock = _Clock()
+    scheduler = DeadlineScheduler(clock)
+    scheduler.schedule("b", 2.0, "B")
+    scheduler.schedule("a", 1.0, "A")
+
+    assert scheduler.poll() is None
+    assert scheduler.next_deadline() == 101.0
+    clock.now = 102.0
+    assert scheduler.poll() == (KIND_DEADLINE, "a", "A")
+    assert scheduler.poll() == (KIND_DEADLINE, "b", "B")
+    assert not scheduler.is_scheduled("a")
+
+
+def test_reschedule_replaces_and_cancel_removes():
+    clock = _Clock()
+    scheduler = DeadlineScheduler(clock)
+    scheduler.schedule("refresh", 1.0, "old")
+    scheduler.schedule("refresh", 5.0, "new")
+    scheduler.schedule("probe", 1.0)
+    scheduler.cancel("probe")
+
+    clock.now = 102.0
+    assert scheduler.poll() is None
+    assert scheduler.next_deadline() == 105.0
+    clock.now = 105.0
+    assert scheduler.poll() == (KIND_DEADLINE, "refresh", "new")
+
+
+def test_clear_deadlines_keeps_events():
+    scheduler = DeadlineScheduler(_Clock())
+    scheduler.schedule("a", 0.0)
+    scheduler.post("event")
+    scheduler.clear_deadlines()
+
+    assert scheduler.poll() == (KIND_EVENT, "event", None)
+    assert scheduler.poll() is None
+    assert scheduler.next_deadline() is None
+
+
+def test_wait_next_wakes_on_post_and_stop():
+    scheduler = DeadlineScheduler()
+    results = []
+
+    def consume():
+        while True:
+            item = scheduler.wait_next()
+            results.append(item)
+            if item is None:
+                return
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    scheduler.post("foreground", "window")
+    scheduler.schedule("soon", 0.01)
+    # Дедлайн должен сработать до остановки.
+    for _ in range(200):
+        if len(results) >= 2:
+            break
+        thread.join(0.01)
+    scheduler.stop()
+    thread.join(2.0)
+
+    assert not thread.is_alive()
+    assert results == [
+        (KIND_EVENT, "foreground", "window"),
+        (KIND_DEADLINE, "soon", None),
+        None,
+    ]
+    assert scheduler.stopped
+    assert scheduler.poll() is None
@@ -0,0 +1,99 @@
+import pytest
+
+from app.core import snippet_codec as codec
+from app.core.snippet_store import wrap_snippet_store
+
+DOCUMENT = wrap_snippet_store(
+    {
+        "Общее": {
+            "enabled": True,
+            "snippets": {
+                ".a": {"text": "Привет", "enabled": True},
+                ".b": {
+                    "text": "{date}",
+                    "enabled": False,
+                    "window_filter": {"process": "winword.exe"},
+                },
+            },
+            "categories": {
+                "Вложенная": {
+                    "enabled": False,
+                    "snippets": {".c": {"text": "C", "enabled": True}},
+                    "categories": {},
+                    "window_filter": {"title": "Почта", "mode": "contains"},
+                }
+            },
+        }
+    }
+)
+
+
+@pytest.mark.parametrize("fmt", list(codec.STORAGE_FORMAT_LABELS))
+def test_formats_round_trip(fmt, tmp_path):
+    path = tmp_path / "snippets.json"
+    codec.save_snippet_document(str(path), DOCUMENT, fmt)
+
+    assert codec.load_snippet_document(str(path)) == DOCUMENT
+
+
+def test_formats_are_detected_by_magic():
+    assert codec.detect_format(codec.encode_document(DOCUMENT)) == codec.FORMAT_JSON
+    gzipped = codec.encode_document(DOCUMENT, codec.FORMAT_JSON_GZIP)
+    assert codec.detect_format(gzipped) == codec.FORMAT_JSON_GZIP
+    binary = codec.encode_document(DOCUMENT, codec.FORMAT_BINARY)
+    assert codec.detect_format(binary) == codec.FORMAT_BINARY
+
+
+def test_gzip_output_is_deterministic():
+    first = codec.encode_document(DOCUMENT, codec.FORMAT_JSON_GZIP)
+    assert codec.encode_document(DOCUMENT, codec.FORMAT_JSON_GZIP) == first
+
+
+def test_binary_requires_current_schema():
+    with pytest.raises(codec.SnippetCodecError):
+        codec.encode_binary({".a": "A"})
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(codec.SnippetCodecError):
+        codec.encode_document(DOCUMENT, "yaml")
+
+
+def test_binary_records_stream_in_order():
+    records = list(codec.iter_binary_records(codec.encode_binary(DOCUMENT)))
+    kinds = [record[0] for record in records]
+    assert kinds == [
+        "category",
+        "snippet",
+        "snippet",
+        "category",
+        "snippet",
+        "end",
+        "end",
+    ]
+    assert records[2] == ("snippet", ".b", "{date}", False, {"process": "winword.exe"})
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        # Обрезанный файл.
+        codec.encode_binary(DOCUMENT)[:-5],
+        # Неизвестная версия формата.
+        codec.BINARY_MAGIC + b"\x09\x02\x00Z",
+        # Неизвестная запись.
+        codec.BINARY_MAGIC + b"\x01\x02\x00Q",
+        # Сниппет вне категории.
+        codec.BINARY_MAGIC + b"\x01\x02\x00S",
+        # Незакрытая категория.
+        codec.BINARY_MAGIC + b"\x01\x02\x00C\x00\x00\x00\x00\x01\x00\x00\x00\x00Z",
+        # Фильтр окна — не JSON.
+        codec.BINARY_MAGIC
+        + b"\x01\x02\x00C\x01\x00\x00\x00A\x01\x03\x00\x00\x00{x}EZ",
+        # Повреждённый gzip.
+        codec.GZIP_MAGIC + b"\x00\x00",
+    ],
+)
+def test_corrupt_data_raises_codec_error(data):
+    with pytest.raises(codec.SnippetCodecError):
+        codec.decode_document(data)
@@ -0,0 +1,142 @@
+import csv
+import json
+
+import pytest
+
+from app.core import snippet_import as si
+from app.services.scan_code_keyboard import build_scan_sequences
+
+
+def _write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def _records(path):
+    return [(record.abbr, record.text) for record in si.read_import_file(path)]
+
+
+def test_detects_formats(tmp_path):
+    cases = {
+        "a.csv": ("abbr,text\n.a,A\n", si.IMPORT_CSV),
+        "a.ahk": ("::btw::by the way\n", si.IMPORT_AHK),
+        "a.yaml": ("matches: []\n", si.IMPORT_ESPANSO),
+        "map.json": ('{".a": "A"}', si.IMPORT_JSON_MAP),
+        "beef.json": ('{"fileFormatVersion": 7, "combos": []}', si.IMPORT_BEEFTEXT),
+        "own.json": (
+            '{"schema_version": 2, "categories": {}}',
+            si.IMPORT_TEXT_EXPANDER,
+        ),
+        "legacy.json": (
+            '{"Cat": {"enabled": true, "snippets": {}}}',
+            si.IMPORT_TEXT_EXPANDER,
+        ),
+    }
+    for name, (content, fmt) in cases.items():
+        assert si.detect_import_format(_write(tmp_path, name, content)) == fmt, name
+
+
+def test_reads_csv_with_header_and_quotes(tmp_path):
+    path = _write(tmp_path, "a.csv", 'abbr,text\n.hi,"Hello, world"\n.bye,Bye\n')
+    assert _records(path) == [(".hi", "Hello, world"), (".bye", "Bye")]
+
+
+def test_reads_ahk_hotstrings_and_continuation(tmp_path):
+    path = _write(
+        tmp_path,
+        "a.ahk",
+        "; comment\n::btw::by the way ; note\n:*:.sig::\n(\nBest,\nMe\n)\n"
+        "::act::\nMsgBox hi\nreturn\n:c:.tab::a`tb\n",
+    )
+    assert _records(path) == [
+        ("btw", "by the way"),
+        (".sig", "Best,\nMe"),
+        (".tab", "a\tb"),
+    ]
+
+
+def test_reads_beeftext_enabled_combos(tmp_path):
+    document = {
+        "fileFormatVersion": 7,
+        "groups": [{"name": "g"}],
+        "combos": [
+            {"keyword": ".bf", "snippet": "Beef", "enabled": True},
+            {"keyword": ".off", "snippet": "no", "enabled": False},
+        ],
+    }
+    path = _write(tmp_path, "beef.json", json.dumps(document))
+    assert _records(path) == [(".bf", "Beef")]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '{".a": "A", ".b": }',
+        '{".a": "unterminated',
+        '{"fileFormatVersion": 7, "combos": [{"keyword": ".a",]}',
+        '{"Cat": {"enabled": tru}}',
+        "[1, 2]",
+        "",
+    ],
+)
+def test_malformed_json_raises_import_error(tmp_path, content):
+    path = _write(tmp_path, "bad.json", content)
+    with pytest.raises(si.SnippetImportError):
+        fmt = si.detect_import_format(path)
+        list(si.read_import_file(path, fmt))
+
+
+def test_malformed_records_raise_import_error_for_forced_format(tmp_path):
+    path = _write(tmp_path, "bad.json", '{"combos": [{"keyword": ')
+    with pytest.raises(si.SnippetImportError):
+        list(si.read_import_file(path, si.IMPORT_BEEFTEXT))
+
+
+def test_plan_reports_rejections_and_collisions(tmp_path):
+    path = tmp_path / "a.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for row in (
+            (".hi", "Hello"),
+            (".bye", "Bye"),
+            (".hi", "Hello again"),
+            (".x y", "bad"),
+            ("", "empty"),
+            ("ку", "collides with re"),
+        ):
+            writer.writerow(row)
+    plan = si.plan_import(
+        si.read_import_file(str(path)), [".bye", "re"], build_scan_sequences
+    )
+    assert plan.total == 6
+    assert plan.duplicates == 1
+    assert set(plan.added) == {".hi"} and plan.added[".hi"].text == "Hello again"
+    assert set(plan.existing) == {".bye"}
+    assert [abbr for _, abbr, _ in plan.unsupported] == [".x y"]
+    assert [abbr for _, abbr, _ in plan.collisions] == ["ку"]
+    assert len(plan.empty) == 1
+
+
+def test_apply_import_adds_and_replaces_in_one_pass():
+    categories = {
+        "Общее": {
+            "enabled": True,
+            "snippets": {".bye": {"text": "old", "enabled": False}},
+            "categories": {},
+        }
+    }
+    plan = si.plan_import(
+        [
+            si.ImportRecord(".hi", "Hi", None, 1),
+            si.ImportRecord(".bye", "Bye", None, 2),
+        ],
+        si.iter_library_abbrs(categories),
+        build_scan_sequences,
+    )
+    assert si.apply_import(categories, ("Импорт",), plan, replace_existing=True) == (
+        1,
+        1,
+    )
+    assert categories["Общее"]["snippets"][".bye"] == {"text": "Bye", "enabled": False}
+    assert categories["Импорт"]["snippets"][".hi"] == {"text": "Hi", "enabled": True}
@@ -0,0 +1,74 @@
+from app.services.scan_code_keyboard import (
+    build_scan_sequences,
+    build_snippet_index,
+    supports_abbreviation,
+)
+from app.services.window_context import WindowSnapshot
+
+
+def _seq(abbr):
+    return tuple(build_scan_sequences(abbr)[0][0])
+
+
+def _index(snippets):
+    return build_snippet_index(
+        {abbr: {"text": text, "filter": None} for abbr, text in snippets.items()}
+    )
+
+
+def _window(process_name="notepad.exe", title="Документ"):
+    return WindowSnapshot(1, 100, title, "Edit", process_name)
+
+
+def test_prefix_range_finds_all_sequences_with_prefix():
+    index = _index({".addr": "A", ".adr": "B", ".x": "X", "zz": "Z"})
+    lo, hi = index.prefix_range(_seq(".ad"))
+    found = set(index.sorted_scans[lo:hi])
+    assert _seq(".addr") in found and _seq(".adr") in found
+    assert _seq(".x") not in found
+
+
+def test_prefix_range_narrows_incrementally():
+    index = _index({".addr": "A", ".adr": "B", ".x": "X"})
+    prefix = _seq(".addr")
+    lo, hi = index.prefix_range(prefix[:1])
+    for size in range(2, len(prefix) + 1):
+        narrowed = index.prefix_range(prefix[:size], lo, hi)
+        assert narrowed == index.prefix_range(prefix[:size])
+        lo, hi = narrowed
+    assert index.sorted_scans[lo:hi] == (prefix,)
+
+
+def test_prefix_range_empty_for_unknown_prefix():
+    index = _index({".a": "A"})
+    lo, hi = index.prefix_range((0xFE,))
+    assert lo == hi
+
+
+def test_lookup_applies_window_filter():
+    index = build_snippet_index(
+        {
+            ".sig": {"text": "Word", "filter": {"process": "winword.exe"}},
+            ".all": {"text": "Везде", "filter": None},
+        }
+    )
+    word = _window("winword.exe")
+    other = _window("notepad.exe")
+    assert index.lookup(_seq(".sig"), word).abbr == ".sig"
+    assert index.lookup(_seq(".sig"), other) is None
+    assert index.text_of(index.lookup(_seq(".all"), other)) == "Везде"
+
+
+def test_expansion_of_returns_template_for_placeholders():
+    index = _index({".d": "Дата {date}", ".t": "Просто текст"})
+    window = _window()
+    assert index.expansion_of(index.lookup(_seq(".t"), window)) == "Просто текст"
+    template = index.expansion_of(index.lookup(_seq(".d"), window))
+    assert template.rendered is None
+
+
+def test_unsupported_abbreviations_are_skipped():
+    assert supports_abbreviation(".addr")
+    assert not supports_abbreviation(".☺")
+    index = _index({".ok": "A", ".☺": "B"})
+    assert set(index.by_abbr) == {".ok"}
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from app.core.snippet_store import (
+    flatten_snippet_store,
+    is_current_schema,
+    normalize_snippet_store,
+    wrap_snippet_store,
+)
+from app.core.snippet_stream import stream_flat_snippets
+
+
+def _category(snippets, categories=None, **extra):
+    payload = {"enabled": True, "snippets": snippets, "categories": categories or {}}
+    payload.update(extra)
+    return payload
+
+
+VALID = wrap_snippet_store(
+    {
+        "Общее": _category(
+            {".a": {"text": "A", "enabled": True}},
+            {
+                "Вложенная": _category(
+                    {".b": {"text": "B", "enabled": False}},
+                    window_filter={"process": "winword.exe"},
+                )
+            },
+        )
+    }
+)
+
+MALFORMED = [
+    # Нет блока snippets у категории.
+    wrap_snippet_store({"Общее": {"enabled": True, "categories": {}}}),
+    # У сниппета нет enabled.
+    wrap_snippet_store({"Общее": _category({".a": {"text": "A"}})}),
+    # Текст не строка.
+    wrap_snippet_store({"Общее": _category({".a": {"text": 5, "enabled": True}})}),
+    # Сниппет — строка, а не объект.
+    wrap_snippet_store({"Общее": _category({".a": "A"})}),
+    # Категория — не объект.
+    wrap_snippet_store({"Общее": "A"}),
+]
+
+
+def test_valid_document_takes_fast_path():
+    assert is_current_schema(VALID)
+    categories, needs_resave = normalize_snippet_store(VALID)
+    assert categories is VALID["categories"] and not needs_resave
+    assert flatten_snippet_store(VALID) == {".a": {"text": "A", "filter": None}}
+
+
+@pytest.mark.parametrize("document", MALFORMED)
+def test_malformed_current_schema_is_migrated(document):
+    assert not is_current_schema(document)
+    categories, needs_resave = normalize_snippet_store(document)
+    assert needs_resave
+    assert set(categories) == {"Общее"}
+    migrated = wrap_snippet_store(categories)
+    assert is_current_schema(migrated)
+    # Разворачивание не падает ни для исходного, ни для мигрированного файла.
+    flatten_snippet_store(document)
+    assert flatten_snippet_store(migrated) == flatten_snippet_store(document)
+
+
+@pytest.mark.parametrize("document", MALFORMED)
+def test_stream_agrees_with_migration_for_malformed_current_schema(
+    document, tmp_path
+):
+    path = tmp_path / "snippets.json"
+    path.write_text(json.dumps(document), encoding="utf-8")
+    # None — поток уступает полному разбору; иначе результат тот же.
+    streamed = stream_flat_snippets(str(path))
+    assert streamed is None or streamed == flatten_snippet_store(document)
+
+
+def test_stream_falls_back_when_snippet_is_not_an_object(tmp_path):
+    path = tmp_path / "snippets.json"
+    path.write_text(json.dumps(MALFORMED[3]), encoding="utf-8")
+    assert stream_flat_snippets(str(path)) is None
+
+
+def test_stream_matches_flatten_for_valid_document(tmp_path):
+    path = tmp_path / "snippets.json"
+    path.write_text(json.dumps(VALID), encoding="utf-8")
+    assert stream_flat_snippets(str(path)) == flatten_snippet_store(VALID)
+
+
+def test_legacy_flat_document_is_migrated():
+    categories, needs_resave = normalize_snippet_store({".a": "A", ".b": "B"})
+    assert needs_resave
+    (payload,) = categories.values()
+    assert payload["snippets"][".b"] == {"text": "B", "enabled": True}
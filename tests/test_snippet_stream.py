@@ -0,0 +1,146 @@
+import io
+import json
+
+import pytest
+
+from app.core import snippet_codec as codec
+from app.core.snippet_store import flatten_snippet_store, wrap_snippet_store
+from app.core.snippet_stream import (
+    build_value,
+    JsonEventReader,
+    stream_flat_snippets,
+)
+
+DOCUMENT = wrap_snippet_store(
+    {
+        "Работа": {
+            "enabled": True,
+            "snippets": {
+                ".a": {"text": 'Кавычки " и \\ и ☺', "enabled": True},
+                ".off": {"text": "нет", "enabled": False},
+                ".own": {
+                    "text": "свой",
+                    "enabled": True,
+                    "window_filter": {"process": "outlook.exe"},
+                },
+            },
+            "categories": {
+                "Word": {
+                    "enabled": True,
+                    "snippets": {".w": {"text": "W" * 200, "enabled": True}},
+                    "categories": {},
+                }
+            },
+            # Фильтр категории записан после сниппетов.
+            "window_filter": {"process": "winword.exe"},
+        }
+    }
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 4096])
+def test_event_reader_rebuilds_json_for_any_chunk_size(chunk_size):
+    value = {"s": "a\"b\\né", "n": [-1, 2.5, 3e2], "b": [True, False, None]}
+    events = JsonEventReader(io.StringIO(json.dumps(value)), chunk_size).events()
+
+    assert build_value(events, next(events)) == value
+
+
+@pytest.mark.parametrize("fmt", list(codec.STORAGE_FORMAT_LABELS))
+def test_stream_matches_flatten_in_every_format(fmt, tmp_path):
+    path = tmp_path / "snippets.json"
+    codec.save_snippet_document(str(path), DOCUMENT, fmt)
+
+    flat = stream_flat_snippets(str(path))
+
+    assert flat == flatten_snippet_store(DOCUMENT)
+    assert flat[".w"]["filter"] == {"process": "winword.exe"}
+    assert flat[".own"]["filter"] == {"process": "outlook.exe"}
+    assert ".off" not in flat
+
+
+def test_store_text_receives_each_enabled_text(tmp_path):
+    path = tmp_path / "snippets.json"
+    codec.save_snippet_document(str(path), DOCUMENT)
+    stored = []
+
+    def store_text(text):
+        stored.append(text)
+        return len(stored) - 1
+
+    flat = stream_flat_snippets(str(path), store_text=store_text)
+
+    assert sorted(stored[entry["text"]] for entry in flat.values()) == sorted(
+        entry["text"] for entry in flatten_snippet_store(DOCUMENT).values()
+    )
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        {".a": "A"},
+        {"categories": {}, "schema_version": 2},
+        {"schema_version": 1, "categories": {}},
+    ],
+    ids=["legacy", "version-not-first", "old-version"],
+)
+def test_non_current_documents_fall_back(document, tmp_path):
+    path = tmp_path / "snippets.json"
+    path.write_text(json.dumps(document), encoding="utf-8")
+
+    assert stream_flat_snippets(str(path)) is None
+
+
+def test_truncated_file_raises_codec_error(tmp_path):
+    path = tmp_path / "snippets.json"
+    path.write_bytes(codec.encode_document(DOCUMENT)[:-10])
+
+    with pytest.raises(codec.SnippetCodecError):
+        stream_flat_snippets(str(path))
+
+
+def _corrupt_binary():
+    data = bytearray(codec.encode_binary(DOCUMENT))
+    # Первый байт имени первой категории «Работа» — недопустимый UTF-8.
+    data[data.index("Работа".encode("utf-8"))] = 0xFF
+    return bytes(data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        _corrupt_binary(),
+        # Конец категории без её начала.
+        codec.BINARY_MAGIC + b"\x01\x02\x00EZ",
+        # Фильтр окна — не JSON.
+        codec.BINARY_MAGIC
+        + b"\x01\x02\x00C\x01\x00\x00\x00A\x01\x03\x00\x00\x00{x}EZ",
+    ],
+    ids=["bad-utf8", "stray-end", "bad-filter"],
+)
+def test_corrupt_binary_raises_codec_error(data, tmp_path):
+    path = tmp_path / "snippets.json"
+    path.write_bytes(data)
+
+    with pytest.raises(codec.SnippetCodecError):
+        codec.load_snippet_document(str(path))
+    with pytest.raises(codec.SnippetCodecError):
+        stream_flat_snippets(str(path))
+
+
+def test_rejected_abbreviations_store_no_text(tmp_path):
+    path = tmp_path / "snippets.json"
+    codec.save_snippet_document(str(path), DOCUMENT)
+    stored = []
+
+    def store_text(text):
+        stored.append(text)
+        return text
+
+    flat = stream_flat_snippets(
+        str(path), store_text=store_text, accept_abbr=lambda abbr: abbr != ".w"
+    )
+
+    assert ".w" not in flat
+    assert "W" * 200 not in stored
+    assert set(stored) == {entry["text"] for entry in flat.values()}
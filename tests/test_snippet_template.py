@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from app.core.snippet_template import (
+    OP_CLIPBOARD,
+    OP_CURSOR,
+    OP_DATE,
+    OP_SNIPPET,
+    OP_TEXT,
+    OP_TIME,
+    CompiledTemplate,
+    link_template,
+    parse_template,
+)
+
+NOW = time.struct_time((2024, 3, 5, 14, 7, 0, 1, 65, -1))
+
+
+def _compile(text, library=None):
+    library = library or {}
+
+    def resolve(abbr):
+        source = library.get(abbr)
+        if source is None:
+            return None
+        return parse_template(source) or [(OP_TEXT, source)]
+
+    return CompiledTemplate(link_template(parse_template(text), resolve, (".self",)))
+
+
+@pytest.mark.parametrize("text", ["", "обычный текст", "{неизвестно}", "a { b } c"])
+def test_plain_text_is_not_a_template(text):
+    assert parse_template(text) is None
+
+
+def test_placeholders_are_parsed():
+    ops = parse_template("Дата {date}, {time:%H} {clipboard}{cursor} {snippet: .x }")
+    assert ops == [
+        (OP_TEXT, "Дата "),
+        (OP_DATE, "%d.%m.%Y"),
+        (OP_TEXT, ", "),
+        (OP_TIME, "%H"),
+        (OP_TEXT, " "),
+        (OP_CLIPBOARD, None),
+        (OP_CURSOR, None),
+        (OP_TEXT, " "),
+        (OP_SNIPPET, ".x"),
+    ]
+
+
+def test_double_braces_escape_placeholder():
+    assert parse_template("{{date}} и {x}") == [(OP_TEXT, "{date} и {x}")]
+
+
+def test_dynamic_template_renders_with_time_and_clipboard():
+    template = _compile("{date} {time} [{clipboard}]")
+    assert template.rendered is None
+    assert template.needs_clipboard
+    assert template.render(NOW, "буфер") == ("05.03.2024 14:07 [буфер]", 0)
+
+
+def test_static_template_is_rendered_once_with_cursor():
+    template = _compile("<b>{cursor}</b>")
+    assert template.rendered == ("<b></b>", 4)
+    assert template.render() is template.rendered
+
+
+def test_nested_snippets_are_inlined_without_their_cursor():
+    template = _compile(
+        "Здравствуйте, {snippet:.name}!",
+        {".name": "{cursor}Иван {snippet:.last}", ".last": "Петров"},
+    )
+    assert template.ops == ((OP_TEXT, "Здравствуйте, Иван Петров!"),)
+
+
+@pytest.mark.parametrize(
+    "library",
+    [{}, {".a": "{snippet:.self}"}],
+    ids=["unknown", "cycle"],
+)
+def test_unresolved_references_stay_literal(library):
+    template = _compile("x {snippet:.a} y", library)
+    expected = "x {snippet:.a} y" if not library else "x {snippet:.self} y"
+    assert template.render() == (expected, 0)
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from app.core.snippet_index import SnippetIndex
+from app.core.text_store import TextStore
+
+
+def test_empty_index_creates_no_file(tmp_path):
+    index = SnippetIndex(str(tmp_path))
+    index.compile_buckets({})
+
+    assert index.text_store._file is None
+    assert os.listdir(tmp_path) == []
+    index.close()
+
+
+def test_texts_round_trip_and_deduplicate(tmp_path):
+    store = TextStore(str(tmp_path))
+    first = store.add("Привет")
+    second = store.add("мир")
+    again = store.add("Привет")
+    store.seal()
+
+    assert again == first
+    assert store.distinct_count == 2
+    assert store.get(first) == "Привет"
+    assert store.get(second) == "мир"
+    store.close()
+
+
+def test_close_is_idempotent_and_rejects_reads(tmp_path):
+    store = TextStore(str(tmp_path))
+    ref = store.add("текст")
+    store.seal()
+    store.get(ref)
+
+    store.close()
+    store.close()
+
+    assert store.closed
+    with pytest.raises(ValueError):
+        store.get(ref)
+
+
+def test_memory_fallback_when_directory_is_missing(tmp_path):
+    store = TextStore(str(tmp_path / "missing"))
+    ref = store.add("текст")
+    store.seal()
+
+    assert store.get(ref) == "текст"
+    store.close()
@@ -0,0 +1,74 @@
+import pytest
+
+from app.core.window_filter import (
+    MATCH_CONTAINS,
+    MATCH_EXACT,
+    MATCH_REGEX,
+    compile_window_filter,
+    validate_window_filter,
+)
+from app.services.window_context import WindowSnapshot
+
+WORD = WindowSnapshot(1, 10, "Отчёт.docx - Word", "OpusApp", "winword.exe")
+MAIL = WindowSnapshot(2, 20, "Входящие - Outlook", "rctrl_renwnd32", "outlook.exe")
+
+
+def _matches(window_filter, window):
+    return compile_window_filter(window_filter).matches(window)
+
+
+@pytest.mark.parametrize("window_filter", [None, {}, {"title": "  ", "class": ""}])
+def test_empty_filter_compiles_to_none(window_filter):
+    assert compile_window_filter(window_filter) is None
+
+
+def test_contains_is_case_insensitive():
+    window_filter = {"title": "word", "match_mode": MATCH_CONTAINS}
+    assert _matches(window_filter, WORD)
+    assert not _matches(window_filter, MAIL)
+
+
+def test_exact_title_is_case_sensitive_but_process_is_not():
+    assert _matches({"class": "OpusApp", "match_mode": MATCH_EXACT}, WORD)
+    assert not _matches({"class": "opusapp", "match_mode": MATCH_EXACT}, WORD)
+    assert _matches({"process": "WINWORD.EXE", "match_mode": MATCH_EXACT}, WORD)
+
+
+def test_regex_mode_and_all_criteria_required():
+    window_filter = {
+        "title": r"^входящие",
+        "process": r"outlook\.exe$",
+        "match_mode": MATCH_REGEX,
+    }
+    assert _matches(window_filter, MAIL)
+    assert not _matches(dict(window_filter, process="winword"), MAIL)
+    assert compile_window_filter(window_filter).needs == {"title", "process_name"}
+
+
+def test_unknown_mode_falls_back_to_contains():
+    assert _matches({"process": "WORD", "match_mode": "fuzzy"}, WORD)
+
+
+def test_specificity_prefers_exact_and_more_criteria():
+    exact = compile_window_filter(
+        {"process": "winword.exe", "match_mode": MATCH_EXACT}
+    )
+    contains = compile_window_filter({"process": "word"})
+    both = compile_window_filter({"process": "word", "title": "docx"})
+    assert exact.specificity > contains.specificity
+    assert both.specificity > contains.specificity
+
+
+def test_invalid_regex_is_reported_and_never_matches():
+    window_filter = {"title": "([", "match_mode": MATCH_REGEX}
+    error = validate_window_filter(window_filter)
+    assert error is not None and "'title'" in error
+    assert not _matches(window_filter, WORD)
+
+
+@pytest.mark.parametrize(
+    "window_filter",
+    [None, {"title": "(["}, {"title": r"\d+", "match_mode": MATCH_REGEX}],
+)
+def test_valid_filters_pass_validation(window_filter):
+    assert validate_window_filter(window_filter) is None